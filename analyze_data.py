@@ -1,8 +1,11 @@
-import pandas as pd
+from finance import dataset
+
+# Only the columns the checks use are read (memory-mapped from the Arrow artifact)
+COLUMNS = ['Name', 'Bedrooms', 'Area', 'Price', 'Rent']
 
 def analyze_data(filepath):
     try:
-        df = pd.read_csv(filepath)
+        df = dataset.read_frame(filepath, columns=COLUMNS)
         print(f"--- Analysis of {filepath} ---")
         
         # 1. Area per Bedroom
@@ -32,4 +35,4 @@ def analyze_data(filepath):
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    analyze_data("kolkata_buy_vs_rent_full_analysis.csv")
+    analyze_data(dataset.ensure_artifact(dataset.ANALYSIS_PATH, dataset.ANALYSIS_CSV))
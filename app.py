@@ -7,12 +7,16 @@ except ImportError:
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import asyncio
 import base64
 import os
-from rag import db, rag_engine, vector_store
+import sys
+from rag import db, pipeline, rag_engine, router, startup
+from finance import scenarios
+
+# plotly (+ statsmodels for the trendline), chromadb and sentence-transformers are
+# imported on first use: the chart functions import plotly, and the vector store
+# is hydrated in a background thread (see start_knowledge_base).
 
 def get_base64_of_bin_file(bin_file):
     with open(bin_file, 'rb') as f:
@@ -124,19 +128,155 @@ if "messages" not in st.session_state: st.session_state.messages = []
 
 @st.cache_resource
 def init_data():
-    conn = db.init_db(reload=True)
+    db.init_db(reload=True).close()
     return db.get_schema()
 
+def hydrate_knowledge_base():
+    """Syncs the knowledge base with the listings, then warms the shared client/model/collection."""
+    from rag import vector_store
+    vector_store.initialize_vector_store(db.read_sql("SELECT * FROM properties"))
+    return vector_store.warm_up()
+
+def start_knowledge_base():
+    """Once per process, in a background thread; chat answers skip vector search until it is ready."""
+    return startup.start_task(startup.KNOWLEDGE_BASE, hydrate_knowledge_base)
+
+@st.cache_resource(max_entries=1)
+def get_scenario_engine(data_version):
+    """Shared across sessions: property inputs stay in memory, scenario results are LRU-cached. Rebuilt when the data changes."""
+    return scenarios.ScenarioEngine(db.read_sql("SELECT * FROM properties"))
+
+def render_scenario_panel(data_version):
+    """What-if controls for the Market Analytics page. Returns the chosen parameters."""
+    d = scenarios.DEFAULT_SCENARIO
+    with st.expander("🧪 What-if Scenario", expanded=False):
+        c1, c2, c3 = st.columns(3)
+        income_l = c1.slider("Gross Annual Income (₹ Lakhs)", 5.0, 100.0, d["gross_annual_income"] / 100000, 0.5)
+        loan_rate = c2.slider("Home Loan Rate (% p.a.)", 6.0, 14.0, float(d["loan_rate"]), 0.05)
+        tenure = c3.slider("Loan Tenure (Years)", 5, 30, int(d["tenure_years"]), 1)
+        c4, c5, c6 = st.columns(3)
+        appreciation = c4.slider("Property Appreciation (% p.a.)", 0.0, 15.0, d["appreciation_rate"] * 100, 0.5)
+        sip_return = c5.slider("SIP Return (% p.a.)", 0.0, 20.0, d["sip_return"] * 100, 0.5)
+        rent_esc = c6.slider("Rent Escalation (% p.a.)", 0.0, 15.0, d["rent_escalation_rate"] * 100, 0.5)
+        info = get_scenario_engine(data_version).cache_info()
+        st.caption(f"Scenario cache: {info.hits} hits · {info.misses} misses · {info.currsize}/{info.maxsize} stored")
+    return {
+        "gross_annual_income": income_l * 100000,
+        "loan_rate": loan_rate,
+        "tenure_years": tenure,
+        "appreciation_rate": appreciation / 100,
+        "sip_return": sip_return / 100,
+        "rent_escalation_rate": rent_esc / 100,
+    }
+
+def prepare_context(df):
+    """Risk metrics + explanation records for a SQL result; cached with it by db.execute_cached_query."""
+    df = db.attach_risk_metrics(df)
+    return df, rag_engine.create_explanation_records(df)
+
+def get_session_pipeline():
+    """One event loop and async pipeline per browser session."""
+    if "rag_pipeline" not in st.session_state:
+        st.session_state.event_loop = asyncio.new_event_loop()
+        st.session_state.rag_pipeline = pipeline.AsyncRAGPipeline(schema, prepare_context)
+    return st.session_state.event_loop, st.session_state.rag_pipeline
+
+# --- Market Analytics data & charts ---
+# Everything below reads the small locality_stats / bedroom_stats tables and is
+# cached by data_version (plus the scenario), so a rerun rebuilds nothing.
+QUADRANT_COLORS = dict(zip(db.QUADRANTS, ["#22c55e", "#eab308", "#3b82f6", "#ef4444"]))
+
+@st.cache_data(max_entries=16)
+def load_market_stats(data_version, params):
+    """(locality_stats, bedroom_stats): the stored tables, or recomputed for a what-if scenario."""
+    if scenarios.is_default(**params):
+        return db.read_sql("SELECT * FROM locality_stats"), db.read_sql("SELECT * FROM bedroom_stats")
+    frame = get_scenario_engine(data_version).properties(**params)
+    return db.compute_locality_stats(frame), db.compute_bedroom_stats(frame)
+
+@st.cache_data(max_entries=4)
+def location_figures(data_version):
+    """Location tab charts; they only depend on prices and rents, not on the scenario."""
+    import plotly.express as px
+    loc = db.read_sql("SELECT * FROM locality_stats WHERE count >= ?", (db.MIN_LOCALITY_LISTINGS,))
+    
+    high_price = loc.nlargest(15, 'avg_price')
+    low_price = loc.nsmallest(15, 'avg_price')
+    high_rent = loc.nlargest(15, 'avg_rent')
+    low_rent = loc.nsmallest(15, 'avg_rent')
+    figures = [
+        ("Premium Areas", "Areas with Highest Avg Property Price (Lakhs)",
+            px.bar(high_price, x='address', y='avg_price_lakhs', color='avg_price_lakhs', color_continuous_scale='RdBu_r', labels={'avg_price_lakhs': 'Price (₹ Lakhs)'})),
+        ("Affordable Hotspots", "Areas with Lowest Avg Property Price (Lakhs)",
+            px.bar(low_price, x='address', y='avg_price_lakhs', color='avg_price_lakhs', color_continuous_scale='Teal', labels={'avg_price_lakhs': 'Price (₹ Lakhs)'})),
+        ("Premium Rentals", "Areas with Highest Average Rent",
+            px.bar(high_rent, x='address', y='avg_rent', color='avg_rent', color_continuous_scale='Magma')),
+        ("Budget Rentals", "Areas with Lowest Average Rent",
+            px.bar(low_rent, x='address', y='avg_rent', color='avg_rent', color_continuous_scale='Viridis')),
+    ]
+    
+    # --- QUADRANT CHART: Price vs Rent (quadrants precomputed in locality_stats) ---
+    median_price = loc['avg_price_lakhs'].median()
+    median_rent = loc['avg_rent'].median()
+    fig_quad = px.scatter(
+        loc, 
+        x='avg_price_lakhs', 
+        y='avg_rent', 
+        color='quadrant',
+        hover_name='address',
+        size='count',
+        color_discrete_map=QUADRANT_COLORS,
+        labels={'quadrant': 'Quadrant'}
+    )
+    
+    # Add Quadrant Lines
+    fig_quad.add_hline(y=median_rent, line_dash="dash", line_color="white", opacity=0.3, annotation_text="Avg Rent")
+    fig_quad.add_vline(x=median_price, line_dash="dash", line_color="white", opacity=0.3, annotation_text="Avg Price")
+    
+    fig_quad.update_layout(
+        xaxis_title="Avg Property Price (Lakhs)",
+        yaxis_title="Avg Monthly Rent (₹)",
+        showlegend=True,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    figures.append(("Investment Matrix", "Analyze Areas by Price vs Rent Potential", fig_quad))
+    return figures
+
+@st.cache_data(max_entries=16)
+def scenario_figures(data_version, params):
+    """Market / Value / Wealth tab charts, which change with the what-if scenario."""
+    import plotly.express as px
+    import plotly.graph_objects as go
+    loc, beds = load_market_stats(data_version, params)
+    
+    # Box plot drawn from the precomputed quartiles instead of every listing
+    fig_box = go.Figure([
+        go.Box(
+            name=f"{int(r.bedrooms)}", x=[r.bedrooms], q1=[r.q1_price], median=[r.median_price], q3=[r.q3_price],
+            lowerfence=[r.lower_fence], upperfence=[r.upper_fence]
+        )
+        for r in beds.itertuples()
+    ])
+    fig_box.update_layout(xaxis_title="bedrooms", yaxis_title="price", legend_title_text="bedrooms")
+    
+    split = pd.DataFrame({'decision': ['BUY', 'RENT'], 'count': [beds['buy_count'].sum(), beds['rent_count'].sum()]})
+    fig_split = px.pie(split, names='decision', values='count', color_discrete_sequence=px.colors.sequential.RdBu)
+    
+    # The trend-line scatter is the one per-listing chart; it is only built on a cache miss
+    if scenarios.is_default(**params):
+        points = db.read_sql("SELECT address, area, price, bedrooms, decision FROM properties")
+    else:
+        points = get_scenario_engine(data_version).properties(**params)
+    fig_value = px.scatter(points, x='area', y='price', color='decision', size='bedrooms', hover_data=['address'], trendline="ols", template="plotly_dark")
+    
+    wealth = loc.nlargest(15, 'avg_wealth_difference')
+    fig_wealth = px.bar(wealth, x='address', y='avg_wealth_difference', color='avg_wealth_difference', color_continuous_scale='Viridis', labels={'avg_wealth_difference': 'wealth_difference'})
+    
+    return {"box": fig_box, "split": fig_split, "value": fig_value, "wealth": fig_wealth}
+
 try:
     schema = init_data()
-    if "vector_db_ready" not in st.session_state:
-        with st.spinner("Checking AI Knowledge Base..."):
-             if vector_store.needs_hydration():
-                 conn = db.init_db(reload=False)
-                 vector_store.initialize_vector_store(pd.read_sql("SELECT * FROM properties", conn))
-             else:
-                 vector_store.initialize_vector_store(None)
-             st.session_state.vector_db_ready = True
+    start_knowledge_base()
     st.success("👋 Welcome! I'm ready to help. Ask me about property prices, trends, or specific locations.")
 except Exception as e:
     st.error(f"System Error: {e}")
@@ -149,13 +289,23 @@ with st.sidebar:
     st.markdown("---")
     st.markdown('<p class="sidebar-header">📊 Market Pulse</p>', unsafe_allow_html=True)
     try:
-        conn = db.init_db(reload=False)
-        stats = pd.read_sql("SELECT COUNT(*) as c, AVG(price) as p, AVG(area) as a FROM properties", conn).iloc[0]
+        stats = db.read_sql("SELECT COUNT(*) as c, AVG(price) as p, AVG(area) as a FROM properties").iloc[0]
         st.metric("Total Properties", f"{stats['c']}")
         st.metric("Avg Price", f"₹{stats['p']/100000:.1f} Lakhs")
         st.metric("Avg Size", f"{stats['a']:,.0f} sqft")
     except: st.error("Stats unavailable")
     
+    qc = db.query_cache.stats()
+    st.caption(f"Query cache: {qc.hits} hits · {qc.misses} misses · {qc.entries} stored ({qc.bytes / 1e6:.1f} MB)")
+    kb = startup.get_task(startup.KNOWLEDGE_BASE)
+    if kb is not None:
+        st.caption(f"Knowledge base: {kb.status()}")
+    if "rag.vector_store" in sys.modules and kb is not None and kb.ready.is_set():
+        vt = sys.modules["rag.vector_store"].get_timings()
+        if "model_load_ms" in vt:
+            last = f" · last query {vt['last_query_ms']:.0f} ms" if vt["queries"] else ""
+            st.caption(f"Vector store: model loaded in {vt['model_load_ms'] / 1000:.1f} s{last}")
+    
     st.markdown("---")
     st.info("**Hybrid RAG System**\n\n• Router: Intent\n• SQL: Filtering\n• Vector: Semantic Search\n• LLM: Synthesis")
 
@@ -175,28 +325,26 @@ if page == "🤖 AI Assistant":
         st.chat_message("user").markdown(prompt)
         st.session_state.messages.append({"role": "user", "content": prompt})
         
+        loop, rag = get_session_pipeline()
         with st.status("Processing Query...", expanded=True) as status:
-            intent = rag_engine.classify_intent(prompt)
-            st.write(f"**Intent:** `{intent}`")
-            explanation, context_df = "", None
+            # Router / planner, SQL and a speculative vector search run concurrently on the session loop
+            result = loop.run_until_complete(rag.retrieve(prompt))
+            st.write(f"**Intent:** `{result.intent}`" + (" (fast path)" if result.fast_path else ""))
+            context_df = result.context_df
             
-            if intent in ["FILTER", "COMPARE", "EXPLAIN"]:
-                sql = rag_engine.generate_sql_query(prompt, schema)
-                st.code(sql, "sql")
-                context_df, error = db.execute_sql_query(sql)
-                if error: 
-                    st.error(f"SQL Error: {error}")
-                    explanation = f"Error: {error}"
+            if result.sql:
+                st.code(router.to_literal_sql(result.sql, result.params) if result.params else result.sql, "sql")
+                if result.error: 
+                    st.error(f"SQL Error: {result.error}")
                 else: 
-                    st.write(f"✅ Retrieved {len(context_df)} records.")
-                    explanation = rag_engine.create_explanation_records(context_df)
-            elif intent == "EDUCATIONAL":
-                explanation = "General educational question."
+                    capped = " (row cap reached)" if context_df.attrs.get("truncated") else ""
+                    st.write(f"✅ Retrieved {len(context_df)} records{capped}.")
             
-            response = rag_engine.generate_rag_response(prompt, explanation, intent)
             status.update(label="Complete", state="complete", expanded=False)
             
-        st.chat_message("assistant").markdown(response)
+        # Tokens are rendered as they arrive instead of after the full answer
+        with st.chat_message("assistant"):
+            response = st.write_stream(pipeline.iterate(loop, rag.stream_answer(prompt, result)))
         if context_df is not None and not context_df.empty:
             with st.expander("View Raw Data"): st.dataframe(context_df)
         st.session_state.messages.append({"role": "assistant", "content": response})
@@ -204,115 +352,21 @@ if page == "🤖 AI Assistant":
 elif page == "📈 Market Analytics":
     st.subheader("📈 Real Estate Market Insights")
     try:
-        df = pd.read_sql("SELECT * FROM properties", db.init_db(reload=False))
-        if df.empty:
+        data_version = db.get_data_version()
+        # Recompute decision / wealth for the selected assumptions (cached per scenario)
+        params = render_scenario_panel(data_version)
+        loc, bed_stats = load_market_stats(data_version, params)
+        if loc.empty:
             st.warning("No data available.")
         else:
-            df['price_per_sqft'] = df['price'] / df['area']
-            if 'rent' in df.columns: df['rental_yield'] = (df['rent'] * 12 / df['price']) * 100
-            
             t1, t2, t3, t4 = st.tabs(["📍 Location", "💰 Market", "💎 Value", "🏦 Wealth"])
             
             with t1:
-                # Aggregation
-                loc = df.groupby('address').agg(
-                    avg_price_sqft=('price_per_sqft', 'mean'), 
-                    avg_rent=('rent', 'mean'), 
-                    avg_price=('price', 'mean'),
-                    count=('price', 'count')
-                ).reset_index()
-                
-                # Filter for popular areas (more than 3 listins to populate graph better)
-                loc_filtered = loc[loc['count']>3]
-                loc_filtered['avg_price_lakhs'] = loc_filtered['avg_price'] / 100000
-
-                # 1. Premium Areas (High Total Price)
-                high_price = loc_filtered.sort_values('avg_price', ascending=False).head(15)
-                render_glass_card("Premium Areas", "Areas with Highest Avg Property Price (Lakhs)", 
-                    px.bar(high_price, x='address', y='avg_price_lakhs', color='avg_price_lakhs', color_continuous_scale='RdBu_r', labels={'avg_price_lakhs': 'Price (₹ Lakhs)'}))
-
-                # 2. Affordable Areas (Low Total Price)
-                low_price = loc_filtered.sort_values('avg_price', ascending=True).head(15)
-                render_glass_card("Affordable Hotspots", "Areas with Lowest Avg Property Price (Lakhs)", 
-                    px.bar(low_price, x='address', y='avg_price_lakhs', color='avg_price_lakhs', color_continuous_scale='Teal', labels={'avg_price_lakhs': 'Price (₹ Lakhs)'}))
-
-                # 3. Premium Rentals (High Rent)
-                high_rent = loc_filtered.sort_values('avg_rent', ascending=False).head(15)
-                render_glass_card("Premium Rentals", "Areas with Highest Average Rent", 
-                    px.bar(high_rent, x='address', y='avg_rent', color='avg_rent', color_continuous_scale='Magma'))
-
-                # 4. Budget Rentals (Low Rent)
-                low_rent = loc_filtered.sort_values('avg_rent', ascending=True).head(15)
-                render_glass_card("Budget Rentals", "Areas with Lowest Average Rent", 
-                    px.bar(low_rent, x='address', y='avg_rent', color='avg_rent', color_continuous_scale='Viridis'))
-                
-                # --- NEW QUADRANT CHART: Price vs Rent ---
-                # Calculate medians for quadrants
-                median_price = loc_filtered['avg_price_lakhs'].median()
-                median_rent = loc_filtered['avg_rent'].median()
-                
-                def get_quadrant_label(row):
-                    p = row['avg_price_lakhs']
-                    r = row['avg_rent']
-                    if r >= median_rent and p < median_price: return "Best Investment (High Rent, Low Price)"
-                    elif r >= median_rent and p >= median_price: return "Lifestyle (High Rent, High Price)"
-                    elif r < median_rent and p < median_price: return "Budget Living (Low Rent, Low Price)"
-                    else: return "Avoid (Low Rent, High Price)"
-
-                def get_quadrant_color(row):
-                    p = row['avg_price_lakhs']
-                    r = row['avg_rent']
-                    if r >= median_rent and p < median_price: return "#22c55e" # Green
-                    elif r >= median_rent and p >= median_price: return "#eab308" # Yellow
-                    elif r < median_rent and p < median_price: return "#3b82f6" # Blue
-                    else: return "#ef4444" # Red
-                
-                loc_filtered['Quadrant'] = loc_filtered.apply(get_quadrant_label, axis=1)
-                loc_filtered['Color'] = loc_filtered.apply(get_quadrant_color, axis=1)
-
-                fig_quad = px.scatter(
-                    loc_filtered, 
-                    x='avg_price_lakhs', 
-                    y='avg_rent', 
-                    color='Quadrant',
-                    hover_name='address',
-                    size='count',
-                    color_discrete_map={
-                        "Best Investment (High Rent, Low Price)": "#22c55e",
-                        "Lifestyle (High Rent, High Price)": "#eab308",
-                        "Budget Living (Low Rent, Low Price)": "#3b82f6",
-                        "Avoid (Low Rent, High Price)": "#ef4444"
-                    }
-                )
-                
-                # Add Quadrant Lines
-                fig_quad.add_hline(y=median_rent, line_dash="dash", line_color="white", opacity=0.3, annotation_text="Avg Rent")
-                fig_quad.add_vline(x=median_price, line_dash="dash", line_color="white", opacity=0.3, annotation_text="Avg Price")
-                
-                fig_quad.update_layout(
-                    xaxis_title="Avg Property Price (Lakhs)",
-                    yaxis_title="Avg Monthly Rent (₹)",
-                    showlegend=True,
-                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-                )
-
-                render_glass_card("Investment Matrix", "Analyze Areas by Price vs Rent Potential", fig_quad)
+                for title, caption, fig in location_figures(data_version):
+                    render_glass_card(title, caption, fig)
             
             with t2:
-                # --- EMI & Down Payment Calculations ---
-                r = 0.0875 / 12 # 8.75% Interest
-                n = 240 # 20 Years
-                df['loan_amount'] = df['price'] * 0.80
-                df['calculated_dp'] = df['price'] * 0.20
-                df['calculated_emi'] = df['loan_amount'] * r * (1 + r)**n / ((1 + r)**n - 1)
-                
-                # Create Summary Stats by Bedroom
-                bed_stats = df.groupby('bedrooms').agg(
-                    min_price=('price', 'min'), max_price=('price', 'max'),
-                    min_dp=('calculated_dp', 'min'), max_dp=('calculated_dp', 'max'),
-                    min_emi=('calculated_emi', 'min'), max_emi=('calculated_emi', 'max')
-                ).reset_index()
-                
+                # --- EMI & Down Payment (from the scenario engine: RBI LTV + income cap) ---
                 # Helper to format Lacs/Crores/Thousand
                 def fmt_L(v): return f"₹{v/100000:.1f}L"
                 def fmt_K(v): return f"₹{v/1000:.0f}k"
@@ -320,12 +374,12 @@ elif page == "📈 Market Analytics":
                 st.markdown("### 🏷️ Price & Affordability Breakdown")
                 
                 # Display Custom Cards for each Bedroom Layout
-                for _, row in bed_stats.iterrows():
-                    if row['bedrooms'] in [1,2,3,4]: # Limit to standard sizes
-                        bhk = int(row['bedrooms'])
-                        price_rng = f"{fmt_L(row['min_price'])} – {fmt_L(row['max_price'])}"
-                        dp_rng = f"{fmt_L(row['min_dp'])} – {fmt_L(row['max_dp'])}"
-                        emi_rng = f"{fmt_K(row['min_emi'])} – {fmt_K(row['max_emi'])}"
+                for row in bed_stats.itertuples():
+                    if row.bedrooms in [1,2,3,4]: # Limit to standard sizes
+                        bhk = int(row.bedrooms)
+                        price_rng = f"{fmt_L(row.min_price)} – {fmt_L(row.max_price)}"
+                        dp_rng = f"{fmt_L(row.min_dp)} – {fmt_L(row.max_dp)}"
+                        emi_rng = f"{fmt_K(row.min_emi)} – {fmt_K(row.max_emi)}"
                         
                         st.markdown(f"""
                         <div style="background: rgba(30, 41, 59, 0.5); padding: 15px; border-radius: 12px; border: 1px solid rgba(255,255,255,0.1); margin-bottom: 10px; display: flex; justify-content: space-between; align-items: center;">
@@ -336,22 +390,15 @@ elif page == "📈 Market Analytics":
                         </div>
                         """, unsafe_allow_html=True)
 
+                figs = scenario_figures(data_version, params)
                 c1, c2 = st.columns(2)
-                with c1: 
-                    # Enhanced Box Plot
-                    fig_box = px.box(df, x='bedrooms', y='price', color='bedrooms', 
-                                    hover_data={'calculated_emi':':.0f', 'calculated_dp':':.0f', 'price':':.0f'})
-                    render_glass_card("Price Distribution", "Spread of property prices by room count", fig_box, height=500)
-                with c2: render_glass_card("Buy vs Rent", "System Recommendation Split", px.pie(df, names='decision', color_discrete_sequence=px.colors.sequential.RdBu), height=500)
+                with c1: render_glass_card("Price Distribution", "Spread of property prices by room count", figs["box"], height=500)
+                with c2: render_glass_card("Buy vs Rent", "System Recommendation Split", figs["split"], height=500)
             
             with t3:
-                render_glass_card("Undervalued Finder", "Properties below trend line", px.scatter(df, x='area', y='price', color='decision', size='bedrooms', hover_data=['address'], trendline="ols", template="plotly_dark"))
+                render_glass_card("Undervalued Finder", "Properties below trend line", figs["value"])
                 
             with t4:
-                if 'wealth_difference' in df.columns:
-                    df['wealth_difference'] = pd.to_numeric(df['wealth_difference'], errors='coerce')
-                    wealth = df.groupby('address')['wealth_difference'].mean().reset_index().sort_values('wealth_difference', ascending=False).head(15)
-                    render_glass_card("Wealth Potential", "Avg Wealth Gain (Buy vs Rent)", px.bar(wealth, x='address', y='wealth_difference', color='wealth_difference', color_continuous_scale='Viridis'))
-                else: st.info("Wealth data missing.")
+                render_glass_card("Wealth Potential", "Avg Wealth Gain (Buy vs Rent)", figs["wealth"])
 
     except Exception as e: st.error(f"Error: {e}")
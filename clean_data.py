@@ -1,89 +1,221 @@
-import pandas as pd
+import argparse
 import os
 import sys
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 
-def clean_file(filepath):
-    if not os.path.exists(filepath):
-        print(f"File not found: {filepath}")
+import numpy as np
+import pandas as pd
+
+from finance import dataset
+
+# Streaming cleaner for the scraped / analysed datasets (CSV or Arrow artifacts).
+# Each file is read in fixed-size chunks; the numeric columns are parsed and one
+# combined vectorized mask of all rules decides which rows stay. Kept rows are
+# written unchanged (CSV text as read, Arrow record batches filtered with
+# their schema) to a temp file next to the input, which
+# atomically replaces the file only if something was removed. Rejections are
+# counted per rule (the first rule a row fails) and a bounded reservoir sample
+# of them is kept for review, so memory stays flat however big the dump is.
+# Files are cleaned in parallel in a process pool.
+
+CHUNK_ROWS = 50_000
+SAMPLE_SIZE = 5
+SAMPLE_COLUMNS = ['Name', 'Rent', 'Area', 'Bedrooms', 'Price']
+NUMERIC_COLUMNS = ['Rent', 'Area', 'Bedrooms', 'Price']
+
+# (rule, required columns, keep-mask over the parsed numeric columns)
+RULES = [
+    # Rule 1: Minimum Area per Bedroom (exclude tiny errors)
+    # 5 BHK in 186 sqft -> 37 sqft/bedroom (Impossible)
+    # Threshold: 150 sqft per bedroom is extemely conservative (600 sqft for 4bhk)
+    ("area_per_bedroom", ['Area', 'Bedrooms'], lambda n: n['Area'] / n['Bedrooms'] >= 150),
+    # Rule 2: Minimum Rent per sq ft (exclude absurdly cheap rents)
+    # 3000 rent for 1500 sqft -> 2 Rs/sqft. (Too low)
+    # Threshold: 6 Rs/sqft
+    ("rent_per_sqft", ['Rent', 'Area'], lambda n: n['Rent'] / n['Area'] >= 5),
+    # Rule 3: Minimum Yield (Annual Rent / Price)
+    # Exclude data where rent is disproportionately low compared to price
+    # Threshold: 1% yield
+    ("min_yield", ['Rent', 'Price'], lambda n: (n['Rent'] * 12) / n['Price'] >= 0.01),
+    # Rule 4: Absolute minimum rent
+    ("min_rent", ['Rent'], lambda n: n['Rent'] >= 3000),
+]
+INVALID_NUMERIC = "invalid_numeric"   # a critical column is missing or not a number
+
+CleanReport = namedtuple("CleanReport", ["path", "rows_in", "rows_out", "rule_counts", "sample", "rewritten", "error"])
+
+
+def rejection_reasons(chunk):
+    """
+    One vectorized pass over a chunk (CSV text or typed Arrow columns).
+    Returns the rejecting rule per row, or None where the row is kept.
+    """
+    numeric_cols = [c for c in NUMERIC_COLUMNS if c in chunk.columns]
+    numbers = pd.DataFrame({c: pd.to_numeric(chunk[c], errors='coerce') for c in numeric_cols}, index=chunk.index)
+
+    names = [INVALID_NUMERIC]
+    keep = [numbers.notna().all(axis=1).to_numpy()]
+    for name, required, rule in RULES:
+        if all(c in numbers.columns for c in required):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                names.append(name)
+                keep.append(rule(numbers).to_numpy())
+
+    keep = np.vstack(keep)
+    passed = keep.all(axis=0)
+    first_failed = np.argmin(keep, axis=0)    # first False per row
+    reasons = np.array(names, dtype=object)[first_failed]
+    reasons[passed] = None
+    return reasons
+
+
+def reservoir_update(sample, seen, candidates, size, rng):
+    """
+    Algorithm R over a batch: candidates (a DataFrame) are the next rejected
+    rows after `seen` earlier ones. Only the rows that win a slot are
+    materialized. Returns the new seen count.
+    """
+    fill = max(0, min(size - len(sample), len(candidates)))
+    sample.extend(candidates.iloc[:fill].to_dict("records"))
+    rest = len(candidates) - fill
+    if rest:
+        positions = np.arange(seen + fill + 1, seen + len(candidates) + 1)
+        slots = (rng.random(rest) * positions).astype(np.int64)
+        for offset in np.flatnonzero(slots < size):
+            sample[slots[offset]] = candidates.iloc[fill + offset].to_dict()
+    return seen + len(candidates)
+
+
+@contextmanager
+def open_chunks(filepath, tmp_path, chunk_rows=CHUNK_ROWS):
+    """
+    Yields an iterator of (frame, write) per chunk: frame holds the values the
+    rules read, write(kept) appends that chunk's kept rows to tmp_path in the
+    input's format. CSV is read as text and rows are written back exactly as
+    read; Arrow artifacts are memory-mapped and streamed per record batch
+    (fixed when the file was written), keeping their schema and dictionaries.
+    """
+    if not filepath.endswith(dataset.ARROW_SUFFIXES):
+        with open(tmp_path, "w", newline="", encoding="utf-8") as out:
+            reader = pd.read_csv(filepath, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+            yield (
+                (chunk, lambda kept, chunk=chunk, header=(i == 0): chunk[kept].to_csv(out, index=False, header=header))
+                for i, chunk in enumerate(reader)
+            )
         return
 
-    print(f"Processing {filepath}...")
+    import pyarrow as pa
+    with pa.memory_map(filepath) as source, pa.OSFile(tmp_path, "wb") as sink:
+        reader = pa.ipc.open_file(source)
+        columns = [c for c in reader.schema.names if c in SAMPLE_COLUMNS or c in NUMERIC_COLUMNS]
+        with pa.ipc.new_file(sink, reader.schema) as writer:
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            yield (
+                (batch.select(columns).to_pandas(), lambda kept, batch=batch: writer.write_batch(batch.filter(pa.array(kept))))
+                for batch in batches
+            )
+
+
+def clean_file(filepath, chunk_rows=CHUNK_ROWS, sample_size=SAMPLE_SIZE, seed=0):
+    """Cleans one CSV or Arrow file in place (streaming). Returns a CleanReport; nothing is rewritten if no row fails."""
+    if not os.path.exists(filepath):
+        return CleanReport(filepath, 0, 0, {}, [], False, "File not found")
+
+    rng = np.random.default_rng(seed)
+    rule_counts, sample, seen, rows_in, rows_out = {}, [], 0, 0, 0
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(prefix=".clean_", suffix=os.path.splitext(filepath)[1], dir=directory)
+    os.close(fd)
     try:
-        df = pd.read_csv(filepath)
-        initial_count = len(df)
-        
-        # Ensure numeric columns
-        cols_to_numeric = ['Rent', 'Area', 'Bedrooms', 'Price']
-        for col in cols_to_numeric:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # Drop rows where critical data turned into NaN
-        df.dropna(subset=[c for c in cols_to_numeric if c in df.columns], inplace=True)
-
-        original_df = df.copy()
-        
-        if 'Area' in df.columns and 'Bedrooms' in df.columns:
-            # Rule 1: Minimum Area per Bedroom (exclude tiny errors)
-            # 5 BHK in 186 sqft -> 37 sqft/bedroom (Impossible)
-            # Threshold: 150 sqft per bedroom is extemely conservative (600 sqft for 4bhk)
-            df = df[df['Area'] / df['Bedrooms'] >= 150]
-            
-        if 'Rent' in df.columns and 'Area' in df.columns:
-            # Rule 2: Minimum Rent per sq ft (exclude absurdly cheap rents)
-            # 3000 rent for 1500 sqft -> 2 Rs/sqft. (Too low)
-            # Threshold: 6 Rs/sqft
-            df = df[df['Rent'] / df['Area'] >= 5]
-            
-        if 'Rent' in df.columns and 'Price' in df.columns:
-            # Rule 3: Minimum Yield (Annual Rent / Price)
-            # Exclude data where rent is disproportionately low compared to price
-            # Threshold: 1% yield
-            df['yield_temp'] = (df['Rent'] * 12) / df['Price']
-            df = df[df['yield_temp'] >= 0.01]
-            df.drop(columns=['yield_temp'], inplace=True)
-
-        if 'Rent' in df.columns:
-            # Rule 4: Absolute minimum rent
-            df = df[df['Rent'] >= 3000]
-
-        final_count = len(df)
-        removed = initial_count - final_count
-        
-        if removed > 0:
-            print(f"Removed {removed} invalid rows from {filepath}")
-            # Show a sample of removed rows to verify logic
-            removed_rows = original_df[~original_df.index.isin(df.index)]
-            print("Sample removed data:")
-            print(removed_rows[['Name', 'Rent', 'Area', 'Bedrooms', 'Price'] if 'Price' in removed_rows.columns else ['Name', 'Rent', 'Area']].head())
-            
-            df.to_csv(filepath, index=False)
-            print(f"Saved cleaned file: {filepath}")
-        else:
-            print(f"No rows removed from {filepath}")
-            
+        with open_chunks(filepath, tmp_path, chunk_rows) as chunks:
+            for chunk, write in chunks:
+                reasons = rejection_reasons(chunk)
+                kept = pd.isna(reasons)
+                write(kept)
+
+                rejected_reasons = reasons[~kept]
+                for reason, count in pd.Series(rejected_reasons).value_counts().items():
+                    rule_counts[reason] = rule_counts.get(reason, 0) + int(count)
+                rejected = chunk.loc[~kept, [c for c in SAMPLE_COLUMNS if c in chunk.columns]].assign(rule=rejected_reasons)
+                seen = reservoir_update(sample, seen, rejected, sample_size, rng)
+
+                rows_in += len(chunk)
+                rows_out += int(kept.sum())
+
+        rewritten = rows_out < rows_in
+        if rewritten:
+            os.replace(tmp_path, filepath)
+        return CleanReport(filepath, rows_in, rows_out, rule_counts, sample, rewritten, None)
     except Exception as e:
-        print(f"Error processing {filepath}: {e}")
+        return CleanReport(filepath, rows_in, rows_out, rule_counts, sample, False, str(e))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def print_report(report):
+    print(f"Processing {report.path}...")
+    if report.error == "File not found":
+        print(f"File not found: {report.path}")
+        return
+    if report.error:
+        print(f"Error processing {report.path}: {report.error}")
+        return
+    removed = report.rows_in - report.rows_out
+    if not removed:
+        print(f"No rows removed from {report.path}")
+        return
+    print(f"Removed {removed} invalid rows from {report.path} ({report.rows_in} -> {report.rows_out})")
+    for rule, count in sorted(report.rule_counts.items(), key=lambda kv: -kv[1]):
+        print(f"  {rule}: {count}")
+    # Show a sample of removed rows to verify logic
+    print("Sample removed data:")
+    print(pd.DataFrame(report.sample).to_string(index=False))
+    print(f"Saved cleaned file: {report.path}")
+
+
+def clean_files(paths, workers=None, chunk_rows=CHUNK_ROWS):
+    """Cleans the files in parallel (one process per file) and returns their reports in input order."""
+    workers = min(len(paths), workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(clean_file, paths, [chunk_rows] * len(paths)))
+    return [clean_file(p, chunk_rows) for p in paths]
+
 
 # Files to clean
 files_to_clean = [
-    'kolkata.csv',
-    'kolkata_buy_vs_rent_full_analysis.csv',
+    dataset.RAW_PATH,
+    dataset.ANALYSIS_PATH,
     'buy_vs_rent_results.csv',
     'properties.csv',
     'properties_final.csv'
 ]
 
 if __name__ == "__main__":
-    for f in files_to_clean:
-        clean_file(f)
+    parser = argparse.ArgumentParser(description="Streaming cleaner for the property CSVs")
+    parser.add_argument("files", nargs="*", default=files_to_clean)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    # Artifacts are first brought up to date with a newer CSV (or replaced by the CSV without pyarrow)
+    files = [
+        dataset.ensure_artifact(f, os.path.splitext(f)[0] + ".csv") if f.endswith(dataset.ARROW_SUFFIXES) else f
+        for f in args.files
+    ]
+    for report in clean_files(files, args.workers, args.chunk_rows):
+        print_report(report)
     
     # Re-initialize the database
     sys.path.append(os.getcwd())
     try:
         from rag.db import init_db
         print("Re-initializing database...")
-        init_db(reload=True)
+        init_db(reload=True).close()
         print("Database updated successfully.")
     except ImportError:
         print("Could not import init_db from rag.db")
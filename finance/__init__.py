@@ -0,0 +1 @@
+# Finance Package Initializer
@@ -0,0 +1,122 @@
+import argparse
+import importlib.util
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Typed, columnar storage for the property datasets.
+# The pipeline (scrape -> finance.engine -> rag.db / analyze_data / clean_data)
+# passes Arrow IPC files (Feather v2) instead of CSV: low-cardinality text is
+# stored as categoricals and numerics are downcast losslessly (integral floats
+# become the smallest int that holds them). The files are written uncompressed,
+# so reads memory-map them and numeric columns are not copied into the process.
+# CSV is only an import (the scraper's output) and export format: a CSV that is
+# newer than its artifact is imported once, and export_csv writes one back out.
+#
+#   python -m finance.dataset kolkata.csv                 # import into kolkata.arrow
+#   python -m finance.dataset --export kolkata.arrow      # write kolkata.csv
+
+RAW_PATH = "kolkata.arrow"
+RAW_CSV = "kolkata.csv"
+ANALYSIS_PATH = "kolkata_buy_vs_rent_full_analysis.arrow"
+ANALYSIS_CSV = "kolkata_buy_vs_rent_full_analysis.csv"
+
+ARROW_SUFFIXES = (".arrow", ".feather")
+CATEGORY_COLUMNS = {"address", "furnishing", "decision", "chosen_tax_regime"}
+MAX_EXACT_INT = 2 ** 53     # floats above this are not guaranteed integral
+
+ARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+
+def optimize_dtypes(df):
+    """Categoricals for CATEGORY_COLUMNS (any case) and lossless numeric downcasts."""
+    df = df.copy()
+    for col in df.columns:
+        values = df[col]
+        if str(col).lower() in CATEGORY_COLUMNS:
+            df[col] = values.astype("category")
+        elif pd.api.types.is_float_dtype(values):
+            array = values.to_numpy()
+            if values.notna().all() and np.all(np.abs(array) < MAX_EXACT_INT) and np.array_equal(array, np.round(array)):
+                df[col] = pd.to_numeric(values.astype(np.int64), downcast="integer")
+            elif np.array_equal(array.astype(np.float32).astype(np.float64), array, equal_nan=True):
+                df[col] = values.astype(np.float32)
+        elif pd.api.types.is_integer_dtype(values):
+            df[col] = pd.to_numeric(values, downcast="integer")
+    return df
+
+
+def read_frame(path, columns=None):
+    """
+    Reads a dataset by extension. Arrow files are memory-mapped (numeric columns
+    are views of the mapping); CSV is parsed and given the same dtypes.
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in ARROW_SUFFIXES:
+        from pyarrow import feather
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        # split_blocks keeps one array per column instead of consolidating (copying) them
+        return table.to_pandas(split_blocks=True)
+    if suffix == ".parquet":
+        return pd.read_parquet(path, columns=columns)
+    return optimize_dtypes(pd.read_csv(path, usecols=columns))
+
+
+def write_frame(df, path):
+    """
+    Writes the typed artifact (uncompressed, so it can be memory-mapped) via a
+    temp file and an atomic swap. Each writer gets its own temp file, so
+    concurrent writers of one artifact (clean_data --workers, the engine) never
+    swap in a torn file; the last complete one wins.
+    """
+    from pyarrow import feather
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".write_", suffix=os.path.splitext(path)[1], dir=directory)
+    os.close(fd)
+    try:
+        feather.write_feather(optimize_dtypes(df).reset_index(drop=True), tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def export_csv(path, csv_path=None):
+    """Writes the artifact out as CSV. The export keeps the artifact's mtime, so it is not re-imported."""
+    csv_path = csv_path or os.path.splitext(path)[0] + ".csv"
+    read_frame(path).to_csv(csv_path, index=False)
+    stat = os.stat(path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return csv_path
+
+
+def ensure_artifact(path, csv_path):
+    """
+    Imports csv_path into the artifact when the artifact is missing or older.
+    Returns the file to read: the artifact, or the CSV itself when pyarrow is not installed.
+    """
+    if not ARROW_AVAILABLE:
+        return csv_path
+    if os.path.exists(csv_path) and (not os.path.exists(path) or os.path.getmtime(csv_path) > os.path.getmtime(path)):
+        print(f"Importing {csv_path} into {path}...")
+        write_frame(read_frame(csv_path), path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import CSVs into typed Arrow artifacts, or export them back to CSV")
+    parser.add_argument("paths", nargs="*", default=[RAW_CSV, ANALYSIS_CSV])
+    parser.add_argument("--export", action="store_true", help="paths are artifacts to export as CSV")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if args.export:
+            print(f"Exported {path} -> {export_csv(path)}")
+            continue
+        artifact = ensure_artifact(os.path.splitext(path)[0] + ".arrow", path)
+        csv_bytes = pd.read_csv(path).memory_usage(deep=True).sum()
+        typed_bytes = read_frame(artifact).memory_usage(deep=True).sum()
+        print(f"{path} -> {artifact}: {csv_bytes / 1e6:.2f} MB as parsed CSV, {typed_bytes / 1e6:.2f} MB typed")
@@ -0,0 +1,300 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from finance import dataset, tax
+
+# Vectorized port of the Buy vs Rent model in calculations.ipynb.
+# Every function works on whole NumPy arrays (one element per property)
+# instead of looping over the spreadsheet row by row.
+
+# ============================================================
+# ASSUMPTIONS (same values as calculations.ipynb)
+# ============================================================
+BANK_RATES_FP = [7.85, 8.0, 8.1, 7.9, 8.2]
+GROSS_ANNUAL_INCOME = 18_00_000
+TENURE_YEARS = 20
+EMI_RATIO = 0.40
+
+APPRECIATION_RATE = 0.07
+SIP_RETURN = 0.10
+RENT_ESCALATION_RATE = 0.05
+SALARY_GROWTH_RATE = 0.05
+
+STAMP_DUTY_RATE = 0.07
+MAINTENANCE_RATE = 0.015
+PROPERTY_TAX_RATE = 0.008
+
+INTEREST_DEDUCTION_CAP = 200_000   # Section 24(b)
+PRINCIPAL_DEDUCTION_CAP = 150_000  # Section 80C
+
+INPUT_COLUMNS = ["Name", "Address", "Bedrooms", "Price", "Rent", "Area", "Furnishing"]
+OUTPUT_COLUMNS = INPUT_COLUMNS + [
+    "property_price", "property_price_lakhs", "initial_monthly_rent",
+    "down_payment_pct", "down_payment", "loan_amount",
+    "monthly_emi", "effective_monthly_emi",
+    "chosen_tax_regime", "total_tax_paid", "total_tax_old", "total_tax_new",
+    "final_property_value", "final_buying_wealth", "final_renting_wealth",
+    "decision", "wealth_difference"
+]
+
+
+# ============================================================
+# 1. HOME LOAN & EMI HELPERS
+# ============================================================
+
+def calculate_emi(loan_amount, annual_rate, tenure_years):
+    r = annual_rate / 12 / 100
+    n = tenure_years * 12
+    return loan_amount * r * (1 + r)**n / ((1 + r)**n - 1)
+
+
+def loan_from_emi(emi, annual_rate, tenure_years):
+    r = annual_rate / 12 / 100
+    n = tenure_years * 12
+    return emi * ((1 + r)**n - 1) / (r * (1 + r)**n)
+
+
+def min_down_payment_pct(property_price):
+    """RBI LTV norms: 10% up to 30L, 20% up to 75L, 25% above."""
+    price = np.asarray(property_price, dtype=float)
+    return np.select([price <= 3_000_000, price <= 7_500_000], [0.10, 0.20], default=0.25)
+
+
+# ============================================================
+# 2. EMI AMORTIZATION & YEARLY SPLIT
+# ============================================================
+
+def yearly_emi_split(loan_amount, annual_rate, tenure_years):
+    """
+    Closed-form replacement for emi_amortization + yearly_emi_split.
+    annual_rate may be a scalar or an array broadcastable against loan_amount.
+    Returns (interest, principal) arrays of shape loan_amount.shape + (tenure_years,).
+    """
+    loan = np.asarray(loan_amount, dtype=float)
+    rate = np.asarray(annual_rate, dtype=float)
+    emi = calculate_emi(loan, rate, tenure_years)[..., None]
+    r = (rate / 12 / 100)[..., None]
+
+    # Outstanding balance at the start of every year: B_k = L*g^k - EMI*(g^k - 1)/r
+    growth = (1 + r) ** (12 * np.arange(tenure_years + 1))
+    balance = loan[..., None] * growth - emi * (growth - 1) / r
+
+    principal = balance[..., :-1] - balance[..., 1:]
+    interest = 12 * emi - principal
+    return interest, principal
+
+
+# ============================================================
+# 3. YEARLY TAX REGIME SWITCHING
+# ============================================================
+
+def simulate_yearly_tax_switching(
+    yearly_interest,
+    yearly_principal,
+    starting_income,
+    salary_growth_rate,
+    financial_year=tax.DEFAULT_FY
+):
+    """
+    Picks the cheaper regime for every (property, year) pair, using the slabs of financial_year.
+    The last axis of yearly_interest / yearly_principal is the year.
+    Returns (total_tax_paid, total_tax_old, total_tax_new) with the year axis summed out.
+    """
+    n_years = yearly_interest.shape[-1]
+
+    # Salary grows every year
+    income = np.empty(n_years)
+    income[0] = starting_income
+    for year in range(1, n_years):
+        income[year] = income[year - 1] * (1 + salary_growth_rate)
+
+    interest_ded = np.minimum(yearly_interest, INTEREST_DEDUCTION_CAP)
+    principal_ded = np.minimum(yearly_principal, PRINCIPAL_DEDUCTION_CAP)
+
+    tax_old = tax.tax_old_regime(np.maximum(income - interest_ded - principal_ded, 0), financial_year)
+    tax_new = np.broadcast_to(tax.tax_new_regime(income, financial_year), tax_old.shape)
+    tax_paid = np.where(tax_old < tax_new, tax_old, tax_new)
+
+    total_tax_paid = tax_paid.sum(axis=-1)
+    total_tax_old = tax_old.sum(axis=-1)
+    total_tax_new = tax_new.sum(axis=-1)
+
+    return total_tax_paid, total_tax_old, total_tax_new
+
+
+# ============================================================
+# 4. RENTING MODEL
+# ============================================================
+
+def renting_model(
+    initial_monthly_rent,
+    down_payment,
+    monthly_emi,
+    rent_escalation_rate,
+    investment_return,
+    tenure_years,
+    salary_growth_rate=SALARY_GROWTH_RATE
+):
+    """
+    Closed form of the month-by-month SIP loop in calculations.ipynb.
+    Rent and income only change at year ends, so the SIP is constant within a
+    year: max(min(EMI, income - rent), 0). Its 12 contributions form a geometric
+    annuity sum_{k=1..12} g^k that then compounds for the remaining years,
+    which turns 240 scalar steps into one (N, years) computation.
+    """
+    monthly_return = investment_return / 12
+    g = 1 + monthly_return
+    years = np.arange(tenure_years)
+
+    annuity = g * (g**12 - 1) / monthly_return if monthly_return else 12.0
+    weight = annuity * g ** (12 * (tenure_years - 1 - years))   # (years,)
+
+    emi = np.asarray(monthly_emi, dtype=float)[..., None]
+    monthly_rent = np.asarray(initial_monthly_rent, dtype=float)[..., None] * (1 + rent_escalation_rate) ** years
+    monthly_income = emi * (1 + salary_growth_rate) ** years   # lifestyle cap
+    monthly_sip = np.maximum(np.minimum(emi, monthly_income - monthly_rent), 0)
+    sip_corpus = monthly_sip @ weight
+
+    lump_sum_value = down_payment * ((1 + investment_return) ** tenure_years)
+    return lump_sum_value + sip_corpus
+
+
+# ============================================================
+# 5. PORTFOLIO-LEVEL CALCULATION
+# ============================================================
+
+def run_engine(
+    input_df,
+    gross_annual_income=GROSS_ANNUAL_INCOME,
+    bank_rates_fp=BANK_RATES_FP,
+    tenure_years=TENURE_YEARS,
+    emi_ratio=EMI_RATIO,
+    appreciation_rate=APPRECIATION_RATE,
+    sip_return=SIP_RETURN,
+    rent_escalation_rate=RENT_ESCALATION_RATE,
+    salary_growth_rate=SALARY_GROWTH_RATE,
+    financial_year=tax.DEFAULT_FY
+):
+    """
+    Evaluates every property in input_df at once.
+    Returns the original columns plus the same computed columns as
+    kolkata_buy_vs_rent_full_analysis.csv.
+    The market assumptions default to the notebook values and can be
+    overridden for what-if scenarios.
+    """
+    price = input_df["Price"].to_numpy(dtype=float)
+    rent = input_df["Rent"].to_numpy(dtype=float)
+    avg_rate = float(np.mean(bank_rates_fp))
+
+    # ---------- AFFORDABILITY ----------
+    net_income = gross_annual_income - min(
+        tax.tax_old_regime(gross_annual_income, financial_year),
+        tax.tax_new_regime(gross_annual_income, financial_year)
+    )
+    max_emi = (net_income / 12) * emi_ratio
+    max_loan = loan_from_emi(max_emi, avg_rate, tenure_years)
+
+    dp_pct = min_down_payment_pct(price)
+    down_payment = price * dp_pct
+    loan_amount = np.minimum(price - down_payment, max_loan)
+
+    monthly_emi = calculate_emi(loan_amount, avg_rate, tenure_years)
+
+    # ---------- AMORTIZATION & TAX ----------
+    yearly_interest, yearly_principal = yearly_emi_split(loan_amount, avg_rate, tenure_years)
+    total_tax_paid, total_tax_old, total_tax_new = simulate_yearly_tax_switching(
+        yearly_interest,
+        yearly_principal,
+        gross_annual_income,
+        salary_growth_rate,
+        financial_year
+    )
+
+    avg_annual_tax_saving = (total_tax_new - total_tax_paid) / tenure_years
+    effective_monthly_emi = monthly_emi - (avg_annual_tax_saving / 12)
+
+    # ---------- BUY SIDE ----------
+    stamp_duty = price * STAMP_DUTY_RATE
+    maintenance = price * MAINTENANCE_RATE * tenure_years
+    property_tax = price * PROPERTY_TAX_RATE * tenure_years
+
+    final_property_value = price * ((1 + appreciation_rate) ** tenure_years)
+    final_buying_wealth = final_property_value - stamp_duty - maintenance - property_tax
+
+    # ---------- RENT SIDE ----------
+    final_renting_wealth = renting_model(
+        rent,
+        down_payment,
+        effective_monthly_emi,
+        rent_escalation_rate,
+        sip_return,
+        tenure_years,
+        salary_growth_rate
+    )
+
+    # ---------- MERGE original columns + computed values ----------
+    output = input_df.reset_index(drop=True).copy()
+    output["property_price"] = input_df["Price"].to_numpy()
+    output["property_price_lakhs"] = np.round(price / 1_00_000, 2)
+    output["initial_monthly_rent"] = input_df["Rent"].to_numpy()
+    output["down_payment_pct"] = dp_pct
+    output["down_payment"] = np.round(down_payment, 0)
+    output["loan_amount"] = np.round(loan_amount, 0)
+    output["monthly_emi"] = np.round(monthly_emi, 0)
+    output["effective_monthly_emi"] = np.round(effective_monthly_emi, 0)
+    output["chosen_tax_regime"] = "DYNAMIC"
+    output["total_tax_paid"] = np.round(total_tax_paid, 0)
+    output["total_tax_old"] = np.round(total_tax_old, 0)
+    output["total_tax_new"] = np.round(total_tax_new, 0)
+    output["final_property_value"] = np.round(final_property_value, 0)
+    output["final_buying_wealth"] = np.round(final_buying_wealth, 0)
+    output["final_renting_wealth"] = np.round(final_renting_wealth, 0)
+    output["decision"] = np.where(final_renting_wealth > final_buying_wealth, "RENT", "BUY")
+    # Pre-calculated for RAG; difference of the rounded columns, as in the published CSV
+    output["wealth_difference"] = output["final_buying_wealth"] - output["final_renting_wealth"]
+
+    return output[OUTPUT_COLUMNS]
+
+
+def compare_financial_years(input_df, financial_years=None, **params):
+    """
+    Runs the engine once per budget year and stacks the results with a
+    `financial_year` column, e.g. to see how many decisions flip between budgets.
+    """
+    financial_years = financial_years or tax.available_financial_years()
+    results = [
+        run_engine(input_df, financial_year=fy, **params).assign(financial_year=fy)
+        for fy in financial_years
+    ]
+    return pd.concat(results, ignore_index=True)
+
+
+def run_for_spreadsheet(
+    path,
+    gross_annual_income=GROSS_ANNUAL_INCOME,
+    bank_rates_fp=BANK_RATES_FP,
+    tenure_years=TENURE_YEARS,
+    emi_ratio=EMI_RATIO
+):
+    input_df = dataset.read_frame(path)
+    return run_engine(input_df, gross_annual_income, bank_rates_fp, tenure_years, emi_ratio)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Buy vs Rent analysis of the scraped properties")
+    parser.add_argument("--export-csv", action="store_true", help=f"also write {dataset.ANALYSIS_CSV}")
+    args = parser.parse_args()
+
+    output = run_for_spreadsheet(dataset.ensure_artifact(dataset.RAW_PATH, dataset.RAW_CSV))
+    if dataset.ARROW_AVAILABLE:
+        dataset.write_frame(output, dataset.ANALYSIS_PATH)
+        print(f"Saved {dataset.ANALYSIS_PATH}")
+        if args.export_csv:
+            print(f"Exported {dataset.export_csv(dataset.ANALYSIS_PATH, dataset.ANALYSIS_CSV)}")
+    else:
+        # Without pyarrow the CSV is the only format available
+        output.to_csv(dataset.ANALYSIS_CSV, index=False)
+        print(f"Saved {dataset.ANALYSIS_CSV} (pyarrow is not installed)")
+    print(output.head())
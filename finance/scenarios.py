@@ -0,0 +1,98 @@
+from functools import lru_cache
+
+from finance import engine
+
+# What-if scenarios over the whole portfolio.
+# Each distinct set of assumptions is computed once by the vectorized engine
+# and kept in an LRU cache, so switching back to a previous scenario is instant.
+
+SCENARIO_CACHE_SIZE = 32
+
+DEFAULT_SCENARIO = {
+    "gross_annual_income": engine.GROSS_ANNUAL_INCOME,
+    "loan_rate": round(sum(engine.BANK_RATES_FP) / len(engine.BANK_RATES_FP), 2),
+    "tenure_years": engine.TENURE_YEARS,
+    "appreciation_rate": engine.APPRECIATION_RATE,
+    "sip_return": engine.SIP_RETURN,
+    "rent_escalation_rate": engine.RENT_ESCALATION_RATE,
+}
+
+SCENARIO_COLUMNS = [
+    "down_payment", "loan_amount", "monthly_emi", "effective_monthly_emi",
+    "total_tax_paid", "final_property_value", "final_buying_wealth",
+    "final_renting_wealth", "decision", "wealth_difference"
+]
+
+
+def inputs_from_properties(df):
+    """
+    Maps the snake_case columns of the `properties` table back to the
+    spreadsheet column names the engine expects.
+    """
+    return df.rename(columns={c.lower(): c for c in engine.INPUT_COLUMNS})[engine.INPUT_COLUMNS]
+
+
+def scenario_key(**params):
+    """
+    Hashable, rounded form of a scenario (missing parameters fall back to
+    DEFAULT_SCENARIO). Rounding keeps slider floats like 0.07000000001 on the same key.
+    """
+    scenario = {**DEFAULT_SCENARIO, **params}
+    return (
+        round(float(scenario["gross_annual_income"]), 0),
+        round(float(scenario["loan_rate"]), 4),
+        int(scenario["tenure_years"]),
+        round(float(scenario["appreciation_rate"]), 4),
+        round(float(scenario["sip_return"]), 4),
+        round(float(scenario["rent_escalation_rate"]), 4),
+    )
+
+
+def is_default(**params):
+    return scenario_key(**params) == scenario_key()
+
+
+class ScenarioEngine:
+    """
+    Holds the property inputs in memory and memoizes engine runs per
+    parameter tuple (least recently used scenarios are evicted first).
+    """
+
+    def __init__(self, properties_df, maxsize=SCENARIO_CACHE_SIZE):
+        self.inputs = inputs_from_properties(properties_df).reset_index(drop=True)
+        self._run_cached = lru_cache(maxsize=maxsize)(self._run)
+
+    def _run(self, gross_annual_income, loan_rate, tenure_years,
+             appreciation_rate, sip_return, rent_escalation_rate):
+        output = engine.run_engine(
+            self.inputs,
+            gross_annual_income=gross_annual_income,
+            bank_rates_fp=[loan_rate],
+            tenure_years=tenure_years,
+            appreciation_rate=appreciation_rate,
+            sip_return=sip_return,
+            rent_escalation_rate=rent_escalation_rate
+        )
+        return output[SCENARIO_COLUMNS]
+
+    def run(self, **params):
+        """
+        Returns the scenario results, one row per property in input order.
+        Missing parameters fall back to DEFAULT_SCENARIO.
+        """
+        return self._run_cached(*scenario_key(**params))
+
+    def properties(self, **params):
+        """
+        The scenario results joined to the property inputs, with the
+        snake_case column names of the `properties` table.
+        """
+        frame = self.inputs.rename(columns=str.lower)
+        frame["price_per_sqft"] = frame["price"].where(frame["area"] > 0) / frame["area"]
+        result = self.run(**params)
+        for col in SCENARIO_COLUMNS:
+            frame[col] = result[col].to_numpy()
+        return frame
+
+    def cache_info(self):
+        return self._run_cached.cache_info()
@@ -0,0 +1,295 @@
+import argparse
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from finance import engine, tax
+from rag.db import DB_PATH, init_db
+
+# Monte Carlo risk simulation of wealth_difference.
+# Market-wide paths are drawn for appreciation, equity (SIP) returns, rent
+# escalation and the home loan rate, then every property is evaluated on every
+# path as a (paths x properties x years) array computation.
+# Work is split into locality-aligned property blocks (optionally fanned out
+# to a process pool) and each block is processed in path chunks so memory
+# stays bounded no matter how many paths are requested.
+
+# ============================================================
+# ASSUMPTIONS (means follow the deterministic engine)
+# ============================================================
+APPRECIATION_MEAN, APPRECIATION_SD = engine.APPRECIATION_RATE, 0.06
+MARKET_RETURN_MEAN, MARKET_RETURN_SD = engine.SIP_RETURN, 0.15
+RENT_ESCALATION_MEAN, RENT_ESCALATION_SD = engine.RENT_ESCALATION_RATE, 0.02
+LOAN_RATE_MEAN, LOAN_RATE_SD = float(np.mean(engine.BANK_RATES_FP)), 1.0
+LOAN_RATE_MIN, LOAN_RATE_MAX = 6.0, 14.0
+MIN_YEARLY_RATE = -0.95   # keeps (1 + rate) positive on extreme draws
+
+N_PATHS = 10_000
+SEED = 42
+SHORTFALL_LEVEL = 0.05     # expected shortfall over the worst 5% of paths
+BLOCK_SIZE = 256           # properties per task (rounded up to whole localities)
+MAX_CHUNK_ELEMENTS = 2_000_000  # paths x properties x years per chunk (~16 MB per float64 array)
+
+PROPERTY_TABLE = "simulation_properties"
+LOCALITY_TABLE = "simulation_localities"
+
+
+# ============================================================
+# 1. RANDOM PATHS
+# ============================================================
+
+def draw_paths(n_paths, tenure_years, seed=SEED):
+    """
+    Draws market-wide yearly paths. The same seed always gives the same paths,
+    so every worker can regenerate them instead of receiving them.
+    """
+    rng = np.random.default_rng(seed)
+    shape = (n_paths, tenure_years)
+    return {
+        "appreciation": np.maximum(rng.normal(APPRECIATION_MEAN, APPRECIATION_SD, shape), MIN_YEARLY_RATE),
+        "market_return": np.maximum(rng.normal(MARKET_RETURN_MEAN, MARKET_RETURN_SD, shape), MIN_YEARLY_RATE),
+        "rent_escalation": np.maximum(rng.normal(RENT_ESCALATION_MEAN, RENT_ESCALATION_SD, shape), MIN_YEARLY_RATE),
+        "loan_rate": np.clip(rng.normal(LOAN_RATE_MEAN, LOAN_RATE_SD, n_paths), LOAN_RATE_MIN, LOAN_RATE_MAX),
+    }
+
+
+# ============================================================
+# 2. WEALTH DIFFERENCE PER (PATH, PROPERTY)
+# ============================================================
+
+def _renting_wealth(rent, down_payment, effective_emi, rent_escalation, market_return, salary_growth_rate):
+    """
+    Renting side with a different SIP return every year.
+    Within a year the SIP is constant, so its 12 contributions form a geometric
+    annuity: sum_{k=1..12} (1+q)^k, then the year's total compounds through
+    every later year.
+    """
+    n_years = market_return.shape[1]
+    q = market_return / 12
+    year_growth = (1 + q) ** 12
+    safe_q = np.where(q == 0, 1.0, q)
+    annuity = np.where(q == 0, 12.0, (1 + q) * (year_growth - 1) / safe_q)
+
+    # Growth after year y = product of year_growth over the following years
+    later = np.cumprod(year_growth[:, ::-1], axis=1)[:, ::-1]
+    later = np.concatenate([later[:, 1:], np.ones((len(q), 1))], axis=1)
+    weight = annuity * later
+
+    rent_growth = np.cumprod(np.concatenate([np.ones((len(q), 1)), 1 + rent_escalation[:, :-1]], axis=1), axis=1)
+    salary_growth = (1 + salary_growth_rate) ** np.arange(n_years)
+
+    # In-place buffers: this loop touches every (path, property) cell once per year
+    monthly_rent = np.empty_like(effective_emi)
+    monthly_sip = np.empty_like(effective_emi)
+    sip_corpus = np.zeros_like(effective_emi)
+    for year in range(n_years):
+        np.multiply(rent, rent_growth[:, year:year + 1], out=monthly_rent)
+        np.multiply(effective_emi, salary_growth[year], out=monthly_sip)   # lifestyle cap grows with salary
+        np.subtract(monthly_sip, monthly_rent, out=monthly_sip)
+        np.minimum(monthly_sip, effective_emi, out=monthly_sip)
+        np.maximum(monthly_sip, 0, out=monthly_sip)
+        np.multiply(monthly_sip, weight[:, year:year + 1], out=monthly_sip)
+        sip_corpus += monthly_sip
+
+    lump_sum_value = down_payment * np.prod(1 + market_return, axis=1)[:, None]
+    return lump_sum_value + sip_corpus
+
+
+def simulate_wealth_difference(
+    price,
+    rent,
+    paths,
+    gross_annual_income=engine.GROSS_ANNUAL_INCOME,
+    tenure_years=engine.TENURE_YEARS,
+    emi_ratio=engine.EMI_RATIO,
+    salary_growth_rate=engine.SALARY_GROWTH_RATE
+):
+    """
+    Evaluates the Buy vs Rent model for K properties on P paths.
+    Returns wealth_difference (buying - renting) of shape (P, K).
+    """
+    price = np.asarray(price, dtype=float)
+    rent = np.asarray(rent, dtype=float)
+    loan_rate = paths["loan_rate"][:, None]   # (P, 1)
+
+    # ---------- AFFORDABILITY ----------
+    net_income = gross_annual_income - min(
+        tax.tax_old_regime(gross_annual_income),
+        tax.tax_new_regime(gross_annual_income)
+    )
+    max_emi = (net_income / 12) * emi_ratio
+    max_loan = engine.loan_from_emi(max_emi, loan_rate, tenure_years)
+
+    down_payment = price * engine.min_down_payment_pct(price)
+
+    # The loan side depends only on the loan needed, and every listing that
+    # needs more than the largest income-capped loan borrows exactly that cap,
+    # so it is evaluated once per distinct (clipped) loan requirement.
+    loan_needed = np.minimum(price - down_payment, max_loan.max())
+    unique_needed, loan_idx = np.unique(loan_needed, return_inverse=True)
+    loan_amount = np.minimum(unique_needed, max_loan)   # (P, U)
+    monthly_emi = engine.calculate_emi(loan_amount, loan_rate, tenure_years)
+
+    # ---------- AMORTIZATION & TAX ----------
+    yearly_interest, yearly_principal = engine.yearly_emi_split(loan_amount, loan_rate, tenure_years)
+    total_tax_paid, _, total_tax_new = engine.simulate_yearly_tax_switching(
+        yearly_interest, yearly_principal, gross_annual_income, salary_growth_rate
+    )
+    del yearly_interest, yearly_principal
+    effective_emi = monthly_emi - ((total_tax_new - total_tax_paid) / tenure_years) / 12
+    effective_emi = effective_emi[:, loan_idx]   # (P, K)
+
+    # ---------- BUY SIDE ----------
+    costs = price * (engine.STAMP_DUTY_RATE + (engine.MAINTENANCE_RATE + engine.PROPERTY_TAX_RATE) * tenure_years)
+    final_property_value = price * np.prod(1 + paths["appreciation"], axis=1)[:, None]
+    final_buying_wealth = final_property_value - costs
+
+    # ---------- RENT SIDE ----------
+    final_renting_wealth = _renting_wealth(
+        rent, down_payment, effective_emi,
+        paths["rent_escalation"], paths["market_return"], salary_growth_rate
+    )
+    return final_buying_wealth - final_renting_wealth
+
+
+# ============================================================
+# 3. SUMMARY STATISTICS
+# ============================================================
+
+def summarize(wealth_diff):
+    """
+    Column-wise risk statistics for a (paths x items) matrix.
+    Positive wealth difference favors BUY (ties count as BUY, like the engine).
+    """
+    p5, p50, p95 = np.percentile(wealth_diff, [5, 50, 95], axis=0)
+    cutoff = np.percentile(wealth_diff, SHORTFALL_LEVEL * 100, axis=0)
+    tail = wealth_diff <= cutoff
+    return {
+        "p_buy_wins": (wealth_diff >= 0).mean(axis=0),
+        "wd_mean": wealth_diff.mean(axis=0),
+        "wd_p5": p5,
+        "wd_p50": p50,
+        "wd_p95": p95,
+        "wd_expected_shortfall": (wealth_diff * tail).sum(axis=0) / tail.sum(axis=0),
+    }
+
+
+def _simulate_block(task):
+    """Worker entry point: simulates one locality-aligned block of properties."""
+    block, n_paths, seed, params = task
+    paths = draw_paths(n_paths, params["tenure_years"], seed)
+
+    price = block["price"].to_numpy(dtype=float)
+    rent = block["rent"].to_numpy(dtype=float)
+    wealth_diff = np.empty((n_paths, len(block)), dtype=np.float32)
+
+    chunk = max(1, MAX_CHUNK_ELEMENTS // (len(block) * (params["tenure_years"] + 1)))
+    for start in range(0, n_paths, chunk):
+        sub_paths = {k: v[start:start + chunk] for k, v in paths.items()}
+        wealth_diff[start:start + chunk] = simulate_wealth_difference(price, rent, sub_paths, **params)
+
+    prop_stats = block[["property_id", "name", "address", "price"]].reset_index(drop=True)
+    prop_stats = prop_stats.assign(**summarize(wealth_diff))
+
+    loc_rows = []
+    addresses = block["address"].to_numpy()
+    for address in pd.unique(addresses):
+        pooled = wealth_diff[:, addresses == address]
+        stats = summarize(pooled.reshape(-1, 1))
+        loc_rows.append({
+            "address": address,
+            "n_properties": pooled.shape[1],
+            **{k: float(v[0]) for k, v in stats.items()}
+        })
+    return prop_stats, pd.DataFrame(loc_rows)
+
+
+def _blocks(properties_df, block_size=BLOCK_SIZE):
+    """Splits properties into blocks that never cut a locality in two."""
+    ordered = properties_df.sort_values("address", kind="stable").reset_index(drop=True)
+    addresses = ordered["address"].to_numpy()
+    start = 0
+    while start < len(ordered):
+        end = min(start + block_size, len(ordered))
+        while end < len(ordered) and addresses[end] == addresses[end - 1]:
+            end += 1
+        yield ordered.iloc[start:end]
+        start = end
+
+
+# ============================================================
+# 4. PORTFOLIO RUN
+# ============================================================
+
+def run_simulation(
+    properties_df,
+    n_paths=N_PATHS,
+    seed=SEED,
+    workers=None,
+    gross_annual_income=engine.GROSS_ANNUAL_INCOME,
+    tenure_years=engine.TENURE_YEARS,
+    emi_ratio=engine.EMI_RATIO
+):
+    """
+    Runs the simulation for every row of properties_df (columns: property_id,
+    name, address, price, rent).
+    workers > 1 fans blocks out to a process pool; results are identical either way.
+    Returns (property_stats, locality_stats) DataFrames.
+    """
+    params = {
+        "gross_annual_income": gross_annual_income,
+        "tenure_years": tenure_years,
+        "emi_ratio": emi_ratio,
+    }
+    tasks = [(block, n_paths, seed, params) for block in _blocks(properties_df)]
+
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_simulate_block, tasks))
+    else:
+        results = [_simulate_block(t) for t in tasks]
+
+    prop_stats = pd.concat([r[0] for r in results], ignore_index=True)
+    loc_stats = pd.concat([r[1] for r in results], ignore_index=True)
+    prop_stats = prop_stats.sort_values("property_id").reset_index(drop=True)
+    loc_stats = loc_stats.sort_values("p_buy_wins", ascending=False).reset_index(drop=True)
+    return prop_stats, loc_stats
+
+
+def load_properties():
+    """Syncs the properties table with the analysis CSV (a no-op if unchanged) and reads the inputs."""
+    conn = init_db(reload=True)
+    try:
+        return pd.read_sql("SELECT property_id, name, address, price, rent FROM properties", conn)
+    finally:
+        conn.close()
+
+
+def save_results(prop_stats, loc_stats, db_path=DB_PATH):
+    """Stores the results next to `properties` so the RAG layer can cite them."""
+    conn = sqlite3.connect(db_path)
+    try:
+        prop_stats.to_sql(PROPERTY_TABLE, conn, if_exists="replace", index=False)
+        loc_stats.to_sql(LOCALITY_TABLE, conn, if_exists="replace", index=False)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo risk simulation of wealth_difference")
+    parser.add_argument("--paths", type=int, default=N_PATHS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    properties = load_properties()
+    prop_stats, loc_stats = run_simulation(properties, n_paths=args.paths, seed=args.seed, workers=args.workers)
+    save_results(prop_stats, loc_stats)
+
+    print(f"Simulated {args.paths} paths x {len(properties)} properties in {time.perf_counter() - start:.1f}s")
+    print(loc_stats.head(10).to_string(index=False))
@@ -0,0 +1,81 @@
+import json
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+# Income tax (old & new regime) from versioned slab tables.
+# Each financial year's slabs are compiled once into cumulative arrays, so the
+# tax for any number of incomes is one np.searchsorted lookup plus one
+# multiply-add instead of a Python loop over slabs.
+
+TAX_TABLES_PATH = os.path.join(os.path.dirname(__file__), "tax_slabs.json")
+DEFAULT_FY = "FY2025-26"
+
+# lower: slab start, rate: marginal rate, base: tax due on everything below `lower`
+CompiledRegime = namedtuple("CompiledRegime", ["lower", "rate", "base", "rebate_87a_limit", "standard_deduction"])
+
+
+@lru_cache(maxsize=1)
+def load_tax_tables():
+    with open(TAX_TABLES_PATH, "r") as f:
+        return json.load(f)
+
+
+def available_financial_years():
+    return sorted(load_tax_tables().keys())
+
+
+@lru_cache(maxsize=None)
+def get_regime(regime, fy=DEFAULT_FY):
+    """
+    Compiles the slab table for ("old" | "new", financial year) into cumulative arrays.
+    Cached, so each table is built only once per process.
+    """
+    tables = load_tax_tables()
+    if fy not in tables:
+        raise ValueError(f"No tax slabs for {fy}. Available: {', '.join(available_financial_years())}")
+    table = tables[fy][regime.lower()]
+
+    lower, rate, base = [], [], []
+    prev, due = 0.0, 0.0
+    for limit, slab_rate in table["slabs"]:
+        limit = float("inf") if limit is None else float(limit)
+        lower.append(prev)
+        rate.append(slab_rate)
+        base.append(due)
+        if limit != float("inf"):
+            due += (limit - prev) * slab_rate
+        prev = limit
+
+    return CompiledRegime(
+        np.array(lower), np.array(rate), np.array(base),
+        float(table["rebate_87a_limit"]), float(table.get("standard_deduction", 0))
+    )
+
+
+def income_tax(income, regime, fy=DEFAULT_FY):
+    """
+    Tax for a scalar or an array of incomes.
+    The standard deduction is taken first, and the 87A rebate zeroes the tax
+    when taxable income is within the rebate limit.
+    """
+    table = get_regime(regime, fy)
+    income_arr = np.asarray(income, dtype=float)
+    taxable = np.maximum(income_arr - table.standard_deduction, 0) if table.standard_deduction else income_arr
+
+    idx = np.searchsorted(table.lower, taxable, side="left") - 1
+    idx = np.maximum(idx, 0)
+    tax = table.base[idx] + (taxable - table.lower[idx]) * table.rate[idx]
+    tax = np.where(taxable <= table.rebate_87a_limit, 0.0, tax)
+
+    return float(tax) if tax.ndim == 0 else tax
+
+
+def tax_old_regime(income, fy=DEFAULT_FY):
+    return income_tax(income, "old", fy)
+
+
+def tax_new_regime(income, fy=DEFAULT_FY):
+    return income_tax(income, "new", fy)
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+# In-process index of the educational concepts (rag/educational_concepts.json).
+# EDUCATIONAL questions pick among a few dozen concepts, so instead of Chroma's
+# persistent HNSW stack they are answered by a dot product against a normalized
+# embedding matrix held in memory (optionally int8-quantized). The matrix is
+# cached on disk next to a hash of the JSON, the model and the quantization, and
+# only re-embedded when one of them changes; query embeddings are LRU-cached.
+
+CONCEPTS_PATH = os.path.join(os.path.dirname(__file__), "educational_concepts.json")
+INDEX_PATH = os.getenv("CONCEPT_INDEX_PATH", "concept_index.npz")
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+QUANTIZE = os.getenv("CONCEPT_INDEX_INT8") == "1"
+
+
+def load_concepts(path=CONCEPTS_PATH):
+    """(topic, text) per concept, in file order. The text is what gets embedded and returned."""
+    with open(path, "r") as f:
+        concepts = json.load(f)
+    # Richer context format for the LLM
+    return [
+        (c['topic'], f"Topic: {c['topic']}\nQuestion: {c['question']}\nExplanation: {c['content']}")
+        for c in concepts
+    ]
+
+
+def quantize(matrix):
+    """Symmetric per-row int8 quantization: matrix ~= codes * scales[:, None]."""
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(matrix / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class ConceptIndex:
+    """Normalized embeddings of the concepts with exact dot-product top-k."""
+
+    def __init__(self, concepts_path=CONCEPTS_PATH, index_path=INDEX_PATH, quantized=QUANTIZE):
+        self.concepts_path = concepts_path
+        self.index_path = index_path
+        self.quantized = quantized
+        self.texts = []
+        self.matrix = None      # float32, or int8 codes when quantized
+        self.scales = None      # per-row scales for the int8 codes
+        self._encoder = None
+        self._lock = threading.Lock()
+        self.embed_query = lru_cache(maxsize=1024)(self._embed_query)
+
+    def content_hash(self):
+        with open(self.concepts_path, "rb") as f:
+            payload = f.read()
+        key = f"{EMBEDDING_MODEL}\x1f{int(self.quantized)}\x1f".encode("utf-8") + payload
+        return hashlib.sha256(key).hexdigest()[:16]
+
+    def _encode(self, texts):
+        if self._encoder is None:
+            from rag.llm_cache import load_encoder
+            self._encoder = load_encoder()
+        matrix = np.asarray(self._encoder(list(texts)), dtype=np.float32)
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    def _embed_query(self, query):
+        vector = self._encode([query])[0]
+        vector.setflags(write=False)
+        return vector
+
+    def load(self, build=True):
+        """
+        Loads the cached matrix if its hash is current, otherwise (build=True)
+        embeds the concepts and caches them.
+        """
+        with self._lock:
+            if self.matrix is not None:
+                return self
+            digest = self.content_hash()
+            self.texts = [text for _, text in load_concepts(self.concepts_path)]
+            if os.path.exists(self.index_path):
+                cached = np.load(self.index_path)
+                if str(cached["hash"]) == digest:
+                    self.matrix = cached["matrix"]
+                    self.scales = cached["scales"] if self.quantized else None
+                    return self
+            if not build:
+                return self
+
+            matrix = self._encode(self.texts)
+            if self.quantized:
+                matrix, self.scales = quantize(matrix)
+            self.matrix = matrix
+            tmp_path = self.index_path + ".tmp.npz"
+            np.savez(tmp_path, hash=digest, matrix=matrix,
+                     scales=self.scales if self.quantized else np.ones(len(matrix), dtype=np.float32))
+            os.replace(tmp_path, self.index_path)
+            return self
+
+    def search(self, query, k=1):
+        """The k best concepts as (score, text), best first."""
+        self.load()
+        vector = self.embed_query(query)
+        scores = self.matrix @ vector
+        if self.quantized:
+            scores = scores * self.scales
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.texts[i]) for i in top]
+
+    def search_text(self, query, k=1):
+        """Same shape as vector_store.semantic_search: the texts joined by blank lines."""
+        return "\n\n".join(text for _, text in self.search(query, k))
+
+
+index = ConceptIndex()
+
+# Loaded at import from the disk cache when it is current (no model needed);
+# otherwise built on the first search
+try:
+    index.load(build=False)
+except Exception as e:
+    print(f"Concept index: disk cache not loaded ({e})")
@@ -1,55 +1,448 @@
+import numpy as np
 import pandas as pd
 import sqlite3
 import os
+import json
+import hashlib
+import queue
+import threading
+from contextlib import contextmanager
+
+from finance import dataset
+from rag import safe_sql
+from rag.query_cache import QueryCache, canonicalize_sql
 
 DB_PATH = "real_estate.db"
-CSV_PATH = "kolkata_buy_vs_rent_full_analysis.csv"
+DATA_PATH = dataset.ANALYSIS_PATH     # typed Arrow artifact (memory-mapped on load)
+CSV_PATH = dataset.ANALYSIS_CSV       # imported into DATA_PATH when newer
+
+# --- Read Connection Pool ---
+# One pool per process, shared by every Streamlit session. Connections are
+# read-only (URI mode=ro) and stay open, so a query no longer pays for
+# connect + PRAGMAs, and WAL mode lets readers run while the loader writes.
+POOL_SIZE = 4
+POOL_TIMEOUT = 10           # seconds to wait for a free connection
+CACHE_SIZE_KB = 16384       # page cache per connection (16 MB)
+MMAP_SIZE = 256 * 1024 * 1024
+CACHED_STATEMENTS = 256     # prepared statements kept per connection
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_pool_lock = threading.Lock()
+_pool_created = 0
+
+def _open_read_connection():
+    uri = f"file:{os.path.abspath(DB_PATH)}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA query_only = ON")
+    try:
+        # Connect the FTS5 table up front: its constructor reads the schema,
+        # which the safe_sql authorizer would refuse mid-query
+        conn.execute(f"SELECT rowid FROM {FTS_TABLE} LIMIT 0").fetchall()
+    except sqlite3.Error:
+        pass
+    return conn
+
+@contextmanager
+def read_connection():
+    """
+    Borrows a pooled read-only connection. New connections are opened lazily
+    up to POOL_SIZE; after that callers wait for one to be returned.
+    """
+    global _pool_created
+    conn = None
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        with _pool_lock:
+            if _pool_created < POOL_SIZE:
+                conn = _open_read_connection()
+                _pool_created += 1
+        if conn is None:
+            conn = _pool.get(timeout=POOL_TIMEOUT)
+    try:
+        yield conn
+    finally:
+        _pool.put(conn)
+
+def close_pool():
+    """Closes every idle pooled connection (e.g. before replacing the database file)."""
+    global _pool_created
+    with _pool_lock:
+        while True:
+            try:
+                _pool.get_nowait().close()
+                _pool_created -= 1
+            except queue.Empty:
+                break
+
+def read_sql(query, params=None):
+    """Runs a read query on a pooled connection and returns a DataFrame."""
+    with read_connection() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+# --- Incremental Loader ---
+# The dataset is only re-ingested when its content or the filter config changes.
+# File size/mtime are checked first (no read at all), then a SHA-256 of the
+# content; when something did change, only rows whose content hash differs
+# are deleted/inserted, keyed by a stable property_id.
+META_TABLE = "load_metadata"
+HASH_TABLE = "property_hashes"
+MAX_RENTAL_YIELD_PCT = 6
+LOADER_VERSION = 3          # bump when the normalization/filter code or the schema changes
+IDENTITY_COLUMNS = ['name', 'address', 'bedrooms', 'area']
+
+# --- Properties Schema ---
+# Owned here rather than inferred by pandas, so the table has real types,
+# a primary key and indexes for the filters the SQL generator emits.
+PROPERTY_COLUMNS = {
+    'property_id': 'TEXT PRIMARY KEY',
+    'name': 'TEXT',
+    'address': 'TEXT',
+    'bedrooms': 'INTEGER',
+    'price': 'REAL',
+    'rent': 'REAL',
+    'area': 'REAL',
+    'furnishing': 'TEXT',
+    'property_price': 'REAL',
+    'property_price_lakhs': 'REAL',
+    'initial_monthly_rent': 'REAL',
+    'down_payment_pct': 'REAL',
+    'down_payment': 'REAL',
+    'loan_amount': 'REAL',
+    'monthly_emi': 'REAL',
+    'effective_monthly_emi': 'REAL',
+    'chosen_tax_regime': 'TEXT',
+    'total_tax_paid': 'REAL',
+    'total_tax_old': 'REAL',
+    'total_tax_new': 'REAL',
+    'final_property_value': 'REAL',
+    'final_buying_wealth': 'REAL',
+    'final_renting_wealth': 'REAL',
+    'decision': 'TEXT',
+    'wealth_difference': 'REAL',
+}
+# Computed by SQLite on write, so readers never recompute them
+GENERATED_COLUMNS = {
+    'locality': "TEXT GENERATED ALWAYS AS (lower(trim(address))) STORED",
+    'price_per_sqft': "REAL GENERATED ALWAYS AS (CASE WHEN area > 0 THEN price / area END) STORED",
+    'rental_yield': "REAL GENERATED ALWAYS AS (CASE WHEN price > 0 THEN (rent * 12.0 / price) * 100 END) STORED",
+}
+INDEXED_COLUMNS = ['decision', 'bedrooms', 'price', 'rent', 'wealth_difference', 'locality']
+FTS_TABLE = "properties_fts"
+
+def create_properties_schema(conn):
+    """
+    (Re)creates the properties table, its indexes and the FTS5 index on name/address.
+    Statement by statement (executescript would commit), so it stays inside the caller's transaction.
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    conn.execute("DROP TABLE IF EXISTS properties")
+    
+    columns = [f"{c} {t}" for c, t in {**PROPERTY_COLUMNS, **GENERATED_COLUMNS}.items()]
+    conn.execute("CREATE TABLE properties (\n    " + ",\n    ".join(columns) + "\n)")
+    for col in INDEXED_COLUMNS:
+        conn.execute(f"CREATE INDEX idx_properties_{col} ON properties({col})")
+    
+    # External-content FTS5 index, kept in sync by triggers
+    conn.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"name, address, content='properties', content_rowid='rowid', prefix='2 3')"
+    )
+    triggers = [
+        f"""CREATE TRIGGER properties_ai AFTER INSERT ON properties BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, name, address) VALUES (new.rowid, new.name, new.address);
+        END""",
+        f"""CREATE TRIGGER properties_ad AFTER DELETE ON properties BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, address) VALUES ('delete', old.rowid, old.name, old.address);
+        END""",
+        f"""CREATE TRIGGER properties_au AFTER UPDATE ON properties BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, address) VALUES ('delete', old.rowid, old.name, old.address);
+            INSERT INTO {FTS_TABLE}(rowid, name, address) VALUES (new.rowid, new.name, new.address);
+        END""",
+    ]
+    for trigger in triggers:
+        conn.execute(trigger)
+
+def insert_frame(conn, table, df):
+    """Appends df's rows to table. Unlike DataFrame.to_sql it never commits, so it stays inside the caller's transaction."""
+    columns = ", ".join(df.columns)
+    placeholders = ", ".join("?" * len(df.columns))
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    conn.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", rows)
+
+def fts_match_expression(text):
+    """'salt lake' -> '"salt"* AND "lake"*' (prefix match on every word)."""
+    words = [w for w in "".join(ch if ch.isalnum() else " " for ch in str(text).lower()).split() if w]
+    return " AND ".join(f'"{w}"*' for w in words)
+
+def _filter_config():
+    return json.dumps({"max_rental_yield_pct": MAX_RENTAL_YIELD_PCT, "loader_version": LOADER_VERSION}, sort_keys=True)
+
+def _file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _read_meta(conn):
+    try:
+        return dict(conn.execute(f"SELECT key, value FROM {META_TABLE}").fetchall())
+    except sqlite3.OperationalError:
+        return {}
+
+def _write_meta(conn, **values):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {META_TABLE} (key, value) VALUES (?, ?)",
+        [(k, str(v)) for k, v in values.items()]
+    )
+
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+def _row_hashes(df, columns):
+    joined = df[columns].astype(str).agg("\x1f".join, axis=1)
+    return joined.map(lambda s: hashlib.sha1(s.encode("utf-8")).hexdigest())
+
+def _conform_dtypes(df):
+    """
+    Casts to the table's column types, so ids and row hashes don't depend on
+    the storage dtypes (categoricals, downcast ints) of the source file.
+    """
+    for col, sql_type in PROPERTY_COLUMNS.items():
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(values.cat.categories.dtype)
+        if sql_type.startswith('REAL'):
+            values = values.astype('float64')
+        elif sql_type.startswith('INTEGER') and values.notna().all():
+            values = values.astype('int64')
+        df[col] = values
+    return df
+
+def load_frame(path=DATA_PATH):
+    """
+    Reads the analysis dataset (Arrow artifact or CSV), normalizes column names,
+    applies the global yield filter and adds property_id / row_hash.
+    """
+    df = dataset.read_frame(path)
+    
+    # Clean Columns for SQL (remove spaces, special chars)
+    # We want deterministic SQL queries, so simple names are better
+    df.columns = [c.strip().replace(" ", "_").replace("(", "").replace(")", "").lower() for c in df.columns]
+    
+    # --- FILTERING LOGIC (Applied Globally) ---
+    # Remove unrealistic rental yields (> 6%) and invalid data
+    if 'rent' in df.columns and 'price' in df.columns:
+        # Ensure numeric types to avoid errors
+        df['rent'] = pd.to_numeric(df['rent'], errors='coerce')
+        df['price'] = pd.to_numeric(df['price'], errors='coerce')
+        
+        # Avoid division by zero
+        mask_valid = (df['price'] > 0) & (df['rent'] > 0)
+        df = df[mask_valid].copy()
+        
+        # Keeping only realistic investments
+        calculated_yield = (df['rent'] * 12 / df['price']) * 100
+        df = df[calculated_yield <= MAX_RENTAL_YIELD_PCT]
+    
+    # Stable id: listing identity + occurrence number (the scrape has exact duplicates)
+    identity = [c for c in IDENTITY_COLUMNS if c in df.columns]
+    occurrence = df.groupby(identity, sort=False, dropna=False).cumcount().astype(str)
+    df.insert(0, 'property_id', _row_hashes(df, identity).str[:16] + "-" + occurrence)
+    
+    # Conform to the table schema (extra columns are dropped, missing ones are NULL)
+    df = _conform_dtypes(df.reindex(columns=list(PROPERTY_COLUMNS)))
+    data_columns = [c for c in df.columns if c != 'property_id']
+    return df.reset_index(drop=True), _row_hashes(df, data_columns).to_numpy()
+
+def sync_properties(conn, path=DATA_PATH):
+    """
+    Brings the properties table in line with the dataset file.
+    Returns "unchanged", "rebuilt" or "updated (+added ~changed -removed)".
+    """
+    meta = _read_meta(conn)
+    stat = os.stat(path)
+    config = _filter_config()
+    has_table = 'property_id' in _table_columns(conn, 'properties')
+    same_config = has_table and meta.get('filter_config') == config
+    
+    # 1. Cheapest gate: same file size and mtime, nothing is read
+    if same_config and meta.get('source_path') == path and meta.get('source_size') == str(stat.st_size) and meta.get('source_mtime_ns') == str(stat.st_mtime_ns):
+        return "unchanged"
+    
+    # 2. File was touched: compare content hash
+    digest = _file_sha256(path)
+    if same_config and meta.get('source_path') == path and meta.get('source_sha256') == digest:
+        with conn:
+            _write_meta(conn, source_size=stat.st_size, source_mtime_ns=stat.st_mtime_ns)
+        return "unchanged"
+    
+    df, row_hash = load_frame(path)
+    hashes = pd.DataFrame({'property_id': df['property_id'], 'row_hash': row_hash})
+    version = int(meta.get('data_version', 0)) + 1
+    
+    # One write transaction around the DDL and the rows: readers keep the old table until COMMIT,
+    # and a failure partway rolls everything back
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if not has_table or _table_columns(conn, 'properties') != list(PROPERTY_COLUMNS):
+            # 3a. First load or schema changed: full rebuild
+            create_properties_schema(conn)
+            insert_frame(conn, "properties", df)
+            conn.execute(f"DROP TABLE IF EXISTS {HASH_TABLE}")
+            conn.execute(f"CREATE TABLE {HASH_TABLE} (property_id TEXT, row_hash TEXT)")
+            insert_frame(conn, HASH_TABLE, hashes)
+            conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{HASH_TABLE}_id ON {HASH_TABLE}(property_id)")
+            status = "rebuilt"
+        else:
+            # 3b. Upsert only rows whose content hash changed
+            old = dict(conn.execute(f"SELECT property_id, row_hash FROM {HASH_TABLE}").fetchall())
+            new = dict(zip(hashes['property_id'], hashes['row_hash']))
+            removed = [pid for pid in old if pid not in new]
+            changed = [pid for pid, h in new.items() if old.get(pid) != h]
+            
+            stale = [(pid,) for pid in removed + changed]
+            conn.executemany("DELETE FROM properties WHERE property_id = ?", stale)
+            conn.executemany(f"DELETE FROM {HASH_TABLE} WHERE property_id = ?", stale)
+            
+            changed_mask = df['property_id'].isin(set(changed))
+            insert_frame(conn, "properties", df[changed_mask])
+            insert_frame(conn, HASH_TABLE, hashes[changed_mask])
+            added = sum(pid not in old for pid in changed)
+            status = f"updated (+{added} ~{len(changed) - added} -{len(removed)})"
+        
+        _write_meta(
+            conn,
+            source_path=path, source_size=stat.st_size, source_mtime_ns=stat.st_mtime_ns,
+            source_sha256=digest, filter_config=config, data_version=version
+        )
+    return status
+
+def get_data_version():
+    """Increments every time sync_properties changes the table (0 if never loaded)."""
+    try:
+        with read_connection() as conn:
+            row = conn.execute(f"SELECT value FROM {META_TABLE} WHERE key = 'data_version'").fetchone()
+        return int(row[0]) if row else 0
+    except sqlite3.Error:
+        return 0
+
+# --- Market Aggregates ---
+# Small per-locality / per-bedroom tables behind the Market Analytics tabs.
+# They are rebuilt only when data_version moves, so a page render reads a few
+# hundred aggregate rows instead of the whole properties table.
+MIN_LOCALITY_LISTINGS = 4   # areas with fewer listings are left out of the charts
+QUADRANTS = [
+    "Best Investment (High Rent, Low Price)",
+    "Lifestyle (High Rent, High Price)",
+    "Budget Living (Low Rent, Low Price)",
+    "Avoid (Low Rent, High Price)",
+]
+
+def classify_quadrants(avg_price, avg_rent):
+    """
+    Price vs rent quadrant of every area, split at the medians.
+    Returns (labels, median_price, median_rent).
+    """
+    price = np.asarray(avg_price, dtype=float)
+    rent = np.asarray(avg_rent, dtype=float)
+    median_price, median_rent = np.median(price), np.median(rent)
+    high_rent, low_price = rent >= median_rent, price < median_price
+    labels = np.select(
+        [high_rent & low_price, high_rent, low_price],
+        QUADRANTS[:3], default=QUADRANTS[3]
+    )
+    return labels, median_price, median_rent
+
+def compute_locality_stats(df):
+    """Per-address averages, listing counts and (for popular areas) the investment quadrant."""
+    df = df[df['address'].notna()].assign(is_buy=lambda d: d['decision'] == 'BUY')
+    loc = df.groupby('address').agg(
+        count=('price', 'count'),
+        avg_price=('price', 'mean'),
+        avg_rent=('rent', 'mean'),
+        avg_price_sqft=('price_per_sqft', 'mean'),
+        avg_wealth_difference=('wealth_difference', 'mean'),
+        buy_count=('is_buy', 'sum'),
+    ).reset_index()
+    loc['avg_price_lakhs'] = loc['avg_price'] / 100000
+    
+    popular = (loc['count'] >= MIN_LOCALITY_LISTINGS).to_numpy()
+    loc['quadrant'] = None
+    if popular.any():
+        labels, _, _ = classify_quadrants(loc.loc[popular, 'avg_price_lakhs'], loc.loc[popular, 'avg_rent'])
+        loc.loc[popular, 'quadrant'] = labels
+    return loc
+
+def compute_bedroom_stats(df):
+    """Per-bedroom price quartiles/whiskers, down payment and EMI ranges and the buy/rent split."""
+    df = df[df['bedrooms'].notna()].assign(is_buy=lambda d: d['decision'] == 'BUY')
+    grouped = df.groupby('bedrooms')
+    beds = grouped.agg(
+        count=('price', 'count'),
+        min_price=('price', 'min'), max_price=('price', 'max'),
+        min_dp=('down_payment', 'min'), max_dp=('down_payment', 'max'),
+        min_emi=('monthly_emi', 'min'), max_emi=('monthly_emi', 'max'),
+        buy_count=('is_buy', 'sum'),
+    )
+    quartiles = grouped['price'].quantile([0.25, 0.5, 0.75]).unstack()
+    beds['q1_price'], beds['median_price'], beds['q3_price'] = quartiles[0.25], quartiles[0.5], quartiles[0.75]
+    
+    # Box plot whiskers: most extreme prices within 1.5 IQR of the quartiles
+    iqr = df['bedrooms'].map(beds['q3_price'] - beds['q1_price'])
+    lo = df['price'] >= df['bedrooms'].map(beds['q1_price']) - 1.5 * iqr
+    hi = df['price'] <= df['bedrooms'].map(beds['q3_price']) + 1.5 * iqr
+    beds['lower_fence'] = df[lo].groupby('bedrooms')['price'].min()
+    beds['upper_fence'] = df[hi].groupby('bedrooms')['price'].max()
+    
+    beds['rent_count'] = beds['count'] - beds['buy_count']
+    return beds.reset_index()
+
+def refresh_stats(conn, force=False):
+    """
+    Rebuilds locality_stats / bedroom_stats when they are older than the
+    properties table. Returns True if they were rebuilt.
+    """
+    meta = _read_meta(conn)
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    current = {'locality_stats', 'bedroom_stats'} <= tables and meta.get('stats_version') == meta.get('data_version')
+    if 'properties' not in tables or (current and not force):
+        return False
+    
+    df = pd.read_sql_query(
+        "SELECT address, bedrooms, price, rent, price_per_sqft, down_payment, monthly_emi, "
+        "decision, wealth_difference FROM properties", conn
+    )
+    with conn:
+        compute_locality_stats(df).to_sql("locality_stats", conn, if_exists="replace", index=False)
+        compute_bedroom_stats(df).to_sql("bedroom_stats", conn, if_exists="replace", index=False)
+        _write_meta(conn, stats_version=meta.get('data_version', 0))
+    return True
 
 def init_db(reload=True):
     """
     Initializes the SQLite database.
-    If reload is True, it converts the detailed analysis CSV into a SQL table.
+    If reload is True, the properties table is synced with the analysis dataset
+    (a no-op when neither the dataset nor the filter config changed). A newer
+    analysis CSV is first imported into the typed artifact.
     """
-    # 1. Connect to SQLite
+    # 1. Connect to SQLite (WAL so pooled readers never block on the writer)
     conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
     
     if reload: 
-        if os.path.exists(CSV_PATH):
-            # 2. Load Data
-            df = pd.read_csv(CSV_PATH)
-            
-            # 3. Clean Columns for SQL (remove spaces, special chars)
-            # We want deterministic SQL queries, so simple names are better
-            df.columns = [c.strip().replace(" ", "_").replace("(", "").replace(")", "").lower() for c in df.columns]
-            
-            # --- FILTERING LOGIC (Applied Globally) ---
-            # Remove unrealistic rental yields (> 6%) and invalid data
-            if 'rent' in df.columns and 'price' in df.columns:
-                # Calculate yield dynamically for filtering
-                # Note: We don't save this column unless we want it in DB, but filtering is the goal
-                # Ensure numeric types to avoid errors
-                df['rent'] = pd.to_numeric(df['rent'], errors='coerce')
-                df['price'] = pd.to_numeric(df['price'], errors='coerce')
-                
-                # Calculate yield
-                # Avoid division by zero
-                mask_valid = (df['price'] > 0) & (df['rent'] > 0)
-                df = df[mask_valid].copy()
-                
-                calculated_yield = (df['rent'] * 12 / df['price']) * 100
-                
-                # Filter strict <= 6%
-                # Keeping only realistic investments
-                initial_count = len(df)
-                df = df[calculated_yield <= 6]
-                
-                # print(f"Data Cleaning: Removed {initial_count - len(df)} properties with yield > 6% or invalid data.")
-            
-            # 4. Write to SQL
-            df.to_sql("properties", conn, if_exists="replace", index=False)
-            # print("Database initialized and data loaded from CSV (Filtered).")
+        source = dataset.ensure_artifact(DATA_PATH, CSV_PATH)
+        if os.path.exists(source):
+            # 2. Sync Data (and the aggregates derived from it)
+            if sync_properties(conn, source) != "unchanged":
+                query_cache.clear()
+            refresh_stats(conn)
         else:
-            print(f"Error: {CSV_PATH} not found.")
+            print(f"Error: {source} not found.")
             
     return conn
 
@@ -57,32 +450,98 @@ def get_schema():
     """
     Returns the schema of the properties table to help with SQL generation.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA table_info(properties)")
-    columns = cursor.fetchall()
-    conn.close()
+    with read_connection() as conn:
+        # table_xinfo also lists the generated columns (table_info hides them)
+        columns = conn.execute("PRAGMA table_xinfo(properties)").fetchall()
+        indexes = conn.execute("PRAGMA index_list(properties)").fetchall()
+        has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,)).fetchone()
     
-    # Format: (cid, name, type, notnull, dflt_value, pk)
+    # Format: (cid, name, type, notnull, dflt_value, pk, hidden)
     # We just return name and type
     schema_str = "Table: properties\nColumns:\n"
     for col in columns:
-        schema_str += f"- {col[1]} ({col[2]})\n"
+        col_type = col[2].replace("GENERATED ALWAYS", "").strip()
+        schema_str += f"- {col[1]} ({col_type})\n"
+    
+    indexed = [c for c in INDEXED_COLUMNS if any(idx[1] == f"idx_properties_{c}" for idx in indexes)]
+    if indexed:
+        schema_str += f"Indexed columns (fast filters/sorting): {', '.join(indexed)}\n"
+        schema_str += "- locality is lower(trim(address)); prefer it for exact area matches.\n"
+    if has_fts:
+        schema_str += (
+            f"Full-text index: {FTS_TABLE}(name, address). Fast fuzzy area filter: "
+            f"rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH '\"salt\"* AND \"lake\"*')\n"
+        )
     return schema_str
 
-def execute_sql_query(query):
+_row_counts = (None, {})
+
+def table_row_counts():
+    """{table: rows} for the plan check, recounted when the data version changes."""
+    global _row_counts
+    version = get_data_version()
+    if _row_counts[0] != version:
+        counts = {t: int(read_sql(f"SELECT COUNT(*) AS n FROM {t}")['n'].iloc[0]) for t in safe_sql.ALLOWED_TABLES}
+        _row_counts = (version, counts)
+    return _row_counts[1]
+
+def execute_sql_query(query, params=None):
     """
-    Executes a read-only SQL query and returns the results as a DataFrame.
+    Executes a read-only SQL query (optionally parameterized) and returns the results as a DataFrame.
+    Generated SQL goes through rag/safe_sql.py: authorizer (one SELECT over properties only),
+    query plan check, time budget and a row cap (df.attrs["truncated"] marks a capped result).
     """
-    conn = sqlite3.connect(DB_PATH)
     try:
-        # Security check: rudimentary prevention of write operations
-        if any(x in query.upper() for x in ['DROP', 'DELETE', 'INSERT', 'UPDATE', 'ALTER']):
-            return None, "Error: Only SELECT queries are permitted."
-            
-        df = pd.read_sql_query(query, conn)
+        counts = table_row_counts()
+        with read_connection() as conn:
+            df = safe_sql.run_query(conn, query, params, table_rows=counts)
         return df, None
     except Exception as e:
         return None, str(e)
-    finally:
-        conn.close()
+
+# Shared by every session; keys carry the data version, so results computed
+# before a reload can never be served afterwards.
+query_cache = QueryCache()
+
+def execute_cached_query(query, prepare=None, params=None):
+    """
+    execute_sql_query behind the result cache (params are part of the key).
+    prepare(df) -> (df, explanation) runs once on a miss and its output is
+    what gets cached. Errors are not cached.
+    Returns (df, explanation, error).
+    """
+    key = (canonicalize_sql(query), tuple(params or ()), get_data_version())
+    cached = query_cache.get(key)
+    if cached is not None:
+        return cached[0], cached[1], None
+    
+    df, error = execute_sql_query(query, params)
+    if error:
+        return None, None, error
+    df, explanation = prepare(df) if prepare else (df, None)
+    query_cache.put(key, (df, explanation))
+    return df, explanation, None
+
+def attach_risk_metrics(df):
+    """
+    Adds the Monte Carlo risk columns (see finance/simulation.py) to a query result,
+    matched on property_id (or name, address and price when the query did not select it).
+    Returns df unchanged if no simulation has been stored.
+    """
+    if df is None or df.empty:
+        return df
+    keys = ['property_id'] if 'property_id' in df.columns else ['name', 'address', 'price']
+    if not set(keys).issubset(df.columns):
+        return df
+    try:
+        risk = read_sql(
+            "SELECT property_id, name, address, price, p_buy_wins, wd_p5, wd_p50, wd_p95, wd_expected_shortfall "
+            "FROM simulation_properties"
+        )
+    except Exception:
+        return df
+    risk = risk.drop(columns=[c for c in ['property_id', 'name', 'address', 'price'] if c not in keys])
+    risk = risk.drop_duplicates(subset=keys)
+    merged = df.merge(risk, on=keys, how='left')
+    merged.attrs.update(df.attrs)   # keeps e.g. the row-cap marker
+    return merged
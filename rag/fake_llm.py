@@ -0,0 +1,92 @@
+import json
+import re
+from types import SimpleNamespace
+
+# Offline stand-in for the OpenAI client (RAG_OFFLINE=1).
+# Answers with simple keyword rules so the app and the caches can be exercised
+# without network access or an API key, and counts the calls it receives.
+# rag/stub_server.py serves the same answers over HTTP for the real client.
+
+
+def fake_intent(query):
+    q = query.lower()
+    if any(w in q for w in ["compare", " vs ", "versus"]):
+        return "COMPARE"
+    if any(w in q for w in ["why", "explain"]):
+        return "EXPLAIN"
+    if any(w in q for w in ["what is", "how is", "how does", "how buy", "section", "define"]):
+        return "EDUCATIONAL"
+    return "FILTER"
+
+
+def fake_sql(query):
+    q = query.lower()
+    conditions = []
+    if "rent" in q: conditions.append("decision = 'RENT'")
+    elif "buy" in q: conditions.append("decision = 'BUY'")
+
+    bhk = re.search(r"(\d+)\s*bhk", q)
+    if bhk: conditions.append(f"bedrooms = {bhk.group(1)}")
+
+    lakhs = re.search(r"under\s*(\d+(?:\.\d+)?)\s*l", q)
+    if lakhs: conditions.append(f"price < {int(float(lakhs.group(1)) * 100000)}")
+
+    sql = "SELECT * FROM properties"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return sql + " LIMIT 5"
+
+
+def fake_reply(messages):
+    """The answer for a chat request, chosen by which of the app's prompts it uses."""
+    system, user = messages[0]["content"], messages[-1]["content"]
+    if "Query Planner" in system:
+        intent = fake_intent(user)
+        return json.dumps({"intent": intent, "sql": None if intent == "EDUCATIONAL" else fake_sql(user)})
+    if "Intent Classifier" in system:
+        return fake_intent(user)
+    if "SQL Generator" in system:
+        return fake_sql(user)
+    return f"(offline response) Here is what the records say about: {user}"
+
+
+def stream_pieces(content):
+    """Splits an answer into word-sized pieces, like a streamed completion."""
+    return re.findall(r"\S+\s*|\s+", content)
+
+
+class FakeClient:
+    """Mimics client.chat.completions.create(model=..., messages=[...], temperature=..., stream=...)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, temperature=0.0, stream=False, **kwargs):
+        self.calls += 1
+        content = fake_reply(messages)
+        if stream:
+            return (
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+                for piece in stream_pieces(content)
+            )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class AsyncFakeClient:
+    """Async twin of FakeClient, shaped like openai.AsyncOpenAI."""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model, messages, temperature=0.0, stream=False, **kwargs):
+        self.calls += 1
+        content = fake_reply(messages)
+        if stream:
+            return self._stream(content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def _stream(self, content):
+        for piece in stream_pieces(content):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from rag import vector_store
+from rag.db import DB_PATH, init_db
+
+# Offline bulk embedding of the property explanation records.
+#
+#   python -m rag.ingest --workers 4
+#
+# Rows are streamed from the properties table in fixed chunks (ordered by
+# property_id, so chunk boundaries are stable between runs), rendered
+# column-wise and encoded by a pool of worker processes, each with its own
+# MiniLM copy. Every finished chunk is checkpointed as a shard: a .json with the
+# ids, texts, metadata and content hashes, and a .npy with the float32
+# embeddings. A killed run resumes from the shards whose hashes still match.
+# Finally the shards are memory-mapped and bulk-loaded into Chroma, skipping
+# documents whose stored content_hash is already current and deleting stale ids,
+# so the app's incremental sync (vector_store.sync_documents) finds nothing to do.
+
+STORE_DIR = "embeddings"
+CHUNK_ROWS = 512        # rows per shard / per worker task
+ENCODE_BATCH_SIZE = 64  # sentences per MiniLM forward pass
+LOAD_BATCH_SIZE = 4096  # documents per Chroma upsert (below its max batch size)
+SOURCE = "csv_analysis"
+
+
+# ============================================================
+# 1. SHARD STORE
+# ============================================================
+
+def shard_paths(store, index):
+    base = os.path.join(store, f"shard_{index:05d}")
+    return base + ".json", base + ".npy"
+
+
+def read_manifest(store):
+    path = os.path.join(store, "manifest.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+
+def prepare_store(store, model_name, chunk_rows):
+    """Creates the store, or clears it when it was built with another model or chunking."""
+    manifest = {"model": model_name, "chunk_rows": chunk_rows}
+    os.makedirs(store, exist_ok=True)
+    if read_manifest(store) != manifest:
+        for name in os.listdir(store):
+            if name.startswith("shard_"):
+                os.remove(os.path.join(store, name))
+        with open(os.path.join(store, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+
+
+def shard_is_current(store, index, hashes):
+    meta_path, vec_path = shard_paths(store, index)
+    if not (os.path.exists(meta_path) and os.path.exists(vec_path)):
+        return False
+    with open(meta_path) as f:
+        return json.load(f)["hashes"] == hashes
+
+
+def write_shard(store, index, chunk, embeddings):
+    """Writes the metadata, then the vectors; the .npy appearing (atomically) marks the shard complete."""
+    meta_path, vec_path = shard_paths(store, index)
+    with open(meta_path, "w") as f:
+        json.dump(chunk, f)
+    tmp_path = vec_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.asarray(embeddings, dtype=np.float32))
+    os.replace(tmp_path, vec_path)
+
+
+def iter_shards(store):
+    """(chunk, embeddings) per shard in order; embeddings are memory-mapped, not read into RAM."""
+    index = 0
+    while True:
+        meta_path, vec_path = shard_paths(store, index)
+        if not os.path.exists(vec_path):
+            return
+        with open(meta_path) as f:
+            chunk = json.load(f)
+        yield chunk, np.load(vec_path, mmap_mode="r")
+        index += 1
+
+
+# ============================================================
+# 2. SOURCE
+# ============================================================
+
+def iter_chunks(db_path=DB_PATH, chunk_rows=CHUNK_ROWS):
+    """Streams the properties table in chunks, rendered into ids / texts / metadata / hashes."""
+    conn = sqlite3.connect(db_path)
+    try:
+        for frame in pd.read_sql("SELECT * FROM properties ORDER BY property_id", conn, chunksize=chunk_rows):
+            texts = vector_store.render_property_documents(frame).tolist()
+            metadatas = vector_store.property_metadata(frame)
+            yield {
+                "ids": ("prop_" + frame["property_id"].astype(str)).tolist(),
+                "texts": texts,
+                "metadatas": metadatas,
+                "hashes": [vector_store.content_hash(t, m) for t, m in zip(texts, metadatas)],
+            }
+    finally:
+        conn.close()
+
+
+# ============================================================
+# 3. ENCODING
+# ============================================================
+
+_model = None
+
+
+def _init_worker(model_name, threads):
+    """Loads one model per worker; torch threads are split so workers don't oversubscribe the cores."""
+    global _model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads)
+    _model = SentenceTransformer(model_name)
+
+
+def _encode_chunk(task):
+    """Worker entry point: embeds one chunk of texts (same vectors as Chroma's embedding function)."""
+    index, texts = task
+    embeddings = _model.encode(texts, batch_size=ENCODE_BATCH_SIZE, convert_to_numpy=True)
+    return index, embeddings.astype(np.float32)
+
+
+def encode_store(store=STORE_DIR, db_path=DB_PATH, workers=None, chunk_rows=CHUNK_ROWS,
+                 model_name=vector_store.EMBEDDING_MODEL):
+    """
+    Embeds every chunk that has no current shard yet. At most 2 x workers chunks
+    are in flight, so memory stays bounded on large datasets.
+    Returns (chunks, encoded_docs, skipped_docs, seconds).
+    """
+    workers = max(1, workers or os.cpu_count())
+    prepare_store(store, model_name, chunk_rows)
+    start = time.perf_counter()
+    encoded = skipped = chunks = 0
+    pending, in_flight = {}, deque()
+
+    def report():
+        elapsed = time.perf_counter() - start
+        print(f"  {encoded} encoded, {skipped} resumed from shards ({encoded / elapsed if elapsed else 0:.0f} docs/sec)")
+
+    def finish(future):
+        nonlocal encoded
+        index, embeddings = future.result()
+        write_shard(store, index, pending.pop(index), embeddings)
+        encoded += len(embeddings)
+        report()
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_name, threads))
+    else:
+        pool = None
+        _init_worker(model_name, threads)
+
+    try:
+        for index, chunk in enumerate(iter_chunks(db_path, chunk_rows)):
+            chunks += 1
+            if shard_is_current(store, index, chunk["hashes"]):
+                skipped += len(chunk["ids"])
+                continue
+            pending[index] = chunk
+            if pool is None:
+                embeddings = _encode_chunk((index, chunk["texts"]))[1]
+                write_shard(store, index, pending.pop(index), embeddings)
+                encoded += len(embeddings)
+                report()
+                continue
+            in_flight.append(pool.submit(_encode_chunk, (index, chunk["texts"])))
+            while len(in_flight) >= 2 * workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.remove(future)
+                    finish(future)
+        for future in in_flight:
+            finish(future)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    # Shards past the end belong to a larger, older dataset
+    index = chunks
+    while os.path.exists(shard_paths(store, index)[1]):
+        for path in shard_paths(store, index):
+            os.remove(path)
+        index += 1
+    return chunks, encoded, skipped, time.perf_counter() - start
+
+
+# ============================================================
+# 4. BULK LOAD
+# ============================================================
+
+def load_store(store=STORE_DIR, batch_size=LOAD_BATCH_SIZE):
+    """
+    Upserts the shards into the Chroma collection with their precomputed vectors.
+    Returns the same counts as vector_store.sync_documents.
+    """
+    collection = vector_store.get_collection()
+    existing = collection.get(where={"source": SOURCE}, include=["metadatas"])
+    stored = {doc_id: (meta or {}).get("content_hash") for doc_id, meta in zip(existing['ids'], existing['metadatas'])}
+
+    seen, added, updated = set(), 0, 0
+    for chunk, embeddings in iter_shards(store):
+        seen.update(chunk["ids"])
+        rows = [i for i, (doc_id, h) in enumerate(zip(chunk["ids"], chunk["hashes"])) if stored.get(doc_id) != h]
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            collection.upsert(
+                ids=[chunk["ids"][r] for r in batch],
+                documents=[chunk["texts"][r] for r in batch],
+                metadatas=[{**chunk["metadatas"][r], "content_hash": chunk["hashes"][r]} for r in batch],
+                embeddings=np.asarray(embeddings[batch]).tolist()
+            )
+        added += sum(chunk["ids"][r] not in stored for r in rows)
+        updated += sum(chunk["ids"][r] in stored for r in rows)
+
+    stale = [doc_id for doc_id in stored if doc_id not in seen]
+    for i in range(0, len(stale), batch_size):
+        collection.delete(ids=stale[i:i + batch_size])
+    return {"added": added, "updated": updated, "deleted": len(stale), "unchanged": len(seen) - added - updated}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel, resumable embedding of the property explanation records")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--store", default=STORE_DIR, help="directory for the .npy/.json shard checkpoints")
+    parser.add_argument("--no-load", action="store_true", help="only encode; skip loading into Chroma")
+    args = parser.parse_args()
+
+    init_db(reload=True).close()
+    chunks, encoded, skipped, seconds = encode_store(args.store, workers=args.workers, chunk_rows=args.chunk_rows)
+    print(f"Encoded {encoded} documents in {seconds:.1f}s ({encoded / seconds if seconds else 0:.0f} docs/sec), "
+          f"{skipped} resumed from {args.store}/ ({chunks} chunks)")
+
+    if not args.no_load:
+        start = time.perf_counter()
+        counts = load_store(args.store)
+        print(f"Loaded into Chroma in {time.perf_counter() - start:.1f}s: {counts}")
+        print(f"Educational concepts: {vector_store.initialize_vector_store(None).get('educational_concept')}")
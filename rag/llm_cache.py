@@ -0,0 +1,238 @@
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from rag import router
+
+# Persistent cache for deterministic (temperature 0) LLM calls.
+# A prompt is answered from the cache when the same question was asked before
+# (exact match after normalization) or when a previous question is a close
+# paraphrase (MiniLM cosine similarity >= SIMILARITY_THRESHOLD) that agrees on
+# the numbers, the rent/buy and cheapest/costliest words and the localities:
+# those change the answer but barely move the embedding. Entries are versioned
+# by a hash of the model and system prompt, and the SQL prompt embeds the
+# schema, so editing either one starts a fresh namespace.
+#
+#   python -m rag.llm_cache          # check that look-alike questions miss the cache
+
+CACHE_DB_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+SIMILARITY_THRESHOLD = 0.93
+KEYWORD_SETS = [
+    ("rent", router.RENT_WORDS), ("buy", router.BUY_WORDS),
+    ("cheap", router.CHEAP_WORDS), ("costly", router.COSTLY_WORDS),
+]
+# Questions that embed close together but must not share an answer
+LOOKALIKE_PAIRS = [
+    ("2 BHK for rent in Garia", "2 BHK to buy in Garia"),
+    ("cheapest 3 BHK flats in New Town", "costliest 3 BHK flats in New Town"),
+    ("Show 2 BHK apartments in Behala", "Show 2 BHK apartments in Baguiati"),
+    ("3 BHK under 80L in Salt Lake", "3 BHK under 50L in Salt Lake"),
+]
+
+_SPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def normalize_prompt(prompt):
+    return _SPACE.sub(" ", prompt.lower()).strip().rstrip("?.! ")
+
+
+def number_signature(prompt):
+    """
+    Numbers in the prompt, in order. Paraphrase hits must agree on them:
+    "3 BHK under 80L" and "3 BHK under 50L" embed almost identically.
+    """
+    return " ".join(_NUMBER.findall(prompt))
+
+
+def keyword_signature(prompt, matcher=None):
+    """
+    The router's rent/buy and cheapest/costliest words and the localities named
+    in the prompt. Paraphrase hits must agree on them too: "2 BHK for rent in
+    Garia" and "2 BHK to buy in Garia" embed almost identically.
+    """
+    words = set(router.TOKEN.findall(prompt))
+    parts = [name for name, vocabulary in KEYWORD_SETS if words & vocabulary]
+    if matcher is not None:
+        parts += matcher.find(prompt)
+    return ",".join(parts)
+
+
+def prompt_version(model, system_prompt):
+    return hashlib.sha256(f"{model}\x1f{system_prompt}".encode("utf-8")).hexdigest()[:16]
+
+
+def load_encoder():
+    """The vector store's shared MiniLM when chromadb is installed, otherwise a private copy."""
+    try:
+        from rag import vector_store
+        return vector_store.get_embedding_function()
+    except ImportError:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(EMBEDDING_MODEL)
+        return model.encode
+
+
+class LLMCache:
+    """
+    SQLite-backed exact + near-duplicate cache. The embedding model is loaded on
+    first use; if it is unavailable the cache silently degrades to exact matches.
+    Localities come from the router's matcher unless localities=False.
+    """
+
+    def __init__(self, path=CACHE_DB_PATH, threshold=SIMILARITY_THRESHOLD, semantic=True, localities=True):
+        self.path = path
+        self.threshold = threshold
+        self.semantic = semantic
+        self.localities = localities
+        self.hits = self.semantic_hits = self.misses = 0
+        self._conn = None
+        self._model = None
+        self._vectors = {}   # (kind, version) -> (responses, numbers, keywords, matrix); replaced, never mutated
+        self._lock = threading.Lock()         # the connection and _vectors
+        self._model_lock = threading.Lock()   # the one-time model load
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    kind TEXT, version TEXT, prompt TEXT, response TEXT,
+                    numbers TEXT, embedding BLOB, created_at REAL, keywords TEXT,
+                    PRIMARY KEY (kind, version, prompt)
+                )
+            """)
+            # Caches written before keyword signatures: their rows (keywords NULL) only match exactly
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(llm_cache)")}
+            if "keywords" not in columns:
+                self._conn.execute("ALTER TABLE llm_cache ADD COLUMN keywords TEXT")
+        return self._conn
+
+    def _embed(self, text):
+        if not self.semantic:
+            return None
+        try:
+            if self._model is None:
+                with self._model_lock:
+                    if self._model is None:
+                        self._model = load_encoder()
+            vector = np.asarray(self._model([text])[0], dtype=np.float32)
+            return vector / np.linalg.norm(vector)
+        except Exception as e:
+            print(f"LLM cache: semantic matching disabled ({e})")
+            self.semantic = False
+            return None
+
+    def _keywords(self, prompt):
+        matcher = None
+        if self.localities:
+            try:
+                matcher = router.get_matcher()
+            except Exception as e:
+                print(f"LLM cache: locality signatures disabled ({e})")
+                self.localities = False
+        return keyword_signature(prompt, matcher)
+
+    def _index(self, kind, version):
+        """Embeddings of one namespace, loaded from disk once and kept as a matrix. Call with the lock held."""
+        key = (kind, version)
+        if key not in self._vectors:
+            rows = self._connect().execute(
+                "SELECT response, numbers, keywords, embedding FROM llm_cache "
+                "WHERE kind = ? AND version = ? AND embedding IS NOT NULL", key
+            ).fetchall()
+            matrix = np.array([np.frombuffer(r[3], dtype=np.float32) for r in rows]) if rows else None
+            self._vectors[key] = ([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], matrix)
+        return self._vectors[key]
+
+    def get(self, kind, model, system_prompt, prompt):
+        """Returns the cached response for prompt, or None."""
+        version = prompt_version(model, system_prompt)
+        norm = normalize_prompt(prompt)
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT response FROM llm_cache WHERE kind = ? AND version = ? AND prompt = ?",
+                (kind, version, norm)
+            ).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            responses, numbers, keywords, matrix = self._index(kind, version) if self.semantic else ([], [], [], None)
+
+        # The model load and the embedding run outside the lock, on the snapshot taken above
+        if matrix is not None:
+            vector = self._embed(norm)
+            if vector is not None:
+                scores = matrix @ vector
+                scores[np.array(numbers, dtype=object) != number_signature(norm)] = -1
+                scores[np.array(keywords, dtype=object) != self._keywords(norm)] = -1
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    with self._lock:
+                        self.semantic_hits += 1
+                    return responses[best]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, kind, model, system_prompt, prompt, response):
+        version = prompt_version(model, system_prompt)
+        norm = normalize_prompt(prompt)
+        numbers = number_signature(norm)
+        keywords = self._keywords(norm)
+        vector = self._embed(norm)
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache "
+                    "(kind, version, prompt, response, numbers, embedding, created_at, keywords) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (kind, version, norm, response, numbers,
+                     vector.tobytes() if vector is not None else None, time.time(), keywords)
+                )
+            if vector is not None and (kind, version) in self._vectors:
+                responses, all_numbers, all_keywords, matrix = self._vectors[(kind, version)]
+                matrix = vector[None] if matrix is None else np.vstack([matrix, vector])
+                self._vectors[(kind, version)] = (
+                    responses + [response], all_numbers + [numbers], all_keywords + [keywords], matrix
+                )
+
+    def clear(self):
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM llm_cache")
+            self._vectors.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks that look-alike questions do not share a cached LLM answer")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LLMCache(os.path.join(tmp, "llm_cache.db"), threshold=args.threshold)
+        failures = 0
+        for cached, asked in LOOKALIKE_PAIRS:
+            cache.put("SQL", "check", "", cached, f"answer for: {cached}")
+            vectors = [cache._embed(normalize_prompt(q)) for q in (cached, asked)]
+            if not cache.semantic:
+                raise SystemExit("The embedding model is unavailable; only exact matches are cached")
+            similarity = float(vectors[0] @ vectors[1])
+            hit = cache.get("SQL", "check", "", asked)
+            failures += hit is not None
+            print(f"{'HIT ' if hit is not None else 'miss'}  cosine {similarity:.3f}  {cached!r} -> {asked!r}")
+            print(f"      signatures {cache._keywords(normalize_prompt(cached))!r} / "
+                  f"{cache._keywords(normalize_prompt(asked))!r}")
+        if failures:
+            raise SystemExit(f"{failures} look-alike question(s) answered from the cache")
+        print("Look-alike questions miss the cache")
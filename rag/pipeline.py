@@ -0,0 +1,192 @@
+import asyncio
+from collections import namedtuple
+
+from rag import db, rag_engine, router
+from rag.fake_llm import AsyncFakeClient
+
+# Asyncio orchestration over rag_engine.
+# A speculative knowledge search starts as soon as the question arrives and runs
+# while the intent/SQL are planned and the SQL executes; it is awaited only if
+# the answer needs it (no rows found) and cancelled otherwise. LLM calls go
+# through AsyncOpenAI with a concurrency bound and timeouts. Blocking work
+# (SQLite, Chroma, the LLM cache) runs in worker threads.
+#
+# Streamlit keeps one event loop + pipeline per session and drives it with
+# loop.run_until_complete(...) / iterate(loop, async_generator).
+
+MAX_CONCURRENT_LLM = 4
+LLM_TIMEOUT = 30        # seconds per completion (first token for streams)
+SQL_TIMEOUT = 15
+VECTOR_TIMEOUT = 15
+SPECULATIVE_RESULTS = 5
+SQL_INTENTS = ["FILTER", "COMPARE", "EXPLAIN"]
+
+Retrieval = namedtuple(
+    "Retrieval",
+    ["intent", "sql", "params", "context_df", "explanation", "error", "vector_results", "fast_path"]
+)
+
+
+def _knowledge_results(query, n_results, where):
+    # chromadb is only imported once a search is needed
+    return rag_engine.knowledge_results(query, n_results, where)
+
+
+def _explain(df):
+    return df, rag_engine.create_explanation_records(df)
+
+
+class AsyncRAGPipeline:
+    """
+    One per session (the AsyncOpenAI client and the semaphore belong to the
+    event loop that runs them). prepare(df) -> (df, explanation) is handed to
+    db.execute_cached_query (default: explanation records only).
+    """
+
+    def __init__(self, schema, prepare=None, max_concurrency=MAX_CONCURRENT_LLM, timeout=LLM_TIMEOUT):
+        self.schema = schema
+        self.prepare = prepare or _explain
+        self.timeout = timeout
+        self._llm_slots = asyncio.Semaphore(max_concurrency)
+        self._client = None
+
+    @property
+    def client(self):
+        """Created on first use; a missing API key fails the call (and its fallback), not the session."""
+        if self._client is None:
+            if rag_engine.OFFLINE:
+                self._client = AsyncFakeClient()
+            else:
+                import openai
+                self._client = openai.AsyncOpenAI(
+                    api_key=rag_engine.require_api_key(),
+                    base_url=rag_engine.base_url,
+                    timeout=self.timeout,
+                    max_retries=1
+                )
+        return self._client
+
+    # --- LLM ---
+    async def _complete(self, messages, **kwargs):
+        async with self._llm_slots:
+            return await asyncio.wait_for(
+                self.client.chat.completions.create(model=rag_engine.MODEL, messages=messages, **kwargs),
+                self.timeout
+            )
+
+    async def _cached_completion(self, kind, system_prompt, query, **kwargs):
+        """Async counterpart of rag_engine.cached_completion (same cache)."""
+        cache = rag_engine.llm_cache
+        content = await asyncio.to_thread(cache.get, kind, rag_engine.MODEL, system_prompt, query)
+        if content is None:
+            response = await self._complete(
+                [{"role": "system", "content": system_prompt}, {"role": "user", "content": query}],
+                temperature=0.0, **kwargs
+            )
+            content = response.choices[0].message.content
+            await asyncio.to_thread(cache.put, kind, rag_engine.MODEL, system_prompt, query, content)
+        return content
+
+    async def _generate_sql(self, query):
+        try:
+            content = await self._cached_completion("sql", rag_engine.sql_prompt(self.schema), query)
+            return rag_engine.clean_sql(content.strip())
+        except Exception as e:
+            print(f"Error generating SQL: {e}")
+            plan = router.route(query, threshold=0.0)
+            return router.to_literal_sql(plan.sql, plan.params) if plan else "SELECT * FROM properties LIMIT 5"
+
+    async def _classify(self, query):
+        try:
+            content = await self._cached_completion("intent", rag_engine.intent_prompt(), query)
+            return content.strip().upper()
+        except Exception:
+            return "FILTER"
+
+    async def plan(self, query):
+        """(intent, sql, params, fast_path) via the router, the combined planner or two concurrent calls."""
+        route = router.route(query)
+        if route:
+            return route.intent, route.sql, route.params, True
+
+        if rag_engine.PIPELINE_MODE == "combined":
+            try:
+                content = await self._cached_completion(
+                    "plan", rag_engine.plan_prompt(self.schema), query, response_format={"type": "json_object"}
+                )
+                intent, sql = rag_engine.parse_plan(content)
+                if sql is None and intent in SQL_INTENTS:
+                    sql = await self._generate_sql(query)
+                return intent, sql, None, False
+            except Exception as e:
+                print(f"Query planner fallback: {e}")
+
+        # Serial prompts, but issued together: the SQL is dropped if the intent is EDUCATIONAL
+        intent, sql = await asyncio.gather(self._classify(query), self._generate_sql(query))
+        return intent, (sql if intent in SQL_INTENTS else None), None, False
+
+    # --- Retrieval ---
+    async def _search(self, query, n_results, where=None):
+        try:
+            return await asyncio.wait_for(
+                asyncio.to_thread(_knowledge_results, query, n_results, where),
+                VECTOR_TIMEOUT
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Vector search warning: {e}")
+            return ""
+
+    async def retrieve(self, query):
+        """Plans the question and gathers its context, overlapping SQL with a speculative vector search."""
+        speculative = asyncio.create_task(self._search(query, SPECULATIVE_RESULTS))
+        try:
+            intent, sql, params, fast_path = await self.plan(query)
+            context_df, explanation, error = None, "", None
+
+            if intent in SQL_INTENTS:
+                context_df, explanation, error = await asyncio.wait_for(
+                    asyncio.to_thread(db.execute_cached_query, sql, self.prepare, params),
+                    SQL_TIMEOUT
+                )
+                if error:
+                    explanation = f"Error: {error}"
+            elif intent == "EDUCATIONAL":
+                explanation = "General educational question."
+
+            vector_results = ""
+            search = rag_engine.knowledge_search(intent, explanation)
+            if search == (SPECULATIVE_RESULTS, None):
+                vector_results = await speculative
+            else:
+                speculative.cancel()
+                if search:
+                    vector_results = await self._search(query, *search)
+            return Retrieval(intent, sql, params, context_df, explanation, error, vector_results, fast_path)
+        finally:
+            if not speculative.done():
+                speculative.cancel()
+            # Let the cancellation settle (the worker thread itself finishes in the background)
+            await asyncio.gather(speculative, return_exceptions=True)
+
+    # --- Answer ---
+    async def stream_answer(self, query, retrieval):
+        """Async generator of answer chunks."""
+        messages = rag_engine.response_messages(query, retrieval.explanation, retrieval.intent, retrieval.vector_results)
+        try:
+            stream = await self._complete(messages, temperature=0.2, stream=True)
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            yield rag_engine.response_error_message(e)
+
+
+def iterate(loop, agen):
+    """Drives an async generator from synchronous code (e.g. st.write_stream) on the given loop."""
+    while True:
+        try:
+            yield loop.run_until_complete(agen.__anext__())
+        except StopAsyncIteration:
+            break
@@ -0,0 +1,94 @@
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Result cache for generated SQL.
+# Chat traffic repeats the same few questions, so the DataFrame and the rendered
+# explanation records are kept per (canonical SQL, data version). Entries are
+# evicted least-recently-used first, when they outlive the TTL, or when the
+# total size goes over the byte budget.
+
+MAX_ENTRIES = 256
+TTL_SECONDS = 15 * 60
+MAX_BYTES = 64 * 1024 * 1024
+
+CacheStats = namedtuple("CacheStats", ["hits", "misses", "evictions", "entries", "bytes"])
+
+# String literals and quoted identifiers are kept verbatim, everything else is normalized
+_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+_SPACE = re.compile(r"\s+")
+_PUNCT_SPACE = re.compile(r"\s*([(),=<>])\s*")
+
+
+def canonicalize_sql(sql):
+    """
+    Canonical form of a statement: lower case and single spaces outside quotes,
+    no spaces around punctuation, no trailing semicolons.
+    "SELECT *  FROM properties;" and "select * from properties" share a key.
+    """
+    parts = _QUOTED.split(sql.strip().rstrip(";").strip())
+    for i in range(0, len(parts), 2):
+        parts[i] = _PUNCT_SPACE.sub(r"\1", _SPACE.sub(" ", parts[i].lower()))
+    return "".join(parts).strip()
+
+
+def _sizeof(value):
+    if hasattr(value, "memory_usage"):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    """Thread-safe LRU cache with a TTL and a byte budget. Cached values are shared: treat them as read-only."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        """Returns the cached value or None (counted as a miss)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, value):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions, len(self._entries), self._bytes)
+
+    def _drop(self, key):
+        self._bytes -= self._entries.pop(key)[1]
@@ -1,67 +1,88 @@
 
 import os
+import re
 import json
+import threading
 import pandas as pd
-import openai
 from dotenv import load_dotenv
 
+from rag import concept_index, db, router, startup
+from rag.fake_llm import FakeClient
+from rag.llm_cache import LLMCache
+
 # Load environment variables
 load_dotenv()
 
 api_key = os.getenv("OPENAI_API_KEY")
 base_url = os.getenv("OPENAI_BASE_URL")
 
-if not api_key:
-    raise ValueError("OPENAI_API_KEY not found in .env file")
+MODEL = "google/gemini-2.0-flash-001"
 
-client = openai.OpenAI(
-    api_key=api_key,
-    base_url=base_url
-)
+# "combined": intent + SQL from one JSON completion (plan_query); "serial": two calls
+PIPELINE_MODE = os.getenv("RAG_PIPELINE", "combined")
 
-def classify_intent(query):
-    """
-    Classifies the user query into one of the allowed intents:
-    FILTER, EXPLAIN, COMPARE, EDUCATIONAL.
+# RAG_OFFLINE=1 swaps in a local fake client (no network, no API key needed)
+OFFLINE = os.getenv("RAG_OFFLINE") == "1"
+
+# The client (and the openai import) are created on first use, so the app can
+# start and serve the analytics pages without a key; a missing key surfaces as a
+# chat error instead of an import-time crash.
+_client = None
+_client_lock = threading.Lock()
+
+def require_api_key():
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY not found in .env file")
+    return api_key
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if OFFLINE:
+                    _client = FakeClient()
+                else:
+                    import openai
+                    _client = openai.OpenAI(
+                        api_key=require_api_key(),
+                        base_url=base_url
+                    )
+    return _client
+
+# Intent and SQL answers are deterministic (temperature 0), so they are cached on disk
+llm_cache = LLMCache()
+
+def cached_completion(kind, system_prompt, query, **kwargs):
     """
-    system_prompt = """
-    You are an Intent Classifier for a Real Estate Investment Analyzer.
-    Classify the user's query into EXACTLY one of the following categories:
-    
-    1. FILTER: Requests for listings, searching properties, or subsets (e.g., "Show me 3 BHKs in New Town", "Properties under 50L").
-    2. EXPLAIN: Requests for reasoning behind a specific decision or property detail (e.g., "Why is this property a BUY?", "Explain the tax benefits for this flat").
-    3. COMPARE: Requests to evaluate two or more properties against each other (e.g., "Compare the property in New Town vs the one in Salt Lake").
-    4. EDUCATIONAL: General questions about tax concepts, financial logic, or definitions (e.g., "How is rental yield calculated?", "What is Section 24b?").
-    
-    Return ONLY the category name. Do not add punctuation or explanation.
+    Temperature-0 chat completion through the LLM cache: exact or paraphrased
+    repeats of a question are answered locally. Errors are raised, not cached.
+    Extra kwargs (e.g. response_format) are passed to the API.
     """
-    
-    try:
-        response = client.chat.completions.create(
-            model="google/gemini-2.0-flash-001",
+    content = llm_cache.get(kind, MODEL, system_prompt, query)
+    if content is None:
+        response = get_client().chat.completions.create(
+            model=MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": query}
             ],
-            temperature=0.0
+            temperature=0.0,
+            **kwargs
         )
-        return response.choices[0].message.content.strip().upper()
-    except Exception as e:
-        return "FILTER" # Fallback safe default
+        content = response.choices[0].message.content
+        llm_cache.put(kind, MODEL, system_prompt, query, content)
+    return content
 
-def generate_sql_query(query, schema):
-    """
-    Converts a natural language query into a SQL query based on the schema.
-    Features robust error handling, spelling correction, and flexible number parsing.
-    """
-    system_prompt = f"""
-    You are an expert SQL Generator for a Real Estate Analysis Database. 
-    Your goal is to output VALID SQLite SQL based on the User's Query.
+INTENTS = ["FILTER", "EXPLAIN", "COMPARE", "EDUCATIONAL"]
 
-    DATABASE SCHEMA:
-    {schema}
+INTENT_CATEGORIES = """    1. FILTER: Requests for listings, searching properties, or subsets (e.g., "Show me 3 BHKs in New Town", "Properties under 50L").
+    2. EXPLAIN: Requests for reasoning behind a specific decision or property detail (e.g., "Why is this property a BUY?", "Explain the tax benefits for this flat").
+    3. COMPARE: Requests to evaluate two or more properties against each other (e.g., "Compare the property in New Town vs the one in Salt Lake").
+    4. EDUCATIONAL: General questions about tax concepts, financial logic, or definitions (e.g., "How is rental yield calculated?", "What is Section 24b?").
+"""
 
-    -------------------------------------------------------------------------
+SQL_RULES = """    -------------------------------------------------------------------------
     CRITICAL RULES - FOLLOW THESE STRICTLY:
     -------------------------------------------------------------------------
     1. **OUTPUT FORMAT**: 
@@ -104,138 +125,313 @@ def generate_sql_query(query, schema):
        - If user asks for "Kolkata", "Calcutta", or "city", do **NOT** add `address LIKE '%kolkata%'`. This excludes valid data where address is just "New Town" or "Salt Lake".
        - **ACTION**: Ignore "Kolkata" for location filtering. Only filter address if a *specific area* (e.g., "New Town", "Garia") is mentioned.
     -------------------------------------------------------------------------
-    """
+"""
+
+def intent_prompt():
+    return f"""
+    You are an Intent Classifier for a Real Estate Investment Analyzer.
+    Classify the user's query into EXACTLY one of the following categories:
     
+{INTENT_CATEGORIES}    
+    Return ONLY the category name. Do not add punctuation or explanation.
+    """
+
+def classify_intent(query):
+    """
+    Classifies the user query into one of the allowed intents:
+    FILTER, EXPLAIN, COMPARE, EDUCATIONAL.
+    """
     try:
-        response = client.chat.completions.create(
-            model="google/gemini-2.0-flash-001",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": query}
-            ],
-            temperature=0.0
-        )
-        content = response.choices[0].message.content.strip()
-        
-        # --- ROBUST CLEANING ---
-        import re
-        # 1. Remove markdown code blocks (handle ```sql, ```sqlite, ```, etc)
-        # Matches ```<optional_lang> <content> ```
-        code_block = re.search(r"```(?:\w+)?\s*(SELECT.*?)```", content, re.DOTALL | re.IGNORECASE)
-        if code_block:
-            sql = code_block.group(1).strip()
-        else:
-            # 2. If no code blocks, look for the first SELECT statement
-            select_match = re.search(r"(SELECT.*)", content, re.DOTALL | re.IGNORECASE)
-            if select_match:
-                sql = select_match.group(1).strip()
-            else:
-                # 3. Last resort clean
-                sql = content.replace("```sql", "").replace("```sqlite", "").replace("```", "").strip()
-        
-        # FINAL SAFEGUARD: If SQL contains "LIKE '%kolkata%'" or similar, warn or strip it?
-        # Better to rely on prompt, but we can do a quick replace if prompt fails.
-        # Removing "AND address LIKE '%kolkata%'" risks breaking syntax if not careful.
-        # We trust the prompt for now.
-        
-        return sql
+        return cached_completion("intent", intent_prompt(), query).strip().upper()
+    except Exception as e:
+        return "FILTER" # Fallback safe default
+
+def sql_prompt(schema):
+    return f"""
+    You are an expert SQL Generator for a Real Estate Analysis Database. 
+    Your goal is to output VALID SQLite SQL based on the User's Query.
+
+    DATABASE SCHEMA:
+    {schema}
+
+{SQL_RULES}    """
+
+def generate_sql_query(query, schema):
+    """
+    Converts a natural language query into a SQL query based on the schema.
+    Features robust error handling, spelling correction, and flexible number parsing.
+    """
+    try:
+        content = cached_completion("sql", sql_prompt(schema), query).strip()
+        return clean_sql(content)
 
     except Exception as e:
         print(f"Error generating SQL: {e}")
-        # Fallback mechanism
+        # Fallback mechanism: the rule-based compiler, whatever its confidence
         try:
-            # Basic keyword extraction fallback
-            conditions = []
-            q = query.lower()
-            if "rent" in q: conditions.append("decision = 'RENT'")
-            elif "buy" in q: conditions.append("decision = 'BUY'")
-            
-            if "new town" in q or "newtown" in q: conditions.append("(address LIKE '%new town%' OR address LIKE '%newtown%')")
-            
-            base_sql = "SELECT * FROM properties"
-            if conditions:
-                base_sql += " WHERE " + " AND ".join(conditions)
-            return base_sql + " LIMIT 5"
+            plan = router.route(query, threshold=0.0)
+            if plan:
+                return router.to_literal_sql(plan.sql, plan.params)
+            return "SELECT * FROM properties LIMIT 5"
         except:
             return "SELECT * FROM properties LIMIT 5"
 
-def create_explanation_records(df):
+def clean_sql(content):
+    """Extracts the SQL statement from a model answer (code fences, leading prose)."""
+    # --- ROBUST CLEANING ---
+    # 1. Remove markdown code blocks (handle ```sql, ```sqlite, ```, etc)
+    # Matches ```<optional_lang> <content> ```
+    code_block = re.search(r"```(?:\w+)?\s*(SELECT.*?)```", content, re.DOTALL | re.IGNORECASE)
+    if code_block:
+        sql = code_block.group(1).strip()
+    else:
+        # 2. If no code blocks, look for the first SELECT statement
+        select_match = re.search(r"(SELECT.*)", content, re.DOTALL | re.IGNORECASE)
+        if select_match:
+            sql = select_match.group(1).strip()
+        else:
+            # 3. Last resort clean
+            sql = content.replace("```sql", "").replace("```sqlite", "").replace("```", "").strip()
+    
+    # FINAL SAFEGUARD: If SQL contains "LIKE '%kolkata%'" or similar, warn or strip it?
+    # Better to rely on prompt, but we can do a quick replace if prompt fails.
+    # Removing "AND address LIKE '%kolkata%'" risks breaking syntax if not careful.
+    # We trust the prompt for now.
+    
+    return sql
+
+def plan_prompt(schema):
+    """System prompt of the combined intent + SQL completion."""
+    return f"""
+    You are the Query Planner for a Real Estate Investment Analyzer.
+    Answer with the intent of the user's query AND, unless it is EDUCATIONAL, the SQL that retrieves its data.
+
+    STEP 1 - INTENT: EXACTLY one of the following categories:
+{INTENT_CATEGORIES}
+    STEP 2 - SQL (skip for EDUCATIONAL): a VALID SQLite query over this schema.
+
+    DATABASE SCHEMA:
+    {schema}
+
+{SQL_RULES}
+    OUTPUT: Return ONLY a JSON object, no markdown. The SQL rules above apply to the "sql" value.
+    {{"intent": "<CATEGORY>", "sql": "<SELECT ...>" or null}}
     """
-    Converts the DataFrame rows into text-based Property Explanation Records.
-    Ref: Section 6 of Manual.
+
+def parse_plan(content):
+    """(intent, sql or None) from the planner's JSON answer. Raises ValueError if it is unusable."""
+    match = re.search(r"\{.*\}", content, re.DOTALL)
+    plan = json.loads(match.group(0) if match else content)
+    intent = str(plan.get("intent", "")).strip().upper()
+    if intent not in INTENTS:
+        raise ValueError(f"unknown intent {intent!r}")
+    return intent, (clean_sql(plan["sql"]) if plan.get("sql") else None)
+
+def plan_query(query, schema):
     """
-    records = []
+    Pipeline mode: intent and SQL from ONE structured (JSON) completion instead
+    of classify_intent + generate_sql_query. Returns (intent, sql); sql is None
+    for EDUCATIONAL questions. Falls back to the two separate calls if the
+    answer cannot be parsed.
+    """
+    try:
+        content = cached_completion("plan", plan_prompt(schema), query, response_format={"type": "json_object"})
+        intent, sql = parse_plan(content)
+        if sql is None and intent != "EDUCATIONAL":
+            sql = generate_sql_query(query, schema)
+        return intent, sql
+    except Exception as e:
+        print(f"Query planner fallback: {e}")
+        intent = classify_intent(query)
+        return intent, (generate_sql_query(query, schema) if intent != "EDUCATIONAL" else None)
+
+# --- Explanation Records ---
+# Records are assembled column-wise and packed into a token budget: as many rows
+# as fit are listed, the rest are summarized per decision (count, min / median /
+# max), so the prompt stays bounded however many rows the SQL returns.
+
+CONTEXT_TOKEN_BUDGET = 2500
+CHARS_PER_TOKEN = 4         # rough estimate for English text and numbers
+MAX_LISTED_RECORDS = 50     # rows rendered before the budget is even considered
+
+RECORD_FIELDS = [
+    ("Name: ", "name", "Unknown Property"),
+    ("\nLocation: ", "address", "Unknown Location"),
+    ("\nSize: ", "area", "N/A"),
+    (" sqft\nFinancials: Price: ", "price", "N/A"),
+    (", Monthly Rent: ", "rent", "N/A"),
+    ("\nAnalysis Decision: ", "decision", "N/A"),
+    ("\nWealth Difference (Buy vs Rent over 20y): ", "wealth_difference", "0"),
+    ("\nMonthly EMI: ", "monthly_emi", "N/A"),
+    ("\nTax Strategy: ", "chosen_tax_regime", "N/A"),
+    (" with Total Tax Paid: ", "total_tax_paid", "N/A"),
+]
+RECORD_NOTE = ("(Note: Decisions are based on a deterministic backend calculation. "
+               "Positive wealth difference favors BUY, negative favors RENT.)")
+SUMMARY_COLUMNS = [("price", "price"), ("rent", "rent"), ("wealth_difference", "wealth difference")]
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def _amounts(series):
+    return series.map("{:,.0f}".format)
+
+def render_explanation_records(df):
+    """One compact Property Explanation Record per row (a Series of strings), built column-wise."""
+    text = "--- PROPERTY RECORD " + pd.Series(range(1, len(df) + 1), index=df.index).astype(str) + " ---\n"
+    for prefix, column, default in RECORD_FIELDS:
+        values = df[column].astype(str) if column in df.columns else default
+        text = text + prefix + values
     
+    # Monte Carlo risk metrics (only present once finance/simulation.py has been run)
+    if 'p_buy_wins' in df.columns:
+        has_risk = df['p_buy_wins'].notna()
+        if has_risk.any():
+            risk_rows = df[has_risk]
+            risk = ("\nRisk (Monte Carlo): P(BUY wins) " + (risk_rows['p_buy_wins'] * 100).map("{:.0f}".format)
+                    + "%, Wealth Difference 5th-95th pct: " + _amounts(risk_rows['wd_p5'])
+                    + " to " + _amounts(risk_rows['wd_p95'])
+                    + ", Expected Shortfall (worst 5%): " + _amounts(risk_rows['wd_expected_shortfall']))
+            text = text + risk.reindex(df.index, fill_value="")
+    return text
+
+def summarize_records(df):
+    """Aggregate lines for rows that did not fit: count and min / median / max per decision."""
+    groups = df.groupby('decision', dropna=False) if 'decision' in df.columns else [("ALL", df)]
+    lines = []
+    for decision, group in groups:
+        parts = [f"{decision}: {len(group)} properties"]
+        for column, label in SUMMARY_COLUMNS:
+            if column in group.columns:
+                values = pd.to_numeric(group[column], errors='coerce').dropna()
+                if len(values):
+                    parts.append(f"{label} {values.min():,.0f} to {values.max():,.0f} (median {values.median():,.0f})")
+        lines.append("; ".join(parts))
+    return "\n".join(lines)
+
+def create_explanation_records(df, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Converts the DataFrame rows into text-based Property Explanation Records,
+    packed into token_budget (estimated) tokens.
+    Ref: Section 6 of Manual.
+    """
     if df is None or df.empty:
         return "No properties found matching the criteria."
-        
-    for index, row in df.iterrows():
-        # Handle potential missing keys gracefully
-        try:
-            name = row.get('name', 'Unknown Property')
-            addr = row.get('address', 'Unknown Location')
-            price = row.get('price', 'N/A')
-            rent = row.get('rent', 'N/A')
-            area = row.get('area', 'N/A')
-            decision = row.get('decision', 'N/A')
-            wealth_diff = row.get('wealth_difference', '0')
-            emi = row.get('monthly_emi', 'N/A') # Assuming column name
-            
-            total_tax = row.get('total_tax_paid', 'N/A')
-            regime = row.get('chosen_tax_regime', 'N/A')
-            
-            # Create a structured text block
-            record = f"""
-            --- PROPERTY RECORD {index+1} ---
-            Name: {name}
-            Location: {addr}
-            Size: {area} sqft
-            Financials: Price: {price}, Monthly Rent: {rent}
-            Analysis Decision: {decision}
-            Wealth Difference (Buy vs Rent over 20y): {wealth_diff}
-            Monthly EMI: {emi}
-            Tax Strategy: {regime} with Total Tax Paid: {total_tax}
-            
-            (Note: This decision is based on a deterministic backend calculation. 
-            Positive wealth difference favors BUY, negative favors RENT.)
-            -------------------------------
-            """
-            records.append(record)
-        except Exception as e:
-            records.append(f"Error parsing row {index}: {e}")
-            
-    return "\n".join(records)
+    
+    records = render_explanation_records(df.head(MAX_LISTED_RECORDS))
+    costs = records.map(estimate_tokens).cumsum().to_numpy()
+    count_line = f"Showing {{}} of {len(df)} properties.\n"
+    fixed = estimate_tokens(count_line + RECORD_NOTE) + 1
+    
+    # Largest prefix of records that fits next to the header and the summary of the rest
+    listed = int((costs <= token_budget - fixed).sum())
+    while True:
+        overflow = df.iloc[listed:]
+        summary = f"\n\n--- {len(overflow)} MORE PROPERTIES (summarized) ---\n{summarize_records(overflow)}" if len(overflow) else ""
+        if listed == 0 or costs[listed - 1] + fixed + estimate_tokens(summary) <= token_budget:
+            break
+        listed -= 1
+    
+    header = (count_line.format(listed) if listed < len(df) else "") + RECORD_NOTE + "\n"
+    return header + "\n\n".join(records.iloc[:listed]) + summary
 
 # from rag import vector_store
 
 # ... (rest of imports)
 
-def generate_rag_response(query, explanation_context, intent):
+def knowledge_search(intent, explanation_context):
+    """
+    semantic_search arguments (n_results, where) for the answer's extra context,
+    or None when the SQL records are enough.
+    """
+    if intent == "EDUCATIONAL":
+        # Strict Filtering: Only look at educational concepts, and take the single best match
+        # to avoid confusing the LLM with contradictory "rules of thumb" vs "exact methodology"
+        return 1, {"source": "educational_concept"}
+    if "No properties found" in explanation_context:
+        # Broad Retrieval: Look at everything (properties + concepts)
+        return 5, None
+    return None
+
+def hybrid_search(query, n_results=5):
+    """
+    Broad retrieval that respects the question's structured constraints.
+    The router's filters select candidate listings through indexed SQL; these are
+    vector-ranked against the question and fused (RRF) with the SQL order. When
+    the candidates overflow router.MAX_CANDIDATES the filters are applied as Chroma
+    metadata filters instead. Questions without constraints use semantic_search.
+    """
+    from rag import vector_store
+    plan = router.parse(query, router.get_matcher())
+    if plan is None or not (plan.filters or " ORDER BY " in plan.sql):
+        return vector_store.semantic_search(query, n_results=n_results)
+    
+    sql, params = router.candidate_sql(plan)
+    sql_ids = ["prop_" + pid for pid in db.read_sql(sql, params)['property_id']]
+    if not sql_ids:
+        return vector_store.semantic_search(query, n_results=n_results)
+    
+    if len(sql_ids) < router.MAX_CANDIDATES:
+        vector_ids = vector_store.rank_ids(query, sql_ids)
+    else:
+        vector_ids = vector_store.filtered_ids(query, vector_store.metadata_filter(plan.filters), router.MAX_CANDIDATES)
+    # Without an ORDER BY the SQL order carries no signal
+    rankings = [sql_ids, vector_ids] if " ORDER BY " in plan.sql else [vector_ids]
+    fused = vector_store.reciprocal_rank_fusion(rankings)[:n_results]
+    return "\n\n".join(vector_store.get_documents(fused))
+
+def knowledge_results(query, n_results, where):
+    """
+    Runs a knowledge_search: educational lookups use the in-process concept index,
+    broad searches go through hybrid_search, other filters straight to Chroma.
+    """
+    if where == {"source": "educational_concept"}:
+        return concept_index.index.search_text(query, n_results)
+    if startup.is_pending(startup.KNOWLEDGE_BASE):
+        # Still hydrating in the background: answer from the SQL records alone
+        return ""
+    if where is None:
+        return hybrid_search(query, n_results)
+    from rag import vector_store
+    return vector_store.semantic_search(query, n_results=n_results, where=where)
+
+def generate_rag_response(query, explanation_context, intent, stream=False):
     """
     Generates the final human-readable response using the Explanation Records.
+    With stream=True a generator of text chunks is returned instead (for st.write_stream).
     Ref: Section 10 of Manual.
     """
     
     # Robust Hybrid Retrieval Logic
-    additional_context = ""
-    if intent == "EDUCATIONAL" or "No properties found" in explanation_context:
+    vector_results = ""
+    search = knowledge_search(intent, explanation_context)
+    if search:
         try:
             # We strictly protect this call so it never crashes the main app
-            from rag import vector_store
-            
-            # Refined Retrieval Strategy based on Intent
-            if intent == "EDUCATIONAL":
-                # Strict Filtering: Only look at educational concepts, and take the single best match
-                # to avoid confusing the LLM with contradictory "rules of thumb" vs "exact methodology"
-                vector_results = vector_store.semantic_search(query, n_results=1, where={"source": "educational_concept"})
-            else:
-                # Broad Retrieval: Look at everything (properties + concepts)
-                vector_results = vector_store.semantic_search(query, n_results=5)
-
-            if vector_results:
-                 additional_context = f"\n\n--- RELEVANT KNOWLEDGE (Vector Retrieval) ---\n{vector_results}\n"
+            n_results, where = search
+            vector_results = knowledge_results(query, n_results, where)
         except Exception as e:
             print(f"Vector search warning: {e}")
+    
+    messages = response_messages(query, explanation_context, intent, vector_results)
+    if stream:
+        return _stream_response(messages)
+    
+    try:
+        response = get_client().chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            temperature=0.2
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        return response_error_message(e)
+
+def response_messages(query, explanation_context, intent, vector_results=""):
+    """Chat messages for the final answer: SQL explanation records plus any retrieved knowledge."""
+    additional_context = ""
+    if vector_results:
+         additional_context = f"\n\n--- RELEVANT KNOWLEDGE (Vector Retrieval) ---\n{vector_results}\n"
             
     final_context = explanation_context + additional_context
 
@@ -280,23 +476,33 @@ def generate_rag_response(query, explanation_context, intent):
        - Use a numbered list (1., 2., 3., etc) for clarity.
     """
     
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": query}
+    ]
+
+def _stream_response(messages):
+    """Yields the answer chunk by chunk as the API sends it."""
     try:
-        response = client.chat.completions.create(
-            model="google/gemini-2.0-flash-001",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": query}
-            ],
-            temperature=0.2
+        response = get_client().chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            temperature=0.2,
+            stream=True
         )
-        return response.choices[0].message.content.strip()
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
     except Exception as e:
-        error_msg = str(e)
-        if "insufficient_quota" in error_msg:
-             return (
-                 "**⚠️ API Quota Exceeded (Offline Mode)**\n\n"
-                 "I cannot generate a new custom explanation because the provided OpenAI API key has run out of credits.\n\n"
-                 "**However, here is the verified data from the database:**\n"
-                 "The system successfully filtered the properties. Please refer to the 'Explanation Data' or 'Raw Data' section to see the exact financial details computed by the backend."
-             )
-        return f"Error generating response: {e}"
+        yield response_error_message(e)
+
+def response_error_message(e):
+    error_msg = str(e)
+    if "insufficient_quota" in error_msg:
+         return (
+             "**⚠️ API Quota Exceeded (Offline Mode)**\n\n"
+             "I cannot generate a new custom explanation because the provided OpenAI API key has run out of credits.\n\n"
+             "**However, here is the verified data from the database:**\n"
+             "The system successfully filtered the properties. Please refer to the 'Explanation Data' or 'Raw Data' section to see the exact financial details computed by the backend."
+         )
+    return f"Error generating response: {e}"
@@ -0,0 +1,308 @@
+import difflib
+import re
+import threading
+from collections import namedtuple
+from functools import lru_cache
+
+from rag import db
+
+# Rule-based fast path for simple filter questions.
+# Parses BHK counts, budgets (k / L / Cr), rent/buy keywords, "cheapest"/"best"
+# and localities (spelling-corrected against the distinct addresses) straight
+# into parameterized SQL. Questions it cannot fully account for are left to the
+# LLM: route() returns None when its confidence is below CONFIDENCE_THRESHOLD.
+
+CONFIDENCE_THRESHOLD = 0.75
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 50
+RENT_VALUE_CUTOFF = 100_000     # a bare budget below this is a monthly rent
+FUZZY_CUTOFF = 0.85             # difflib ratio for misspelt localities
+FUZZY_MIN_WORD = 5              # shorter words in free text only start a locality when spelt exactly ("than")
+MAX_CANDIDATES = 500            # property ids handed to hybrid retrieval
+MIN_BARE_AMOUNT = 1_000         # a unitless range below this is not a budget ("action area 1 and 2")
+
+# filters: the same constraints as {column: value | [values] | (op, value)} for metadata filtering
+Route = namedtuple("Route", ["intent", "sql", "params", "confidence", "filters"])
+
+UNITS = {
+    "k": 1e3, "thousand": 1e3,
+    "l": 1e5, "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5,
+    "cr": 1e7, "crore": 1e7, "crores": 1e7,
+}
+_AMOUNT = r"(?:₹|\brs\.?|\binr|\$)?\s*(\d+(?:\.\d+)?)\s*(k|thousand|lakhs?|lacs?|l|cr|crores?)?\b"
+BHK = re.compile(r"\b(\d+)\s*(?:bhk|bed(?:room)?s?|rk)\b")
+RANGE = re.compile(rf"(?:between\s+)?{_AMOUNT}\s*(?:to|-|and)\s*{_AMOUNT}")
+UPPER = re.compile(rf"(?:under|below|less than|within|upto|up to|max(?:imum)?|<)\s*{_AMOUNT}")
+LOWER = re.compile(rf"(?:above|over|more than|at least|min(?:imum)?|>)\s*{_AMOUNT}")
+TOP_N = re.compile(r"\b(?:top|first|show|list|give|find)\s+(?:me\s+)?(\d+)\b")
+TOKEN = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+CURRENCY = re.compile(r"₹|\brs\b|\binr\b|\$")
+BUDGET_CONTEXT = re.compile(r"\b(?:between|budget|under|within|range|from)\s+(?:of\s+|is\s+)?$")
+
+RENT_WORDS = {"rent", "rents", "rental", "rentals", "renting", "rented", "lease", "leases", "leasing", "let"}
+BUY_WORDS = {"buy", "buying", "purchase", "purchasing", "invest", "investment", "investments", "sale", "sales"}
+CHEAP_WORDS = {"cheapest", "cheap", "cheaper", "lowest", "affordable", "budget"}
+COSTLY_WORDS = {"costliest", "expensive", "luxury", "priciest", "pricier", "premium"}
+BEST_WORDS = {"best", "top", "good", "great", "ideal"}
+FILLER_WORDS = {
+    "show", "me", "find", "list", "give", "get", "search", "any", "some", "all", "i", "want", "need",
+    "looking", "look", "for", "a", "an", "the", "in", "at", "near", "around", "of", "with", "and", "or",
+    "to", "please", "which", "are", "is", "there", "available", "options", "option", "flats", "flat",
+    "apartments", "apartment", "properties", "property", "homes", "home", "house", "houses", "units",
+    "kolkata", "calcutta", "city", "price", "priced", "cost", "most", "my",
+    "rs", "inr", "only", "from", "on", "within", "sorted", "by",
+}
+# Part of some addresses ("action area 1"), otherwise ignored after a locality
+PLACE_WORDS = {"area", "areas", "locality", "side", "region"}
+# Questions that need reasoning rather than a filter go to the LLM
+LLM_WORDS = {"why", "explain", "compare", "vs", "versus", "how", "what", "difference", "should", "tax", "emi"}
+# Negations would turn a filter into its opposite ("not in new town"); the LLM handles them
+NEGATION_WORDS = {"not", "except", "excluding", "exclude", "without"}
+NEGATION = re.compile(r"\bother than\b|n't\b")
+
+VOCABULARY = RENT_WORDS | BUY_WORDS | CHEAP_WORDS | COSTLY_WORDS | BEST_WORDS | FILLER_WORDS
+
+
+def parse_amount(value, unit):
+    return int(round(float(value) * UNITS.get(unit or "", 1)))
+
+
+def is_budget_range(match, text):
+    """
+    A RANGE match is a budget only with a unit, a currency, a budget word before
+    it or price-sized amounts; "action area 1 and 2" is left to the localities.
+    """
+    if match.group(2) or match.group(4) or CURRENCY.search(match.group(0)):
+        return True
+    if match.group(0).startswith("between") or BUDGET_CONTEXT.search(text, 0, match.start()):
+        return True
+    return min(float(match.group(1)), float(match.group(3))) >= MIN_BARE_AMOUNT
+
+
+class LocalityMatcher:
+    """Maps free text ("newtwn", "saltlake") to the matching distinct addresses."""
+
+    def __init__(self, addresses):
+        self.addresses = sorted({a.strip().lower() for a in addresses if isinstance(a, str) and a.strip()})
+        # Space-free address -> every address spelt that way ("new town", "newtown"), for exact matches
+        self._exact = {}
+        for address in self.addresses:
+            self._exact.setdefault(address.replace(" ", ""), []).append(address)
+        # Every word n-gram of every address, keyed by its space-free form, -> the addresses containing it
+        self._phrases = {}
+        for address in self.addresses:
+            words = address.split()
+            for n in range(1, len(words) + 1):
+                for i in range(len(words) - n + 1):
+                    self._phrases.setdefault("".join(words[i:i + n]), []).append(address)
+        self._longest = max((len(a.split()) for a in self.addresses), default=0)
+        self.resolve = lru_cache(maxsize=4096)(self._resolve)
+
+    def _resolve(self, text):
+        """
+        Returns the addresses matching text (or its closest spelling) exactly,
+        followed by every other address containing it as whole words ("behala"
+        -> "behala chowrasta"), as a tuple; like the LLM path's LIKE '%text%'
+        but without partial words ("garia" is not "gariahat").
+        """
+        key = text.replace(" ", "")
+        if len(key) < 3:
+            return ()
+        if key not in self._phrases:
+            close = difflib.get_close_matches(key, self._phrases, n=1, cutoff=FUZZY_CUTOFF)
+            if not close:
+                return ()
+            key = close[0]
+        exact = self._exact.get(key, [])
+        return tuple(exact + [a for a in self._phrases[key] if a not in exact])
+
+    def find(self, text):
+        """
+        The localities named anywhere in free text (the longest phrase at each
+        position), each as the first address it resolves to, so "newtwn" and
+        "New Town" agree.
+        """
+        tokens = TOKEN.findall(text.lower())
+        keywords = VOCABULARY | LLM_WORDS | NEGATION_WORDS
+        found, i = [], 0
+        while i < len(tokens):
+            step = 1
+            # A locality starts with a word of an address and may go on with place words and numbers
+            # ("action area 1"); longer phrases are only tried from such a word
+            word = tokens[i]
+            starts = word in self._phrases or (len(word) >= FUZZY_MIN_WORD and self.resolve(word))
+            if starts and word not in keywords | PLACE_WORDS and not word[0].isdigit():
+                for n in range(min(self._longest, len(tokens) - i), 0, -1):
+                    run = tokens[i:i + n]
+                    match = not keywords & set(run) and self.resolve(" ".join(run))
+                    if match:
+                        if match[0] not in found:
+                            found.append(match[0])
+                        step = n
+                        break
+            i += step
+        return found
+
+
+def parse(query, matcher):
+    """
+    Compiles a question into a Route, or returns None if nothing filterable was found.
+    The confidence is the share of the question's tokens the rules accounted for.
+    """
+    text = " " + query.lower().replace(",", " ") + " "
+    if (LLM_WORDS | NEGATION_WORDS) & set(TOKEN.findall(text)) or NEGATION.search(text):
+        return None
+
+    consumed = 0
+    bedrooms = limit = None
+    budget = None   # (op, values)
+
+    def take(pattern, text):
+        match = pattern.search(text)
+        if match:
+            text = text[:match.start()] + " " + text[match.end():]
+        return match, text
+
+    match, text = take(BHK, text)
+    if match:
+        bedrooms, consumed = int(match.group(1)), consumed + 1
+
+    match = next((m for m in RANGE.finditer(text) if is_budget_range(m, text)), None)
+    if match:
+        text = text[:match.start()] + " " + text[match.end():]
+        lo_unit, hi_unit = match.group(2) or match.group(4), match.group(4)
+        budget = ("BETWEEN", [parse_amount(match.group(1), lo_unit), parse_amount(match.group(3), hi_unit)])
+        consumed += 1
+    else:
+        for op, pattern in (("<", UPPER), (">", LOWER)):
+            match, text = take(pattern, text)
+            if match:
+                budget = (op, [parse_amount(match.group(1), match.group(2))])
+                consumed += 1
+                break
+
+    match, text = take(TOP_N, text)
+    if match:
+        limit, consumed = min(int(match.group(1)), MAX_LIMIT), consumed + 1
+
+    # Remaining words: keywords, fillers and (runs of unknown words) localities
+    tokens = TOKEN.findall(text)
+    words = set(tokens)
+    rent, buy = bool(words & RENT_WORDS), bool(words & BUY_WORDS)
+    localities, run, unknown, strays = [], [], 0, 0
+
+    def flush():
+        nonlocal unknown, strays
+        # Numbers and place words can be part of a locality ("action area 1"); retry without trailing ones
+        while run:
+            found = matcher.resolve(" ".join(run))
+            if found:
+                localities.extend(a for a in found if a not in localities)
+                break
+            if not (run[-1][0].isdigit() or run[-1] in PLACE_WORDS):
+                unknown += len(run)
+                strays += sum(token[0].isdigit() for token in run)
+                break
+            if run[-1][0].isdigit():
+                unknown, strays = unknown + 1, strays + 1
+            run.pop()
+        run.clear()
+
+    for token in tokens:
+        if token in VOCABULARY:
+            flush()
+        elif not run and (token[0].isdigit() or token in PLACE_WORDS):
+            if token[0].isdigit():
+                unknown, strays = unknown + 1, strays + 1
+        else:
+            run.append(token)
+    flush()
+
+    # A number the rules could not place ("action area 1 and 2") changes the question
+    if strays:
+        return None
+
+    consumed += len(tokens) - unknown
+    signals = [bedrooms, budget, localities, rent or buy, words & (CHEAP_WORDS | COSTLY_WORDS | BEST_WORDS)]
+    if not any(signals):
+        return None
+
+    # --- Compile ---
+    conditions, params, filters = [], [], {}
+    decision = "RENT" if rent and not buy else "BUY" if buy and not rent else None
+    if decision:
+        conditions.append("decision = ?")
+        params.append(decision)
+        filters["decision"] = decision
+    if bedrooms is not None:
+        conditions.append("bedrooms = ?")
+        params.append(bedrooms)
+        filters["bedrooms"] = bedrooms
+    if localities:
+        conditions.append(f"locality IN ({', '.join('?' * len(localities))})")
+        params.extend(localities)
+        filters["locality"] = list(localities)
+    if budget:
+        op, values = budget
+        column = "rent" if decision == "RENT" or (decision is None and max(values) < RENT_VALUE_CUTOFF) else "price"
+        conditions.append(f"{column} BETWEEN ? AND ?" if op == "BETWEEN" else f"{column} {op} ?")
+        params.extend(values)
+        filters[column] = (op, values if op == "BETWEEN" else values[0])
+
+    order = None
+    price_column = "rent" if decision == "RENT" else "price"
+    if words & CHEAP_WORDS:
+        order = f"{price_column} ASC"
+    elif words & COSTLY_WORDS:
+        order = f"{price_column} DESC"
+    elif words & BEST_WORDS:
+        order = "wealth_difference ASC" if decision == "RENT" else "wealth_difference DESC"
+
+    sql = "SELECT * FROM properties"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if order:
+        sql += f" ORDER BY {order}"
+    sql += " LIMIT ?"
+    params.append(limit or DEFAULT_LIMIT)
+
+    total = consumed + unknown
+    return Route("FILTER", sql, tuple(params), consumed / total if total else 0.0, filters)
+
+
+_matcher = None
+_matcher_version = None
+_matcher_lock = threading.Lock()
+
+def get_matcher():
+    """LocalityMatcher over the current distinct addresses, rebuilt when the data version changes."""
+    global _matcher, _matcher_version
+    version = db.get_data_version()
+    with _matcher_lock:
+        if _matcher is None or _matcher_version != version:
+            addresses = db.read_sql("SELECT DISTINCT address FROM properties")['address']
+            _matcher, _matcher_version = LocalityMatcher(addresses), version
+        return _matcher
+
+
+def route(query, threshold=CONFIDENCE_THRESHOLD):
+    """Returns a Route when the rules are confident enough, otherwise None (ask the LLM)."""
+    plan = parse(query, get_matcher())
+    if plan is None or plan.confidence < threshold:
+        return None
+    return plan
+
+
+def to_literal_sql(sql, params):
+    """Inlines params into sql for display or for callers that cannot pass parameters."""
+    parts = sql.split("?")
+    literals = [
+        "'" + p.replace("'", "''") + "'" if isinstance(p, str) else str(p)
+        for p in params
+    ]
+    return "".join(part + (literals[i] if i < len(literals) else "") for i, part in enumerate(parts))
+
+
+def candidate_sql(plan, limit=MAX_CANDIDATES):
+    """The route's filter and order without its row limit, selecting property ids for hybrid retrieval."""
+    return plan.sql.replace("SELECT *", "SELECT property_id", 1), plan.params[:-1] + (limit,)
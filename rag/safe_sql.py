@@ -0,0 +1,115 @@
+import re
+import sqlite3
+import time
+
+import pandas as pd
+
+# Guarded execution of generated SQL on a (pooled, read-only) connection.
+#  1. sqlite's authorizer callback allows one read-only SELECT over the
+#     properties table (and its FTS index); anything else fails at prepare time.
+#  2. EXPLAIN QUERY PLAN is inspected: full scans are sized with the table row
+#     counts, and unindexed sorts over large scans or huge nested scans (cross
+#     joins) are rejected before they run.
+#  3. A progress handler aborts statements that exceed the wall-clock budget.
+#  4. Rows are streamed with fetchmany and capped; a capped result is marked
+#     with df.attrs["truncated"].
+
+ALLOWED_TABLES = {"properties"}
+ALLOWED_PREFIXES = ("properties_fts",)   # the FTS5 table and its shadow tables
+TIMEOUT_SECONDS = 5.0
+PROGRESS_OPS = 10_000                    # VM instructions between deadline checks
+MAX_ROWS = 1_000
+FETCH_SIZE = 256
+MAX_SORT_SCAN_ROWS = 50_000              # rows a full scan may feed into a temp B-tree sort
+MAX_SCAN_ROWS = 2_000_000                # product of fully scanned tables (nested loops)
+
+_SQLITE_RECURSIVE = getattr(sqlite3, "SQLITE_RECURSIVE", 33)
+_READ_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, _SQLITE_RECURSIVE}
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(.*)")
+_SUBQUERY = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\w+)")
+_TEMP_SORT = re.compile(r"USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT|RIGHT PART OF ORDER BY)")
+
+
+class UnsafeQueryError(ValueError):
+    """The statement was rejected before (or while) running."""
+
+
+def _table_allowed(name):
+    return name is None or name in ALLOWED_TABLES or name.startswith(ALLOWED_PREFIXES)
+
+
+def _authorizer(action, arg1, arg2, db_name, trigger):
+    if action == sqlite3.SQLITE_READ:
+        return sqlite3.SQLITE_OK if _table_allowed(arg1) else sqlite3.SQLITE_DENY
+    if action == sqlite3.SQLITE_PRAGMA and arg1 == "data_version":
+        return sqlite3.SQLITE_OK    # read by FTS5 on every query
+    return sqlite3.SQLITE_OK if action in _READ_ACTIONS else sqlite3.SQLITE_DENY
+
+
+def check_plan(conn, query, params, table_rows):
+    """
+    Rejects plans that scan too much: an unindexed sort fed by more than
+    MAX_SORT_SCAN_ROWS rows, or nested full scans above MAX_SCAN_ROWS.
+    table_rows maps table names to their row counts. Scans of aliases count as
+    the largest table (only allowed tables can be read); CTE / subquery results
+    and virtual tables are not counted.
+    """
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    largest = max(table_rows.values(), default=0)
+    subqueries = {m.group(1) for m in (_SUBQUERY.match(row[-1]) for row in plan) if m}
+    scanned, sorts = 1, []
+    for row in plan:
+        detail = row[-1]
+        scan = _SCAN.match(detail)
+        if scan and scan.group(1) not in subqueries and "VIRTUAL TABLE" not in scan.group(2):
+            scanned *= max(1, table_rows.get(scan.group(1), largest))
+        sort = _TEMP_SORT.search(detail)
+        if sort:
+            sorts.append(sort.group(1))
+    if scanned > MAX_SCAN_ROWS:
+        raise UnsafeQueryError(f"Query rejected: the plan scans ~{scanned:,} row combinations (add a join condition or filter).")
+    if sorts and scanned > MAX_SORT_SCAN_ROWS:
+        raise UnsafeQueryError(f"Query rejected: unindexed {sorts[0]} over ~{scanned:,} rows (filter or sort on an indexed column).")
+    return plan
+
+
+def run_query(conn, query, params=None, table_rows=None, timeout=TIMEOUT_SECONDS, max_rows=MAX_ROWS):
+    """
+    Runs one authorized SELECT and returns a DataFrame of at most max_rows rows.
+    Raises UnsafeQueryError for rejected statements and timeouts.
+    """
+    params = tuple(params or ())
+    deadline = time.monotonic() + timeout
+    conn.set_authorizer(_authorizer)
+    conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, PROGRESS_OPS)
+    cursor = None
+    try:
+        check_plan(conn, query, params, table_rows or {})
+        cursor = conn.execute(query, params)
+        if cursor.description is None:
+            raise UnsafeQueryError("Error: Only SELECT queries are permitted.")
+        columns = [d[0] for d in cursor.description]
+        rows = []
+        while len(rows) <= max_rows:
+            batch = cursor.fetchmany(FETCH_SIZE)
+            if not batch:
+                break
+            rows.extend(batch)
+    except sqlite3.ProgrammingError as e:
+        raise UnsafeQueryError(f"Error: {e}") from e
+    except sqlite3.DatabaseError as e:
+        message = str(e)
+        if "not authorized" in message or "prohibited" in message:
+            raise UnsafeQueryError("Error: Only read-only SELECT queries over the properties table are permitted.") from e
+        if "interrupted" in message:
+            raise UnsafeQueryError(f"Query cancelled: exceeded the {timeout:g}s time budget.") from e
+        raise
+    finally:
+        if cursor is not None:
+            cursor.close()
+        conn.set_progress_handler(None, 0)
+        conn.set_authorizer(None)
+
+    df = pd.DataFrame.from_records(rows[:max_rows], columns=columns, coerce_float=True)
+    df.attrs["truncated"] = len(rows) > max_rows
+    return df
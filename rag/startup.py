@@ -0,0 +1,145 @@
+import argparse
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# Lazy startup helpers.
+# Slow subsystems (vector store hydration, model warm-up) run as named background
+# tasks with a readiness flag, so the UI renders while they load; callers check
+# is_pending(name) to skip what is not ready yet.
+#
+# The module is also an import-time profiler for cold-start regressions:
+#
+#   python -m rag.startup                 # what app.py imports at startup
+#   python -m rag.startup --deferred      # plus the subsystems loaded on first use
+#
+# It runs the imports under `python -X importtime` in a fresh interpreter and
+# prints the slowest modules and a per-package breakdown.
+
+KNOWLEDGE_BASE = "knowledge_base"
+
+STARTUP_MODULES = ["streamlit", "pandas", "rag.db", "rag.router", "rag.rag_engine", "rag.pipeline", "finance.scenarios"]
+DEFERRED_MODULES = ["plotly.express", "statsmodels.api", "openai", "chromadb", "sentence_transformers", "rag.vector_store"]
+
+
+class BackgroundTask:
+    """Runs fn() once in a daemon thread; ready is set when it finishes (successfully or not)."""
+
+    def __init__(self, name, fn):
+        self.name = name
+        self.fn = fn
+        self.ready = threading.Event()
+        self.result = None
+        self.error = None
+        self.started_at = self.finished_at = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self.started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name=f"startup-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.result = self.fn()
+        except Exception as e:
+            self.error = e
+            print(f"Startup task {self.name} failed: {e}")
+        finally:
+            self.finished_at = time.perf_counter()
+            self.ready.set()
+
+    @property
+    def seconds(self):
+        end = self.finished_at or time.perf_counter()
+        return end - self.started_at if self.started_at else 0.0
+
+    def status(self):
+        if not self.ready.is_set():
+            return f"loading… ({self.seconds:.0f}s)"
+        if self.error is not None:
+            return f"failed ({self.error})"
+        return f"ready in {self.seconds:.1f}s"
+
+
+_tasks = {}
+_tasks_lock = threading.Lock()
+
+
+def start_task(name, fn):
+    """Starts the named task once per process and returns it (later calls return the same task)."""
+    with _tasks_lock:
+        if name not in _tasks:
+            _tasks[name] = BackgroundTask(name, fn).start()
+        return _tasks[name]
+
+
+def get_task(name):
+    return _tasks.get(name)
+
+
+def is_pending(name):
+    """True while a started task is still running. Tasks that were never started are not pending."""
+    task = _tasks.get(name)
+    return task is not None and not task.ready.is_set()
+
+
+# ============================================================
+# IMPORT-TIME PROFILE
+# ============================================================
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def profile_imports(modules):
+    """
+    Imports modules in a fresh interpreter with -X importtime.
+    Returns [(module, self_us, cumulative_us, depth)] in import order.
+    """
+    code = (
+        "import importlib\n"
+        f"for m in {list(modules)!r}:\n"
+        "    try: importlib.import_module(m)\n"
+        "    except Exception as e: print(f'skipped {m}: {e}')\n"
+    )
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2))
+    if proc.stdout.strip():
+        print(proc.stdout.strip() + "\n")
+    return rows
+
+
+def report(rows, top=20):
+    total = sum(self_us for _, self_us, _, _ in rows)
+    by_package = defaultdict(int)
+    for module, self_us, _, _ in rows:
+        by_package[module.split(".")[0]] += self_us
+
+    print(f"Total import time: {total / 1e6:.2f}s across {len(rows)} modules\n")
+    print(f"{'package':<28}{'self (ms)':>12}{'share':>8}")
+    for package, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"{package:<28}{us / 1000:>12.1f}{us / total if total else 0:>8.0%}")
+
+    print(f"\n{'slowest modules':<40}{'self (ms)':>12}{'cumulative (ms)':>17}")
+    for module, self_us, cumulative_us, _ in sorted(rows, key=lambda r: -r[1])[:top]:
+        print(f"{module:<40}{self_us / 1000:>12.1f}{cumulative_us / 1000:>17.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time profile of the app's startup imports")
+    parser.add_argument("modules", nargs="*", help="modules to import (default: what app.py imports at startup)")
+    parser.add_argument("--deferred", action="store_true", help="also import the subsystems loaded on first use")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    modules = args.modules or STARTUP_MODULES + (DEFERRED_MODULES if args.deferred else [])
+    report(profile_imports(modules), args.top)
@@ -1,182 +1,323 @@
 import chromadb
 from chromadb.utils import embedding_functions
+import numpy as np
 import pandas as pd
 import os
 import uuid
 import json
+import hashlib
+import threading
+import time
+
+from rag import concept_index
 
 # Initialize Chroma Client with Logic defined in Manual
 # "Vector Store: FAISS, pgvector, or Chroma" -> Using Chroma (Local/File-based)
 
 CHROMA_DB_PATH = "chroma_db"
 COLLECTION_NAME = "property_explanations"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# --- Resource Registry ---
+# The Chroma client, the embedding model and the collection are created once
+# per process (lazily, under a lock) and shared by every Streamlit session.
+# Load and query timings are kept for the sidebar.
+_resources = {}
+_registry_lock = threading.RLock()
+_timings = {"queries": 0, "total_query_ms": 0.0}
+
+def _resource(name, factory):
+    resource = _resources.get(name)
+    if resource is None:
+        with _registry_lock:
+            resource = _resources.get(name)
+            if resource is None:
+                start = time.perf_counter()
+                resource = factory()
+                _timings[f"{name}_load_ms"] = (time.perf_counter() - start) * 1000
+                _resources[name] = resource
+    return resource
 
 def get_chroma_client():
-    return chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    return _resource("client", lambda: chromadb.PersistentClient(path=CHROMA_DB_PATH))
 
 def get_embedding_function():
     # Using a local model to avoid API costs/limits for bulk embedding
     # This is "equivalent" to OpenAI embeddings as permitted.
-    return embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+    return _resource("model", lambda: embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL))
+
+def get_collection():
+    """The shared collection, bound to the shared embedding model (created if missing)."""
+    return _resource("collection", lambda: get_chroma_client().get_or_create_collection(
+        name=COLLECTION_NAME, embedding_function=get_embedding_function()
+    ))
+
+def reset_collection():
+    """Drops and recreates the collection, keeping the registry in sync."""
+    with _registry_lock:
+        try:
+            get_chroma_client().delete_collection(name=COLLECTION_NAME)
+        except Exception:
+            pass
+        _resources.pop("collection", None)
+        return get_collection()
+
+def warm_up():
+    """Loads the client, model and collection and runs one embedding, so the first real query is fast."""
+    start = time.perf_counter()
+    get_embedding_function()(["warm up"])
+    get_collection()
+    _timings["warm_up_ms"] = (time.perf_counter() - start) * 1000
+    return get_timings()
+
+def get_timings():
+    """Load times of the shared resources and query statistics, in milliseconds."""
+    timings = dict(_timings)
+    if timings["queries"]:
+        timings["avg_query_ms"] = timings["total_query_ms"] / timings["queries"]
+    return timings
 
 def needs_hydration():
     """
     Checks if the vector store needs hydration without loading the full model.
-    Returns True if the collection is empty.
+    Returns True if the collection is missing or empty; changed listings are
+    picked up by the incremental sync in initialize_vector_store.
     """
     try:
-        client = get_chroma_client()
-        # Just check count without embedding function first if possible, but simpler to use get_collection
-        # Note: get_collection might fail if collection doesn't exist, so we use list_collections or try/except
-        try:
-           collection = client.get_collection(name=COLLECTION_NAME) # No embedding fn needed for count
-           count = collection.count()
-           # Re-hydrate if empty OR if it holds the old dataset (migration limit)
-           if count == 0 or count > 3400:
-               return True
-           return False
-        except:
-           return True # If collection doesn't exist, we need to hydrate
-    except:
-        return True
+        return get_chroma_client().get_collection(name=COLLECTION_NAME).count() == 0
+    except Exception:
+        return True # If collection doesn't exist, we need to hydrate
 
-def initialize_vector_store(df=None):
+# --- Incremental Sync ---
+# Documents are keyed by a stable id (the property_id from rag/db.py, or the
+# concept's position) and carry a hash of their rendered text. A sync embeds only
+# new or changed documents and deletes ids that are no longer produced, so a
+# re-filtered or re-ordered dataset costs nothing to re-sync.
+
+# Documents per embedding call. sentence-transformers sorts each call by length
+# and runs MiniLM in sub-batches; on CPU throughput stops improving beyond this.
+EMBED_BATCH_SIZE = 256
+
+def content_hash(text, metadata=None):
+    """Hash of a document's text and metadata (a metadata change is re-synced too)."""
+    payload = text if metadata is None else text + "\x1f" + json.dumps(metadata, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+PROPERTY_TEMPLATE = [
+    ("\n                Property: ", "name", "Unknown"),
+    ("\n                Location: ", "address", "Unknown"),
+    ("\n                Financials: Price ", "price", "N/A"),
+    (", Rent ", "rent", "N/A"),
+    (", EMI ", "monthly_emi", "N/A"),
+    ("\n                Decision: ", "decision", "N/A"),
+    ("\n                Wealth Difference: ", "wealth_difference", "0"),
+    ("\n                Tax Regime: ", "chosen_tax_regime", "N/A"),
+    (", Tax Paid: ", "total_tax_paid", "N/A"),
+    ("\n                Rationale: This property in ", "address", "Unknown"),
+    (" is calculated to be a ", "decision", "N/A"),
+]
+PROPERTY_TEMPLATE_END = ".\n                "
+
+def render_property_documents(df):
     """
-    Ingests Property Records AND Educational Concepts into ChromaDB.
+    Explanation text for every listing, built column-wise (no per-row Python).
+    Missing columns render as their placeholder.
     """
-    client = get_chroma_client()
-    embedding_fn = get_embedding_function()
+    text = pd.Series("", index=df.index, dtype=object)
+    for prefix, column, default in PROPERTY_TEMPLATE:
+        values = df[column].astype(str) if column in df.columns else default
+        text = text + prefix + values
+    return text + PROPERTY_TEMPLATE_END
+
+# Structured fields stored with each listing for hybrid filters (same names as the SQL columns)
+METADATA_TYPES = {"price": float, "rent": float, "bedrooms": int}
+
+def property_metadata(df):
+    columns = {"name": "name", "location": "address", "decision": "decision"}
+    meta = pd.DataFrame({key: df[col] if col in df.columns else "Unknown" for key, col in columns.items()}, index=df.index)
+    if 'property_id' in df.columns:
+        meta["property_id"] = df['property_id'].astype(str)
+    if 'address' in df.columns:
+        meta["locality"] = df['address'].astype(str).str.strip().str.lower()
+    for column in METADATA_TYPES:
+        if column in df.columns:
+            meta[column] = pd.to_numeric(df[column], errors='coerce')
+    meta["source"] = "csv_analysis"
+    # Chroma rejects missing values; numbers are stored with a fixed type so range filters match
+    return [
+        {k: METADATA_TYPES[k](v) if k in METADATA_TYPES else v for k, v in record.items() if pd.notna(v)}
+        for record in meta.to_dict("records")
+    ]
+
+def property_documents(df):
+    """{id: (text, metadata)} for every listing in df (needs the property_id column)."""
+    ids = "prop_" + df['property_id'].astype(str)
+    return dict(zip(ids, zip(render_property_documents(df), property_metadata(df))))
+
+def educational_documents():
+    """{id: (text, metadata)} for rag/educational_concepts.json (empty if the file is missing)."""
+    if not os.path.exists(concept_index.CONCEPTS_PATH):
+        print("Warning: educational_concepts.json not found.")
+        return {}
     
-    # Get or Create Collection
+    return {
+        f"edu_{i}": (text, {"source": "educational_concept", "topic": topic})
+        for i, (topic, text) in enumerate(concept_index.load_concepts())
+    }
+
+def _existing_collection():
+    """The stored collection without binding the embedding model, or None if it does not exist yet."""
     try:
-        collection = client.get_collection(name=COLLECTION_NAME, embedding_function=embedding_fn)
-        
-        # MIGRATION FIX: Check if collection has the old "unfiltered" data (approx 3419 records)
-        # We want to reset it to match the new filtered dataset (~3026 records)
-        if df is not None:
-            cutoff_threshold = 3400 # Old count was 3419, new is ~3026
-            if collection.count() > cutoff_threshold:
-                 # print(f"Detected outdated dataset (Count: {collection.count()}). Resetting Vector DB...")
-                 client.delete_collection(name=COLLECTION_NAME)
-                 collection = client.create_collection(name=COLLECTION_NAME, embedding_function=embedding_fn)
-                 
-    except:
-        collection = client.create_collection(name=COLLECTION_NAME, embedding_function=embedding_fn)
-
-    # 1. Hydrate Property Records (only if empty to avoid dups)
-    if collection.count() == 0:
-        if df is not None:
-            # print("Hydrating Vector Store with Property Explanation Records...")
-            
-            ids = []
-            documents = []
-            metadatas = []
-            
-            for index, row in df.iterrows():
-                name = row.get('name', 'Unknown')
-                addr = row.get('address', 'Unknown')
-                price = str(row.get('price', 'N/A'))
-                rent = str(row.get('rent', 'N/A'))
-                decision = row.get('decision', 'N/A')
-                wealth_diff = str(row.get('wealth_difference', '0'))
-                emi = str(row.get('monthly_emi', 'N/A'))
-                regime = row.get('chosen_tax_regime', 'N/A')
-                total_tax = str(row.get('total_tax_paid', 'N/A'))
-                
-                explanation_text = f"""
-                Property: {name}
-                Location: {addr}
-                Financials: Price {price}, Rent {rent}, EMI {emi}
-                Decision: {decision}
-                Wealth Difference: {wealth_diff}
-                Tax Regime: {regime}, Tax Paid: {total_tax}
-                Rationale: This property in {addr} is calculated to be a {decision}.
-                """
-                
-                documents.append(explanation_text)
-                ids.append(f"prop_{index}")
-                metadatas.append({
-                    "name": name, 
-                    "location": addr,
-                    "decision": decision,
-                    "source": "csv_analysis"
-                })
-                
-            BATCH_SIZE = 100
-            for i in range(0, len(documents), BATCH_SIZE):
-                collection.add(
-                    ids=ids[i:i+BATCH_SIZE],
-                    documents=documents[i:i+BATCH_SIZE],
-                    metadatas=metadatas[i:i+BATCH_SIZE]
-                )
-            # print(f"Successfully embedded {len(documents)} property records.")
-        else:
-             print("Vector store empty/incomplete, but no DataFrame provided for hydration. Skipping property data.")
+        return get_chroma_client().get_collection(name=COLLECTION_NAME)
+    except Exception:
+        return None
 
-    else:
-        # print(f"Vector Store already contains {collection.count()} property records.")
-        pass
+def sync_documents(source, documents):
+    """
+    Makes the documents of one source match `documents` ({id: (text, metadata)}).
+    Returns counts of added / updated / deleted / unchanged documents.
+    """
+    hashes = {doc_id: content_hash(text, meta) for doc_id, (text, meta) in documents.items()}
+    
+    collection = _existing_collection()
+    stored = {}
+    if collection is not None:
+        existing = collection.get(where={"source": source}, include=["metadatas"])
+        stored = {doc_id: (meta or {}).get("content_hash") for doc_id, meta in zip(existing['ids'], existing['metadatas'])}
+    
+    stale = [doc_id for doc_id in stored if doc_id not in documents]
+    pending = [doc_id for doc_id, h in hashes.items() if stored.get(doc_id) != h]
+    
+    if stale:
+        collection.delete(ids=stale)
+    if pending:
+        # Only now is the embedding model needed
+        collection = get_collection()
+        embed = get_embedding_function()
+        for i in range(0, len(pending), EMBED_BATCH_SIZE):
+            batch = pending[i:i+EMBED_BATCH_SIZE]
+            texts = [documents[doc_id][0] for doc_id in batch]
+            collection.upsert(
+                ids=batch,
+                documents=texts,
+                metadatas=[{**documents[doc_id][1], "content_hash": hashes[doc_id]} for doc_id in batch],
+                embeddings=embed(texts)
+            )
+    
+    added = sum(doc_id not in stored for doc_id in pending)
+    return {"added": added, "updated": len(pending) - added, "deleted": len(stale),
+            "unchanged": len(documents) - len(pending)}
 
-    # 2. Check/Inject Educational Concepts (Always check if missing)
-    # We query specifically for educational sources to see if they are missing
+def initialize_vector_store(df=None):
+    """
+    Syncs Property Records AND Educational Concepts into ChromaDB.
+    Without a DataFrame the stored property records are left as they are.
+    The embedding model is only loaded when something actually has to be embedded.
+    """
+    summary = {}
+    if df is not None:
+        summary["csv_analysis"] = sync_documents("csv_analysis", property_documents(df))
+    elif needs_hydration():
+        print("Vector store empty/incomplete, but no DataFrame provided for hydration. Skipping property data.")
+    
     try:
-        edu_check = collection.get(where={"source": "educational_concept"}, limit=1)
-        if len(edu_check['ids']) == 0:
-            # print("Injecting Educational Concepts...")
-            json_path = os.path.join(os.path.dirname(__file__), "educational_concepts.json")
-            
-            if os.path.exists(json_path):
-                with open(json_path, "r") as f:
-                    concepts = json.load(f)
-                
-                edu_ids = []
-                edu_docs = []
-                edu_metas = []
-                
-                for i, concept in enumerate(concepts):
-                    # Richer context format for the LLM
-                    text = f"Topic: {concept['topic']}\nQuestion: {concept['question']}\nExplanation: {concept['content']}"
-                    
-                    edu_ids.append(f"edu_{i}")
-                    edu_docs.append(text)
-                    edu_metas.append({
-                        "source": "educational_concept", 
-                        "topic": concept['topic']
-                    })
-                
-                if edu_ids:
-                    collection.add(
-                        ids=edu_ids,
-                        documents=edu_docs,
-                        metadatas=edu_metas
-                    )
-                    # print(f"Successfully embedded {len(edu_ids)} educational concepts.")
-            else:
-                print("Warning: educational_concepts.json not found.")
-        else:
-             # print("Educational concepts already present.")
-             pass
-             
+        concepts = educational_documents()
+        if concepts:
+            summary["educational_concept"] = sync_documents("educational_concept", concepts)
     except Exception as e:
-        print(f"Error checking educational concepts: {e}")
+        print(f"Error syncing educational concepts: {e}")
+    return summary
+
+def _record_query(start):
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    with _registry_lock:
+        _timings["last_query_ms"] = elapsed_ms
+        _timings["queries"] += 1
+        _timings["total_query_ms"] += elapsed_ms
 
 def semantic_search(query, n_results=3, where=None):
     """
     Performs semantic retrieval.
     Useful for 'Educational' or 'Broad' queries where SQL is too rigid.
     """
-    client = get_chroma_client()
-    embedding_fn = get_embedding_function()
-    collection = client.get_collection(name=COLLECTION_NAME, embedding_function=embedding_fn)
+    collection = get_collection()
     
+    start = time.perf_counter()
     results = collection.query(
         query_texts=[query],
         n_results=n_results,
         where=where
     )
+    _record_query(start)
     
     # Flatten results
     if results['documents']:
         docs = results['documents'][0]
         return "\n\n".join(docs)
     return ""
+
+# --- Hybrid Retrieval ---
+# Structured constraints narrow the listings either through Chroma metadata
+# filters (metadata_filter + filtered_ids) or through indexed SQL (candidate ids
+# ranked exactly by rank_ids); the SQL order and the vector order are then
+# combined with reciprocal-rank fusion.
+
+RRF_K = 60
+FILTER_OPERATORS = {"<": "$lt", "<=": "$lte", ">": "$gt", ">=": "$gte", "=": "$eq"}
+
+def metadata_filter(filters):
+    """
+    Chroma where clause over property metadata for
+    {column: value | [values] | (op, value) | ("BETWEEN", [lo, hi])}.
+    """
+    clauses = [{"source": "csv_analysis"}]
+    for column, value in filters.items():
+        cast = METADATA_TYPES.get(column, lambda v: v)
+        if isinstance(value, tuple):
+            op, operand = value
+            if op == "BETWEEN":
+                clauses += [{column: {"$gte": cast(operand[0])}}, {column: {"$lte": cast(operand[1])}}]
+            else:
+                clauses.append({column: {FILTER_OPERATORS[op]: cast(operand)}})
+        elif isinstance(value, list):
+            clauses.append({column: {"$in": [cast(v) for v in value]}})
+        else:
+            clauses.append({column: cast(value)})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def filtered_ids(query, where, n_results):
+    """Ids of the n_results nearest documents among those matching where."""
+    start = time.perf_counter()
+    results = get_collection().query(query_texts=[query], n_results=n_results, where=where, include=["distances"])
+    _record_query(start)
+    return results['ids'][0] if results['ids'] else []
+
+def rank_ids(query, ids):
+    """The given ids ordered by cosine similarity to query (exact, over these candidates only)."""
+    if not ids:
+        return []
+    start = time.perf_counter()
+    found = get_collection().get(ids=list(ids), include=["embeddings"])
+    if not len(found['ids']):
+        return []
+    matrix = np.asarray(found['embeddings'], dtype=np.float32)
+    vector = np.asarray(get_embedding_function()([query])[0], dtype=np.float32)
+    scores = matrix @ vector / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector) + 1e-12)
+    _record_query(start)
+    return [found['ids'][i] for i in np.argsort(-scores, kind="stable")]
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Ids from several rankings, ordered by the sum of 1 / (k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+def get_documents(ids):
+    """Document texts for ids, in the given order."""
+    if not ids:
+        return []
+    found = get_collection().get(ids=list(ids), include=["documents"])
+    by_id = dict(zip(found['ids'], found['documents']))
+    return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import os
+import tempfile
+
+from scraper import crawl, fixture_server
+
+# Offline check of the crawler against the recorded fixture pages.
+#
+#   python -m scraper.check
+#
+# Starts the fixture server and crawls it twice through one page cache: the
+# rows must match the fixtures, and the second crawl must be answered by 304s
+# and reused details. A server that fails every few requests with 503 must
+# still give every row (through retries), and a --record crawl on a warm cache
+# must save pages that replay to the same rows.
+
+PAGES = 2
+RATE = 200.0        # the fixture server is local; no need to be polite
+FAIL_EVERY = 3
+
+EXPECTED = [
+    # Name, Address, Bedrooms, Price, Rent, Area, Per_Sqft_Price, Furnishing
+    ("2 BHK Apartment for Sale in Team Taurus Singhaduar, Rajarhat Kolkata", "Rajarhat", "2", "66.3 Lac", "N/A", "1197", "5539", "Unfurnished"),
+    ("3 BHK Apartment for Sale in Srijan Town Square, New Town Kolkata", "New Town", "3", "2.75 Cr", "N/A", "2017", "13634", "Unfurnished"),
+    ("4 BHK Villa for Sale in Arizuma Southern Vista, Rajpur Sonarpur Kolkata", "Rajpur Sonarpur", "4", "1.51 Cr", "N/A", "1974", "7649", "Unfurnished"),
+    ("1 BHK Apartment for Sale in Behala Kolkata", "Behala", "1", "28 Lac", "N/A", "560", "5000", "Semi-Furnished"),
+    ("2 BHK Flat for Rent in Salt Lake Kolkata", "Salt Lake", "2", "N/A", "22000", "950", "23", "Semi-Furnished"),
+    ("3 BHK Flat for Rent in Ballygunge Kolkata", "Ballygunge", "3", "N/A", "45000", "1450", "31", "Furnished"),
+    ("1 BHK Flat for Rent in Garia Kolkata", "Garia", "1", "N/A", "9500", "480", "20", "Unfurnished"),
+]
+ROW_COLUMNS = ["Name", "Address", "Bedrooms", "Price", "Rent", "Area", "Per_Sqft_Price", "Furnishing"]
+
+
+def rows(df):
+    return [tuple(str(value) for value in row) for row in df[ROW_COLUMNS].itertuples(index=False)]
+
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+    print(f"  ok: {message}")
+
+
+def run(base_url, **kwargs):
+    return asyncio.run(crawl.crawl(pages=PAGES, base_url=base_url, rate=RATE, **kwargs))
+
+
+def check_incremental(directory, workdir):
+    """Two crawls through one cache: the second is all 304s and reused details."""
+    print("Incremental crawl")
+    server, base_url = fixture_server.start_in_thread(directory=directory)
+    cache_path = os.path.join(workdir, "cache.db")
+    try:
+        df, first, _ = run(base_url, cache_path=cache_path)
+        check(rows(df) == EXPECTED, f"first crawl gives the {len(EXPECTED)} fixture rows")
+        check(not first["failed_pages"] and not first["failed_details"], "first crawl fetches every page")
+        df, second, _ = run(base_url, cache_path=cache_path)
+        check(rows(df) == EXPECTED, "second crawl gives the same rows")
+        check(second["not_modified"] > first["not_modified"], f"listing pages not modified ({second['not_modified']})")
+        check(second["details_reused"] > first["details_reused"], f"detail pages reused ({second['details_reused']})")
+        check(second["requests"] < first["requests"], f"fewer requests ({first['requests']} -> {second['requests']})")
+        check(second["bytes"] == 0, "nothing downloaded")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def check_retries(directory):
+    """Every FAIL_EVERY-th request is a 503; retries still give every row."""
+    print(f"Crawl with a 503 every {FAIL_EVERY} requests")
+    server, base_url = fixture_server.start_in_thread(directory=directory, fail_every=FAIL_EVERY)
+    try:
+        df, stats, _ = run(base_url, cache_path=None)
+        check(stats["retries"] > 0, f"failed requests retried ({stats['retries']})")
+        check(rows(df) == EXPECTED, "all rows despite the failures")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def check_record_replay(directory, workdir):
+    """A --record crawl on a warm cache saves every page; replaying them gives the same rows."""
+    print("Record and replay")
+    record_dir = os.path.join(workdir, "recorded")
+    cache_path = os.path.join(workdir, "record_cache.db")
+    server, base_url = fixture_server.start_in_thread(directory=directory)
+    try:
+        run(base_url, cache_path=cache_path)
+        _, stats, _ = run(base_url, cache_path=cache_path, record_dir=record_dir)
+        check(not stats["details_reused"] and not stats["not_modified"], "recording fetches every page")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    recorded = fixture_server.load_fixtures(record_dir)
+    check(recorded.keys() == fixture_server.load_fixtures(directory).keys(), f"{len(recorded)} pages recorded")
+    server, base_url = fixture_server.start_in_thread(directory=record_dir)
+    try:
+        df, stats, _ = run(base_url, cache_path=None)
+        check(rows(df) == EXPECTED and not stats["failed_details"], "replay gives the same rows")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks the crawler against the recorded fixture pages")
+    parser.add_argument("--dir", default=fixture_server.FIXTURES_DIR)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        check_incremental(args.dir, workdir)
+        check_retries(args.dir)
+        check_record_replay(args.dir, workdir)
+    print("All scraper checks passed")
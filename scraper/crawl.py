@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import functools
+import time
+from collections import Counter
+from urllib.parse import urlsplit, urlunsplit
+
+import pandas as pd
+
+from scraper import fetch, fixture_server, parse
+
+# Incremental MagicBricks crawl (the scraping loops of webscraping.ipynb).
+#
+#   python -m scraper.crawl                              # buy + rent -> properties.csv
+#   python -m scraper.crawl --kind rent --pages 5 --rate 2
+#
+# Listing pages are fetched concurrently through one pooled, rate-limited
+# fetch.Fetcher, and each page's detail pages are fetched as soon as the page
+# is parsed. Every fetch is a conditional GET against the page cache: a 304, or
+# a body with the same fingerprint, reuses the cached parse. A listing card
+# that is unchanged since its detail page was fetched reuses the cached details
+# without any request, so a re-crawl only fetches the detail pages of new or
+# changed listings.
+
+BASE_URL = "https://www.magicbricks.com"
+LISTING_PATHS = {
+    parse.BUY: "/property-for-sale/residential-real-estate",
+    parse.RENT: "/property-for-rent/residential-real-estate",
+}
+PAGES = {parse.BUY: 159, parse.RENT: 129}
+OUTPUT_PATH = "properties.csv"
+COLUMNS = ["Name", "City", "Address", "Bedrooms", "Price", "Rent", "Area", "Per_Sqft_Price", "Furnishing"]
+
+
+def listing_url(kind, page, base_url=BASE_URL):
+    return f"{base_url}{LISTING_PATHS[kind]}?cityName=kolkata&page={page}"
+
+
+def rebase(link, base_url=BASE_URL):
+    """Points a detail link at base_url (e.g. the fixture server) when it is not the live site."""
+    if base_url == BASE_URL:
+        return link
+    base, parts = urlsplit(base_url), urlsplit(link)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, ""))
+
+
+class Crawler:
+    """One crawl over a Fetcher and an optional PageCache; stats counts what was fetched or reused."""
+
+    def __init__(self, fetcher, cache=None, base_url=BASE_URL, conditional=True):
+        self.fetcher = fetcher
+        self.cache = cache
+        self.base_url = base_url
+        self.conditional = conditional
+        self.stats = Counter()
+
+    async def fetch_parsed(self, url, parser, cached=None, card_fingerprint=None):
+        """Fetches url (conditionally) and returns its parse, reusing the cached one when the page is unchanged."""
+        validators = (cached["etag"], cached["last_modified"]) if cached and self.conditional else (None, None)
+        result = await self.fetcher.get(url, *validators)
+        if result.status == 304:
+            data, body_fingerprint = cached["data"], cached["fingerprint"]
+            self.stats["not_modified"] += 1
+        else:
+            body_fingerprint = fetch.fingerprint(result.body)
+            if cached and cached["fingerprint"] == body_fingerprint:
+                data = cached["data"]
+                self.stats["unchanged"] += 1
+            else:
+                data = parser(result.body)
+                self.stats["parsed"] += 1
+        if self.cache is not None:
+            self.cache.put(url, result.etag, result.last_modified, body_fingerprint, data, card_fingerprint)
+        return data
+
+    async def listing(self, kind, page):
+        url = listing_url(kind, page, self.base_url)
+        cached = self.cache.get(url) if self.cache is not None else None
+        try:
+            return await self.fetch_parsed(url, functools.partial(parse.parse_listing, kind=kind), cached)
+        except fetch.FetchError as e:
+            print(f"Skipped {kind} page {page}: {e}")
+            self.stats["failed_pages"] += 1
+            return []
+
+    async def details(self, kind, prop):
+        if not prop["link"]:
+            return parse.empty_details(kind)
+        url = rebase(prop["link"], self.base_url)
+        card_fingerprint = parse.card_fingerprint(prop)
+        cached = self.cache.get(url) if self.cache is not None else None
+        # Unconditional crawls (--record) fetch every detail page, even of unchanged cards
+        if self.conditional and cached and cached["card_fingerprint"] == card_fingerprint:
+            self.stats["details_reused"] += 1
+            return cached["data"]
+        try:
+            return await self.fetch_parsed(url, functools.partial(parse.parse_details, kind=kind), cached, card_fingerprint)
+        except fetch.FetchError:
+            self.stats["failed_details"] += 1
+            return parse.empty_details(kind)
+
+    async def page(self, kind, page):
+        """(card, details) pairs of one listing page; its detail pages are fetched concurrently."""
+        cards = await self.listing(kind, page)
+        details = await asyncio.gather(*(self.details(kind, prop) for prop in cards))
+        return list(zip(cards, details))
+
+    async def crawl(self, kind, pages):
+        results = await asyncio.gather(*(self.page(kind, page) for page in range(1, pages + 1)))
+        return to_frame(kind, [row for rows in results for row in rows])
+
+
+def to_frame(kind, rows):
+    """Same columns as the notebook's df (buy) / df2 (rent)."""
+    records = [
+        {
+            "Name": prop["name"],
+            "City": prop["city"],
+            "Address": details["address"],
+            "Bedrooms": prop["bedroom"],
+            "Price": prop.get("price", parse.NA),
+            "Rent": prop.get("rent", parse.NA),
+            "Area": prop["area"] if kind == parse.BUY else details.get("area", parse.NA),
+            "Per_Sqft_Price": details["per_sqft"],
+            "Furnishing": prop["furnishing"],
+        }
+        for prop, details in rows
+    ]
+    return pd.DataFrame(records, columns=COLUMNS)
+
+
+async def crawl(kinds=(parse.BUY, parse.RENT), pages=None, base_url=BASE_URL, cache_path=fetch.CACHE_PATH,
+                concurrency=fetch.CONCURRENCY, rate=fetch.RATE_PER_HOST, record_dir=None):
+    """
+    Crawls the listing kinds (pages per kind defaults to PAGES) and returns
+    (df, stats, seconds). cache_path=None crawls without the page cache.
+    With record_dir every page is fetched unconditionally and saved as a fixture.
+    """
+    start = time.perf_counter()
+    cache = fetch.PageCache(cache_path) if cache_path else None
+    recorder = functools.partial(fixture_server.record, record_dir) if record_dir else None
+    try:
+        async with fetch.Fetcher(concurrency, rate, recorder=recorder) as fetcher:
+            crawler = Crawler(fetcher, cache, base_url, conditional=record_dir is None)
+            frames = await asyncio.gather(*(crawler.crawl(kind, pages or PAGES[kind]) for kind in kinds))
+            stats = crawler.stats + fetcher.stats
+    finally:
+        if cache is not None:
+            cache.close()
+    return pd.concat(frames, ignore_index=True), stats, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental, rate-limited MagicBricks crawl")
+    parser.add_argument("--kind", choices=[parse.BUY, parse.RENT, "all"], default="all")
+    parser.add_argument("--pages", type=int, default=None, help="listing pages per kind (default: 159 buy / 129 rent)")
+    parser.add_argument("--base-url", default=BASE_URL, help="e.g. the fixture server, http://127.0.0.1:8002")
+    parser.add_argument("--out", default=OUTPUT_PATH)
+    parser.add_argument("--cache", default=fetch.CACHE_PATH, help="page cache (ETags, fingerprints, parses)")
+    parser.add_argument("--no-cache", action="store_true", help="crawl everything from scratch")
+    parser.add_argument("--concurrency", type=int, default=fetch.CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=fetch.RATE_PER_HOST, help="requests per second per host")
+    parser.add_argument("--record", metavar="DIR", help="save every fetched page as a fixture in DIR")
+    args = parser.parse_args()
+
+    kinds = [parse.BUY, parse.RENT] if args.kind == "all" else [args.kind]
+    df, stats, seconds = asyncio.run(crawl(
+        kinds, args.pages, args.base_url, None if args.no_cache else args.cache,
+        args.concurrency, args.rate, args.record
+    ))
+    df.to_csv(args.out, index=False)
+    print(f"Saved {len(df)} listings to {args.out} in {seconds:.1f}s")
+    print(f"  {stats['requests']} requests ({stats['retries']} retries, {stats['not_modified']} not modified), "
+          f"{stats['parsed']} pages parsed, {stats['unchanged']} unchanged, "
+          f"{stats['details_reused']} detail pages reused from the cache, {stats['bytes'] / 1e6:.1f} MB downloaded")
+    if stats["failed_pages"] or stats["failed_details"]:
+        print(f"  failed: {stats['failed_pages']} listing pages, {stats['failed_details']} detail pages")
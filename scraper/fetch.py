@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import time
+from collections import Counter, namedtuple
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+
+# Async HTTP layer of the scraper.
+# One aiohttp session with a bounded connection pool is shared by every
+# request; each host gets a token bucket, so detail fetches run concurrently
+# without exceeding the polite request rate. 429 / 5xx answers, timeouts and
+# connection errors are retried with exponential backoff and jitter (honouring
+# Retry-After). Requests are conditional (If-None-Match / If-Modified-Since)
+# when the page cache has validators for the URL.
+
+USER_AGENT = "Mozilla/5.0"
+CONCURRENCY = 10                  # pooled connections
+RATE_PER_HOST = 4.0               # requests per second per host
+BURST = 8                         # tokens a host bucket can hold
+TIMEOUT_SECONDS = 15
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5                # seconds, doubled per attempt
+BACKOFF_MAX = 30.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+CACHE_PATH = os.getenv("SCRAPER_CACHE_PATH", "scrape_cache.db")
+
+FetchResult = namedtuple("FetchResult", ["url", "status", "body", "etag", "last_modified"])
+
+
+class FetchError(Exception):
+    """The page could not be fetched (non-retryable status, or retries exhausted)."""
+
+
+class TokenBucket:
+    """`rate` tokens per second, up to `burst`; acquire() waits for a token (FIFO)."""
+
+    def __init__(self, rate=RATE_PER_HOST, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Retry-After when the server sent one, otherwise exponential backoff with full jitter."""
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            try:
+                return min(BACKOFF_MAX, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def fingerprint(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+class PageCache:
+    """
+    SQLite cache of fetched pages: the HTTP validators (ETag / Last-Modified),
+    a fingerprint of the body and the parsed result, per URL. For detail pages
+    the fingerprint of the listing card they were fetched for is kept too.
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, fingerprint TEXT,
+                data TEXT, card_fingerprint TEXT, fetched_at REAL
+            )
+        """)
+
+    def get(self, url):
+        row = self.conn.execute(
+            "SELECT etag, last_modified, fingerprint, data, card_fingerprint FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, body_fingerprint, data, card_fingerprint = row
+        return {"etag": etag, "last_modified": last_modified, "fingerprint": body_fingerprint,
+                "data": json.loads(data), "card_fingerprint": card_fingerprint}
+
+    def put(self, url, etag, last_modified, body_fingerprint, data, card_fingerprint=None):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, body_fingerprint, json.dumps(data, ensure_ascii=False),
+                 card_fingerprint, time.time())
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+class Fetcher:
+    """Pooled, rate-limited, retrying GETs. Use as `async with Fetcher() as fetcher`."""
+
+    def __init__(self, concurrency=CONCURRENCY, rate=RATE_PER_HOST, burst=BURST,
+                 timeout=TIMEOUT_SECONDS, max_retries=MAX_RETRIES, recorder=None):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.recorder = recorder      # called as recorder(url, body, etag) for every 200 answer
+        self.stats = Counter()
+        self._buckets = {}
+        self._session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency, ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": USER_AGENT}
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    def _bucket(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return self._buckets[host]
+
+    async def get(self, url, etag=None, last_modified=None):
+        """
+        Returns a FetchResult; status 304 (with body None) when the validators
+        still match. Raises FetchError when the page cannot be fetched.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        bucket = self._bucket(url)
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            self.stats["requests"] += 1
+            retry_after = None
+            try:
+                async with self._session.get(url, headers=headers) as response:
+                    if response.status == 304:
+                        return FetchResult(url, 304, None, etag, last_modified)
+                    if response.status == 200:
+                        body = await response.read()
+                        self.stats["bytes"] += len(body)
+                        result = FetchResult(url, 200, body, response.headers.get("ETag"),
+                                             response.headers.get("Last-Modified"))
+                        if self.recorder is not None:
+                            self.recorder(url, body, result.etag)
+                        return result
+                    if response.status not in RETRY_STATUS:
+                        raise FetchError(f"{url}: HTTP {response.status}")
+                    error = FetchError(f"{url}: HTTP {response.status}")
+                    retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = FetchError(f"{url}: {e.__class__.__name__} {e}")
+
+            if attempt == self.max_retries:
+                raise error
+            self.stats["retries"] += 1
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
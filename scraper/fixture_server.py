@@ -0,0 +1,137 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Local HTTP server for recorded pages, so the crawler can be exercised offline.
+#
+#   python -m scraper.crawl --pages 2 --record scraper/fixtures     # record from the live site
+#   python -m scraper.fixture_server --port 8002
+#   python -m scraper.crawl --base-url http://127.0.0.1:8002 --pages 2 --cache /tmp/scrape_cache.db
+#
+# Pages are looked up by path + query in <dir>/index.json. Every page gets an
+# ETag (a hash of its body) and answers 304 to a matching If-None-Match, like
+# the real server would for unchanged pages. --fail-every N answers every Nth
+# request with 503 (and Retry-After: 0) to exercise the retry path.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+INDEX_FILE = "index.json"
+
+_record_lock = threading.Lock()
+
+
+def page_key(url):
+    parts = urlsplit(url)
+    return parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+def load_fixtures(directory=FIXTURES_DIR):
+    """{path?query: (body, etag)} for every page in the index."""
+    with open(os.path.join(directory, INDEX_FILE)) as f:
+        index = json.load(f)
+    pages = {}
+    for key, filename in index.items():
+        with open(os.path.join(directory, filename), "rb") as f:
+            body = f.read()
+        pages[key] = (body, f'"{hashlib.sha1(body).hexdigest()[:16]}"')
+    return pages
+
+
+def record(directory, url, body, etag=None):
+    """Saves a fetched page under its path + query (Fetcher's recorder hook)."""
+    key = page_key(url)
+    filename = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".html"
+    with _record_lock:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, filename), "wb") as f:
+            f.write(body)
+        index_path = os.path.join(directory, INDEX_FILE)
+        index = {}
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+        index[key] = filename
+        with open(index_path, "w") as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    pages = {}
+    fail_every = 0
+    latency = 0.0
+    requests = 0
+    _lock = threading.Lock()
+
+    def do_GET(self):
+        with self._lock:
+            type(self).requests += 1
+            count = type(self).requests
+        time.sleep(self.latency)
+
+        if self.fail_every and count % self.fail_every == 0:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        page = self.pages.get(self.path)
+        if page is None:
+            self.send_error(404)
+            return
+        body, etag = page
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=0, directory=FIXTURES_DIR, fail_every=0, latency=0.0):
+    """A server over the fixtures (port 0 picks a free port); server.server_address has the bound port."""
+    handler = type("Handler", (FixtureHandler,), {
+        "pages": load_fixtures(directory), "fail_every": fail_every, "latency": latency,
+        "requests": 0, "_lock": threading.Lock(),
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def start_in_thread(**kwargs):
+    """Starts a fixture server in a daemon thread. Returns (server, base_url); stop with server.shutdown()."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves recorded scraper fixture pages")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--dir", default=FIXTURES_DIR)
+    parser.add_argument("--fail-every", type=int, default=0, help="answer every Nth request with 503")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each answer")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.dir, args.fail_every, args.latency)
+    print(f"Fixture server on http://{args.host}:{args.port} ({len(server.RequestHandlerClass.pages)} pages from {args.dir})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
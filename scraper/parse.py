@@ -0,0 +1,165 @@
+import hashlib
+import json
+import re
+
+from lxml import etree, html
+
+# MagicBricks page parsing (the logic of webscraping.ipynb, on lxml).
+# Listing pages hold one card per property; detail pages add the address,
+# the per-sqft price and, for rentals, the area. The XPath expressions are
+# compiled once; a class test matches one token of the class attribute, like
+# BeautifulSoup's class_= did.
+
+BUY = "buy"
+RENT = "rent"
+CITY = "Kolkata"
+NA = "N/A"
+
+_BHK = re.compile(r"(\d+)\s*BHK", re.IGNORECASE)
+_PER_SQFT = {BUY: re.compile(r'₹([\d,]+)'), RENT: re.compile(r'₹(\d+)')}
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+_CARDS = etree.XPath(f"//div[{_has_class('mb-srp__list')}]")
+_SUMMARY = etree.XPath("(.//div[@data-summary=$key])[1]")
+_VALUE = etree.XPath(f"(.//div[{_has_class('mb-srp__card__summary--value')}])[1]")
+_TITLE = etree.XPath(f"(.//h2[{_has_class('mb-srp__card--title')}])[1]")
+_PRICE = etree.XPath(f"(.//div[{_has_class('mb-srp__card__price--amount')}])[1]")
+_LD_JSON = etree.XPath(".//script[@type='application/ld+json']")
+
+_ADDRESS = etree.XPath(
+    f"(//div[{_has_class('mb-ldp__dtls__title')}])[1]//a[{_has_class('mb-ldp__dtls__title--link')}]"
+)
+_DETAIL_ITEMS = etree.XPath(f"//li[{_has_class('mb-ldp__dtls__body__list--item')}]")
+_ITEM_LABEL = etree.XPath(f"(.//div[{_has_class('mb-ldp__dtls__body__list--label')}])[1]")
+_ITEM_SIZE = etree.XPath(f"(.//div[{_has_class('mb-ldp__dtls__body__list--size')}])[1]")
+_ITEM_BLOCK = etree.XPath(f"(.//div[{_has_class('mb-ldp__dtls__body__list')}])[1]")
+
+
+def parse_html(content):
+    # lxml refuses empty documents; an empty page simply has no cards / details
+    return html.fromstring(content if content and content.strip() else "<html></html>")
+
+
+def text_of(element):
+    """Same as BeautifulSoup's get_text(strip=True)."""
+    return "".join(piece.strip() for piece in element.itertext())
+
+
+def _first(xpath, element, **variables):
+    found = xpath(element, **variables)
+    return found[0] if found else None
+
+
+def _summary(card, key):
+    """Text of a card summary field (furnishing, super-area, ...); None if the field is missing."""
+    block = _first(_SUMMARY, card, key=key)
+    if block is None:
+        return None
+    value = _first(_VALUE, block)
+    return text_of(value) if value is not None else NA
+
+
+def parse_card(card, kind=BUY):
+    """Parses a single property card; None for non-residential cards."""
+    # RESIDENTIAL FILTER
+    furnishing = _summary(card, "furnishing")
+    if furnishing is None or furnishing == NA:
+        return None
+
+    # NAME
+    title_tag = _first(_TITLE, card)
+    if title_tag is None:
+        return None
+    title = text_of(title_tag)
+
+    # BEDROOMS
+    match = _BHK.search(title)
+    bedroom = match.group(1) if match else NA
+
+    # PRICE (buy) / RENT (rent)
+    price_tag = _first(_PRICE, card)
+    amount = text_of(price_tag).replace("₹", "").replace(",", "").strip() if price_tag is not None else NA
+
+    # DETAIL LINK
+    link = None
+    for script in _LD_JSON(card):
+        try:
+            data = json.loads(script.text or "")
+        except ValueError:
+            continue
+        if isinstance(data, dict) and "url" in data:
+            link = data["url"]
+            break
+
+    prop = {"name": title, "city": CITY, "bedroom": bedroom, "furnishing": furnishing, "link": link}
+    if kind == RENT:
+        prop["rent"] = amount
+        return prop
+
+    # AREA (rental areas come from the detail page)
+    areas = {}
+    for key in ("super-area", "carpet-area"):
+        value = _summary(card, key)
+        areas[key] = re.sub(r"\D", "", value) if value not in (None, NA) else NA
+    prop["price"] = amount
+    prop["area"] = areas["carpet-area"] if areas["carpet-area"] != NA else areas["super-area"]
+    return prop
+
+
+def parse_listing(content, kind=BUY):
+    """All residential cards of a listing page, in page order."""
+    cards = (parse_card(card, kind) for card in _CARDS(parse_html(content)))
+    return [card for card in cards if card]
+
+
+def card_fingerprint(prop):
+    """Hash of what a card shows; a listing whose card is unchanged keeps its cached details."""
+    payload = json.dumps(prop, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def empty_details(kind=BUY):
+    details = {"address": NA, "per_sqft": NA}
+    if kind == RENT:
+        details["area"] = NA
+    return details
+
+
+def extract_details(tree, kind=BUY):
+    """Address and per sqft price from a detail page (plus the area for rentals)."""
+    details = empty_details(kind)
+
+    # Extract Address
+    address_link = _first(_ADDRESS, tree)
+    if address_link is not None:
+        details["address"] = text_of(address_link)
+
+    # Extract Area and Per Sqft Price
+    for item in _DETAIL_ITEMS(tree):
+        label = _first(_ITEM_LABEL, item)
+        if label is None:
+            continue
+        if "Area" not in text_of(label):
+            continue
+
+        if kind == RENT:
+            block = _first(_ITEM_BLOCK, item)
+            if block is not None:
+                details["area"] = re.sub(r"\D", "", (block.text or "").strip())
+
+        size_div = _first(_ITEM_SIZE, item)
+        if size_div is not None:
+            match = _PER_SQFT[kind].search(text_of(size_div))
+            if match:
+                details["per_sqft"] = match.group(1).replace(",", "")
+        break
+
+    return details
+
+
+def parse_details(content, kind=BUY):
+    return extract_details(parse_html(content), kind)